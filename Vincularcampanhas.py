@@ -1,27 +1,39 @@
 
-import sys, os, site, argparse, shutil, json, subprocess, logging, uuid, socket, getpass, threading
+from __future__ import annotations
+import sys, os, io, site, hashlib, argparse, shutil, tempfile, json, subprocess, logging, uuid, socket, getpass, threading, queue, time, random, re, csv, math, functools
 from pathlib import Path
 from datetime import datetime, date, timezone
 from zoneinfo import ZoneInfo
-from typing import Optional, Tuple, Any, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import requests
-import pandas as pd
-import polars as pl
-import pythoncom
-from win32com.client import Dispatch
-from PySide6.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QHBoxLayout, QDateEdit
-from PySide6.QtCore import QSettings, QDate
-from playwright.sync_api import sync_playwright, Page, BrowserContext, TimeoutError as PWTimeoutError
-
-for sp in site.getsitepackages():
-    if sp not in sys.path:
-        sys.path.insert(0, sp)
+from typing import Optional, Tuple, Any, List, Callable, Iterator, TYPE_CHECKING
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, Future, FIRST_COMPLETED
+from collections import deque
+from contextlib import closing
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
+
+def _import_preguicoso(nome:str):
+    if nome in sys.modules: return sys.modules[nome]
+    spec=importlib.util.find_spec(nome)
+    if spec is None: raise ModuleNotFoundError(nome)
+    spec.loader=importlib.util.LazyLoader(spec.loader)
+    mod=importlib.util.module_from_spec(spec)
+    sys.modules[nome]=mod
+    spec.loader.exec_module(mod)
+    return mod
+
+pl = _import_preguicoso("polars")
+requests = _import_preguicoso("requests")
+asyncio = _import_preguicoso("asyncio")
 
 MOD_DIR = Path.home()/"C6 CTVM LTDA, BANCO C6 S.A. e C6 HOLDING S.A"/"Mensageria e Cargas Operacionais - 11.CelulaPython"/"graciliano"/"novo_servidor"/"modules"
-sys.path.insert(0, str(MOD_DIR))
-from dollynho import get_credencial
-from _utilAutomacoesExec import AutomacoesExecClient
+
+def _modulos_corporativos()->None:
+    for sp in site.getsitepackages():
+        if sp not in sys.path:
+            sys.path.insert(0, sp)
+    if str(MOD_DIR) not in sys.path:
+        sys.path.insert(0, str(MOD_DIR))
 
 TZ = ZoneInfo("America/Sao_Paulo")
 INICIO_EXEC_SP = datetime.now(TZ)
@@ -40,10 +52,64 @@ ENVIAR_EMAIL_FALHA = ["carlos.lsilva@c6bank.com","sofia.fernandes@c6bank.com"]
 BQ_PROJECT_ID = "datalab-pagamentos"
 BQ_SOURCE_PROJECT_ID = "c6-banco-comercial-analytics"
 BQ_LOCATION = "US"
+BQ_API_URL = os.getenv("BQ_API_URL","https://bigquery.googleapis.com").rstrip("/")
+BQ_RETRY_STATUS = (429,500,502,503,504)
+BQ_DATASET_DESTINO = "ADMINISTRACAO_CELULA_PYTHON"
+BQ_TABELA_DESTINO = "VincularCampanhas"
+BQ_PERSIST_MODE = "insertall"
 RETCODE_SUCESSO = 0
 RETCODE_FALHA = 1
 RETCODE_SEMDADOSPARAPROCESSAR = 2
 LIMITE_ABAS = 5
+LIMITE_API = 30
+EXECUTOR = "browser"
+RUNDECK_URL = os.getenv("RUNDECK_URL","https://tasks.corp").rstrip("/")
+RUNDECK_API_VERSION = os.getenv("RUNDECK_API_VERSION","41")
+JOB_VINCULAR_URL = f"{RUNDECK_URL}/project/attfincards/job/show/bcd7569b-ddf2-4a4b-8561-5f0b6926175c"
+JOB_REMOCAO_URL = f"{RUNDECK_URL}/project/corecardstax/job/show/6c0f32f3-317f-40de-9d2f-7ac76387f821"
+RUNDECK_LOG_PAGINA = int(os.getenv("RUNDECK_LOG_PAGINA","5000"))
+RUNDECK_FOLGA_SEC = float(os.getenv("RUNDECK_FOLGA_SEC","120"))
+RUNDECK_ESTADOS_FINAIS = ("SUCCEEDED","FAILED","ABORTED","TIMEDOUT","FAILED-WITH-RETRY","OTHER")
+ENGINE = "threads"
+LIMITE_ASYNC = 200
+LIMITE_ADAPTATIVO = os.getenv("LIMITE_ADAPTATIVO","1").strip().lower() not in ("0","false","nao","não")
+LIMITE_ESPERA_SEC = float(os.getenv("LIMITE_ESPERA_SEC","900"))
+MANIFESTO_CSV = "manifest.json"
+BASE_PUBLICO = "base"
+RELATORIO_XLSX = os.getenv("RELATORIO_XLSX","1").strip().lower() not in ("0","false","nao","não")
+RELATORIO_COLUNAS = ("campaign_id","vencimento","unidade","status","tentativas","espera_s","log_arquivo","log")
+MAX_LINHAS_EXECUCAO = int(os.getenv("MAX_LINHAS_EXECUCAO","0"))
+JOURNAL_CAMPANHAS = "journal.jsonl"
+CACHE_EXTRACAO = os.getenv("CACHE_EXTRACAO","1").strip().lower() not in ("0","false","nao","não")
+CACHE_VERSAO = "2"
+TB_DATA_CORTE = f"{BQ_SOURCE_PROJECT_ID}.SHARED_OPS.TB_DATA_CORTE_FATURAS"
+TB_PUBLICO = f"{BQ_SOURCE_PROJECT_ID}.SHARED_OPS.TB_PUBLICO_PARCELAMENTO_FATURA_PF"
+def _sql_data(coluna:str)->str:
+    return f"SAFE_CAST(LEFT(TRIM(CAST({coluna} AS STRING)),10) AS DATE)"
+
+SQL_EXTRACAO = f"""WITH corte AS (
+  SELECT {_sql_data("Data_Vencimento")} AS Data_Vencimento, COUNT(*) OVER () AS QTD_CORTE FROM `{TB_DATA_CORTE}` WHERE {_sql_data("DATA_GERACAO_ROBO")} = @data_corte LIMIT 1
+)
+SELECT DISTINCT CAST(c.Data_Vencimento AS STRING) AS Data_Vencimento, c.QTD_CORTE, p.ACCOUNT_ID, SAFE_CAST(p.CAMPAIGN_ID AS INT64) AS CAMPAIGN_ID
+FROM corte c LEFT JOIN `{TB_PUBLICO}` p ON {_sql_data("p.DT_VENCIMENTOCOBRANCA")} = c.Data_Vencimento"""
+SQL_EXTRACAO_PERIODO = f"""WITH corte AS (
+  SELECT {_sql_data("DATA_GERACAO_ROBO")} AS DATA_GERACAO_ROBO, {_sql_data("Data_Vencimento")} AS Data_Vencimento, COUNT(*) OVER (PARTITION BY {_sql_data("DATA_GERACAO_ROBO")}) AS QTD_CORTE FROM `{TB_DATA_CORTE}` WHERE {_sql_data("DATA_GERACAO_ROBO")} BETWEEN @data_de AND @data_ate
+  QUALIFY ROW_NUMBER() OVER (PARTITION BY {_sql_data("DATA_GERACAO_ROBO")}) = 1
+), vencimentos AS (
+  SELECT Data_Vencimento, MIN(DATA_GERACAO_ROBO) AS DATA_CORTE, STRING_AGG(CAST(DATA_GERACAO_ROBO AS STRING), ',' ORDER BY DATA_GERACAO_ROBO) AS DATAS, SUM(QTD_CORTE) AS QTD_CORTE FROM corte GROUP BY Data_Vencimento
+)
+SELECT DISTINCT CAST(v.DATA_CORTE AS STRING) AS DATA_CORTE, CAST(v.Data_Vencimento AS STRING) AS Data_Vencimento, v.DATAS, v.QTD_CORTE, p.ACCOUNT_ID, SAFE_CAST(p.CAMPAIGN_ID AS INT64) AS CAMPAIGN_ID
+FROM vencimentos v LEFT JOIN `{TB_PUBLICO}` p ON {_sql_data("p.DT_VENCIMENTOCOBRANCA")} = v.Data_Vencimento"""
+INCREMENTAL = os.getenv("INCREMENTAL","0").strip().lower() not in ("0","false","nao","não","")
+SQL_INCREMENTAL = """WITH base AS (
+{sql}
+), ja AS (
+  SELECT DISTINCT CAST(DT_VENCIMENTOCOBRANCA AS STRING) AS Data_Vencimento, CAMPAIGN_ID, ACCOUNT_ID FROM `{tabela}`
+  WHERE JOB_STATUS = 'SUCCEEDED' AND CAST(DT_VENCIMENTOCOBRANCA AS STRING) IN (SELECT Data_Vencimento FROM base)
+)
+SELECT DISTINCT b.* REPLACE (IF(j.CAMPAIGN_ID IS NULL, CAST(b.ACCOUNT_ID AS STRING), NULL) AS ACCOUNT_ID, IF(j.CAMPAIGN_ID IS NULL, b.CAMPAIGN_ID, NULL) AS CAMPAIGN_ID), COUNTIF(j.CAMPAIGN_ID IS NOT NULL) OVER (PARTITION BY b.Data_Vencimento) AS QTD_JA_VINCULADA
+FROM base b LEFT JOIN ja j ON j.Data_Vencimento = b.Data_Vencimento AND j.CAMPAIGN_ID = b.CAMPAIGN_ID AND j.ACCOUNT_ID = CAST(b.ACCOUNT_ID AS STRING)"""
+BQ_STREAMING = os.getenv("BQ_STREAMING","1").strip().lower() not in ("0","false","nao","não")
 
 X_RD_LOGIN_USUARIO={"css":"#login"}
 X_RD_LOGIN_SENHA={"css":"#password"}
@@ -64,6 +130,7 @@ class Execucao:
     def is_servidor(self)->bool:
         return len(sys.argv)>1 or os.getenv("SERVIDOR_ORIGEM") or os.getenv("MODO_EXECUCAO")
     def abrir_gui(self,amb:"Ambiente")->Tuple[str,str,str]:
+        from PySide6.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QHBoxLayout
         app=QApplication.instance() or QApplication(sys.argv)
         dlg=QDialog(); dlg.setWindowTitle("Contexto de Execução")
         layout=QVBoxLayout(dlg)
@@ -106,12 +173,28 @@ class Ambiente:
         self.last_sql_corte=""
         self.last_sql_parcela=""
         self.last_rows_corte=None
-        self.last_rows_parcela=None
+        self.last_rows_publico=None
         self.last_vencimento=None
+        self.last_data_corte=None
+        self.last_data_ate=None
+        self.last_rows_ja_vinculadas=0
+        self.last_cache_chave=None
         self.modo_execucao="AUTO"
         self.observacao="AUTO"
         self.usuario=f"{getpass.getuser()}@c6bank.com"
+        self.executor=(os.getenv("EXECUTOR") or EXECUTOR).strip().lower()
+        self.engine=(os.getenv("ENGINE") or ENGINE).strip().lower()
+        self.retomar=False
+        self.incremental=INCREMENTAL
+        self.journal=None
+        self.limitador=None
+        self.logs_rundeck=None
+        self.relatorio=None
         self.dest_sucesso=self._destinatarios_sucesso()
+        self.bq=ClienteBQ(self.logger)
+        self.retry=PoliticaRetry(self.logger)
+        self.notificador=Notificador(self)
+        self.spans=Spans(self.caminho_logs/f"{STEM}_{self.run_ts}_spans.jsonl")
     def _mkdirs(self):
         for p in [self.caminho_base,self.caminho_artefatos,self.caminho_logs,self.caminho_input]:
             p.mkdir(parents=True, exist_ok=True)
@@ -128,6 +211,8 @@ class Ambiente:
         logger.addHandler(fh); logger.addHandler(sh)
         return logger
     def _carregar_credencial(self)->Tuple[str,str]:
+        _modulos_corporativos()
+        from dollynho import get_credencial
         candidatos=(ARQUIVO_ATUAL.stem,"vincular_campanhas","rundeck","attfincards",None)
         for key in candidatos:
             try:
@@ -148,12 +233,178 @@ class Ambiente:
         h=total//3600; m=(total%3600)//60; s=total%60
         return f"{h:02d}:{m:02d}:{s:02d}"
 
+class PoliticaRetry:
+    def __init__(self,logger:logging.Logger):
+        self.logger=logger
+        self.max_tentativas=max(1,int(os.getenv("RETRY_MAX_TENTATIVAS","5")))
+        self.backoff_base=float(os.getenv("RETRY_BACKOFF_SEC","5"))
+        self.backoff_max=float(os.getenv("RETRY_BACKOFF_MAX_SEC","300"))
+        self.janela=max(1,int(os.getenv("CIRCUITO_JANELA","20")))
+        self.min_amostras=max(1,int(os.getenv("CIRCUITO_MIN_AMOSTRAS","5")))
+        self.taxa_falha=float(os.getenv("CIRCUITO_TAXA_FALHA","0.5"))
+        self.pausa=float(os.getenv("CIRCUITO_PAUSA_SEC","60"))
+        self._lock=threading.Lock()
+        self._amostras={}
+        self._aberto_ate={}
+    def espera(self,tentativa:int)->float:
+        return random.uniform(0,min(self.backoff_max,self.backoff_base*(2**(max(1,tentativa)-1))))
+    def registrar(self,chave:str,ok:bool)->None:
+        with self._lock:
+            amostras=self._amostras.setdefault(chave,deque(maxlen=self.janela))
+            amostras.append(bool(ok))
+            falhas=sum(1 for x in amostras if not x)
+            if len(amostras)>=self.min_amostras and falhas/len(amostras)>=self.taxa_falha:
+                self._aberto_ate[chave]=time.monotonic()+self.pausa
+                amostras.clear()
+                self.logger.warning("Circuito aberto para %s | falhas=%d | pausa=%.1fs", chave, falhas, self.pausa)
+    def restante(self,chave:str)->float:
+        with self._lock:
+            return max(0.0,self._aberto_ate.get(chave,0.0)-time.monotonic())
+    def aguardar_circuito(self,chave:str)->float:
+        total=0.0
+        while True:
+            resto=self.restante(chave)
+            if resto<=0: return total
+            time.sleep(resto); total+=resto
+    async def aguardar_circuito_async(self,chave:str)->float:
+        total=0.0
+        while True:
+            resto=self.restante(chave)
+            if resto<=0: return total
+            await asyncio.sleep(resto); total+=resto
+
+SPANS_OPENMETRICS = os.getenv("SPANS_OPENMETRICS","0").strip().lower() in ("1","true","sim")
+
+def _percentil(xs:List[float],q:float)->float:
+    return xs[max(0,math.ceil(q*len(xs))-1)] if xs else 0.0
+
+class Span:
+    def __init__(self,spans:"Spans",nome:str,atributos:dict):
+        self.spans=spans
+        self.nome=nome
+        self.atributos=atributos
+        self.inicio=0.0
+        self._t0=0.0
+    def __enter__(self)->"Span":
+        self.inicio=time.time(); self._t0=time.perf_counter()
+        return self
+    def __exit__(self,exc_type,exc,tb)->bool:
+        self.spans.registrar(self.nome,self.inicio,time.perf_counter()-self._t0,exc_type.__name__ if exc_type else None,self.atributos)
+        return False
+
+class Spans:
+    def __init__(self,path:Path):
+        self.path=path
+        self._lock=threading.Lock()
+        self._fh=None
+        self.duracoes={}
+    def medir(self,nome:str,**atributos)->Span:
+        return Span(self,nome,atributos)
+    def registrar(self,nome:str,inicio:float,duracao:float,erro:Optional[str]=None,atributos:Optional[dict]=None)->None:
+        linha={"nome":nome,"inicio":datetime.fromtimestamp(inicio,TZ).isoformat(timespec="milliseconds"),"duracao_s":round(duracao,6),"thread":threading.current_thread().name}
+        if erro: linha["erro"]=erro
+        if atributos: linha["atributos"]=atributos
+        txt=json.dumps(linha,ensure_ascii=False,default=str)+"\n"
+        with self._lock:
+            self.duracoes.setdefault(nome,[]).append(duracao)
+            try:
+                if self._fh is None: self._fh=open(self.path,"a",encoding="utf-8",buffering=1)
+                self._fh.write(txt)
+            except Exception:
+                pass
+    def resumo(self)->dict:
+        with self._lock:
+            itens={k:sorted(v) for k,v in self.duracoes.items()}
+        return {k:{"n":len(xs),"total_s":round(sum(xs),3),"p50_s":round(_percentil(xs,0.5),3),"p95_s":round(_percentil(xs,0.95),3),"max_s":round(xs[-1],3)} for k,xs in sorted(itens.items())}
+    def escrever_openmetrics(self,path:Path)->Path:
+        metrica=re.sub(r"[^a-zA-Z0-9_]","_",STEM)+"_etapa_segundos"
+        linhas=[f"# TYPE {metrica} summary",f"# HELP {metrica} Duração das etapas da execução."]
+        for nome,r in self.resumo().items():
+            rotulo=nome.replace("\\","\\\\").replace('"','\\"')
+            linhas+=[f'{metrica}{{etapa="{rotulo}",quantile="0.5"}} {r["p50_s"]}',f'{metrica}{{etapa="{rotulo}",quantile="0.95"}} {r["p95_s"]}',
+                     f'{metrica}_sum{{etapa="{rotulo}"}} {r["total_s"]}',f'{metrica}_count{{etapa="{rotulo}"}} {r["n"]}']
+        linhas.append("# EOF")
+        path.write_text("\n".join(linhas)+"\n",encoding="utf-8")
+        return path
+    def fechar(self)->None:
+        with self._lock:
+            fh=self._fh; self._fh=None
+        if fh is not None:
+            try: fh.close()
+            except Exception: pass
+        if SPANS_OPENMETRICS and self.duracoes:
+            self.escrever_openmetrics(self.path.with_suffix(".prom"))
+
+def gravar_saida_rundeck(pagina:Callable[[int],dict],destino:Path)->Path:
+    offset=0
+    with open(destino,"w",encoding="utf-8") as fh:
+        while True:
+            j=pagina(offset) or {}
+            for e in j.get("entries") or []: fh.write(str(e.get("log",""))+"\n")
+            fh.flush()
+            novo=int(j.get("offset",offset) or offset)
+            if j.get("completed") and j.get("execCompleted",True): break
+            if novo==offset: break
+            offset=novo
+    return destino
+
+def resumo_log(path:Optional[Path],linhas:int=5,limite:int=500)->str:
+    if not path or not Path(path).exists(): return ""
+    with open(path,"rb") as fh:
+        fh.seek(0,os.SEEK_END); fim=fh.tell()
+        fh.seek(max(0,fim-8192))
+        cauda=fh.read().decode("utf-8",errors="replace")
+    return "\n".join([l for l in cauda.splitlines() if l.strip()][-linhas:])[-limite:]
+
+class ColetorLogs:
+    def __init__(self,amb:Ambiente):
+        self.amb=amb
+        self.pasta=amb.caminho_logs/"rundeck"
+        self.futuros=[]
+        self.pendentes={}
+        self.executor=None
+    def __enter__(self)->"ColetorLogs":
+        self.pasta.mkdir(parents=True,exist_ok=True)
+        self.executor=ThreadPoolExecutor(max_workers=max(1,int(os.getenv("LOGS_WORKERS","4"))),thread_name_prefix="logs")
+        return self
+    def destino(self,arquivo:str,exec_id:Optional[str])->Path:
+        return self.pasta/f"{Path(arquivo).stem}_{exec_id or uuid.uuid4().hex[:8]}.log"
+    def _gravar(self,pagina:Callable[[int],dict],destino:Path)->Path:
+        with self.amb.spans.medir("rundeck.log",arquivo=destino.name):
+            return gravar_saida_rundeck(pagina,destino)
+    def agendar(self,pagina:Callable[[int],dict],destino:Path)->Future:
+        fut=self.executor.submit(self._gravar,pagina,destino)
+        self.futuros.append(fut); self.pendente(destino,fut)
+        return fut
+    def pendente(self,destino:Path,fut)->None:
+        self.pendentes[str(destino)]=fut
+    def quando_pronto(self,destino:str,fn:Callable[[],None])->None:
+        fut=self.pendentes.pop(str(destino),None)
+        if fut is None: fn()
+        else: fut.add_done_callback(lambda _:fn())
+    def __exit__(self,*exc)->None:
+        for fut in self.futuros:
+            try:
+                fut.result()
+            except Exception:
+                self.amb.logger.warning("Falha ao gravar saída de execução Rundeck", exc_info=True)
+        self.executor.shutdown(wait=True)
+        self.futuros=[]; self.pendentes={}
+
+def _pagina_saida_rundeck(sessao:requests.Session,url:str,offset:int)->dict:
+    r=sessao.get(url,params={"offset":offset,"maxlines":RUNDECK_LOG_PAGINA},headers={"Accept":"application/json"},timeout=60)
+    r.raise_for_status()
+    return r.json()
+
 class Rundeck:
     def __init__(self,amb:Ambiente,page:Page):
         self.amb=amb
         self.page=page
     def _login(self)->None:
-        immortal_goto(self.amb,self.page,"https://tasks.corp/user/login")
+        with self.amb.spans.medir("rundeck.login"):
+            self._entrar()
+    def _entrar(self)->None:
+        immortal_goto(self.amb,self.page,f"{RUNDECK_URL}/user/login")
         try:
             self.page.wait_for_load_state("domcontentloaded")
             try:
@@ -176,6 +427,12 @@ class Rundeck:
             self.amb.logger.error("Falha login Rundeck: %s", e, exc_info=True)
             raise
     def _abrir_e_preencher(self,job_url:str,parametros:list[dict])->None:
+        with self.amb.spans.medir("rundeck.formulario"):
+            self._preencher(job_url,parametros)
+    def _anexar(self,p:Path)->None:
+        with self.amb.spans.medir("rundeck.upload",arquivo=p.name,bytes=p.stat().st_size):
+            locator_from(self.page,X_RD_INPUT_FILE).set_input_files(str(p))
+    def _preencher(self,job_url:str,parametros:list[dict])->None:
         immortal_goto(self.amb,self.page,job_url)
         try:
             wait_visible(self.page,X_RD_BTN_RUN)
@@ -188,121 +445,475 @@ class Rundeck:
                 loc=self.page.locator("input[name='extra.option.CAMPAIGN_ID']")
                 loc.wait_for(state="visible"); loc.fill(str(campo.get("valor","")))
     def rodar_job(self,parametros:list[dict],job_url:str,arquivo:str)->tuple[str,Optional[str]]:
+        from playwright.sync_api import TimeoutError as PWTimeoutError
         p=Path(arquivo or "")
         if not p.exists(): return "FALHA",None
         self._abrir_e_preencher(job_url,parametros)
         try:
-            locator_from(self.page,X_RD_INPUT_FILE).set_input_files(str(p))
+            self._anexar(p)
         except Exception as e:
             self.amb.logger.warning("Falha ao anexar arquivo: %s", e)
         immortal_click(self.amb,self.page,X_RD_BTN_RUN)
+        intersticiais=0
         while True:
             try:
-                locator_from(self.page,X_RD_STATUS_OK).wait_for(timeout=600000)
+                with self.amb.spans.medir("rundeck.espera",arquivo=p.name):
+                    locator_from(self.page,X_RD_STATUS_OK).wait_for(timeout=600000)
                 break
             except PWTimeoutError:
                 if locator_from(self.page,X_RD_INTERSTITIAL).count()>0:
+                    intersticiais+=1
+                    self.amb.retry.registrar(job_url,False)
+                    if self.amb.limitador is not None: self.amb.limitador.congestionado()
+                    if intersticiais>=self.amb.retry.max_tentativas:
+                        self.amb.logger.error("Rundeck instável: %d intersticiais seguidos em %s", intersticiais, job_url)
+                        return "FALHA",None
+                    espera=self.amb.retry.espera(intersticiais)
+                    self.amb.logger.warning("Intersticial Rundeck | reenvio %d em %.1fs", intersticiais, espera)
+                    time.sleep(espera)
+                    self.amb.retry.aguardar_circuito(job_url)
                     self._abrir_e_preencher(job_url,parametros)
                     try:
-                        locator_from(self.page,X_RD_INPUT_FILE).set_input_files(str(p))
+                        self._anexar(p)
                     except Exception:
                         pass
                     immortal_click(self.amb,self.page,X_RD_BTN_RUN)
                     continue
                 return "FALHA",None
-        logs_txt=None
+        coletor=self.amb.logs_rundeck
+        if coletor is None: return "SUCCEEDED",None
+        m=re.search(r"/execution/show/(\d+)",self.page.url or "")
+        exec_id=m.group(1) if m else None
+        destino=coletor.destino(arquivo,exec_id)
         try:
-            self.page.evaluate("window.scrollTo(0, document.body.scrollHeight);")
-            immortal_click(self.amb,self.page,X_RD_BTN_LOG)
-            locator_from(self.page,X_RD_LOG_TEXT).wait_for()
-            logs_txt="\n".join(self.page.locator(X_RD_LOG_TEXT["css"]).all_text_contents())
+            if exec_id:
+                cookies=self.page.context.cookies()
+                sessao=requests.Session()
+                ca=os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("SSL_CERT_FILE")
+                sessao.verify=ca if ca else True
+                for c in cookies: sessao.cookies.set(c["name"],c["value"],domain=c.get("domain"),path=c.get("path") or "/")
+                url=f"{RUNDECK_URL}/api/{RUNDECK_API_VERSION}/execution/{exec_id}/output"
+                coletor.agendar(lambda offset:_pagina_saida_rundeck(sessao,url,offset),destino).add_done_callback(lambda _:sessao.close())
+            else:
+                self.page.evaluate("window.scrollTo(0, document.body.scrollHeight);")
+                immortal_click(self.amb,self.page,X_RD_BTN_LOG)
+                locator_from(self.page,X_RD_LOG_TEXT).wait_for()
+                with self.amb.spans.medir("rundeck.log",arquivo=destino.name),open(destino,"w",encoding="utf-8") as fh:
+                    for linha in self.page.locator(X_RD_LOG_TEXT["css"]).all_text_contents(): fh.write(linha+"\n")
         except Exception:
-            logs_txt=None
-        return "SUCCEEDED",logs_txt
+            self.amb.logger.warning("Falha ao capturar saída da execução %s", exec_id, exc_info=True)
+            return "SUCCEEDED",None
+        return "SUCCEEDED",str(destino)
 
-def garantir_outlook_aberto(amb:Ambiente)->bool:
-    try:
-        pythoncom.CoInitialize()
-    except Exception:
-        pass
-    try:
-        Dispatch("Outlook.Application")
-        amb.logger.info("Outlook disponível")
-        return True
-    except Exception:
-        amb.logger.warning("Outlook indisponível")
-        return False
+class RundeckApi:
+    def __init__(self,amb:Ambiente,base_url:str=RUNDECK_URL,api_version:str=RUNDECK_API_VERSION,pool:int=LIMITE_API):
+        self.amb=amb
+        self.base_url=base_url.rstrip("/")
+        self.api_url=f"{self.base_url}/api/{api_version}"
+        self.poll_interval=float(os.getenv("RUNDECK_POLL_INTERVAL_SEC","2"))
+        self.max_wait=float(os.getenv("RUNDECK_MAX_WAIT_SEC","600"))
+        self.session=requests.Session()
+        from requests.adapters import HTTPAdapter
+        adapter=HTTPAdapter(pool_connections=max(1,pool),pool_maxsize=max(1,pool))
+        self.session.mount("http://",adapter); self.session.mount("https://",adapter)
+        self.session.headers.update({"Accept":"application/json"})
+        ca=os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("SSL_CERT_FILE")
+        self.session.verify=ca if ca else True
+        tok=os.getenv("RUNDECK_API_TOKEN")
+        if tok: self.session.headers["X-Rundeck-Auth-Token"]=tok.strip()
+        self._logado=bool(tok)
+        self._lock=threading.Lock()
+    def _login(self,forcar:bool=False)->None:
+        with self._lock:
+            if self._logado and not forcar: return
+            self.amb.logger.info("Login Rundeck API como '%s'", self.amb.cred_user)
+            with self.amb.spans.medir("rundeck.login"):
+                r=self.session.post(f"{self.base_url}/j_security_check",data={"j_username":self.amb.cred_user,"j_password":self.amb.cred_pass},timeout=30)
+            if r.status_code>=400 or "/user/login" in (r.url or "") or "/user/error" in (r.url or ""):
+                self.amb.logger.error("Falha login Rundeck API: HTTP %s %s", r.status_code, r.url)
+                raise RuntimeError("Login API não efetivado.")
+            self._logado=True
+            self.amb.logger.info("Login Rundeck API OK")
+    def _req(self,metodo:str,url:str,**kw)->requests.Response:
+        self._login()
+        kw.setdefault("timeout",60)
+        r=self.session.request(metodo,url,**kw)
+        if r.status_code in (401,403) or "/user/login" in (r.url or ""):
+            self._login(forcar=True)
+            r=self.session.request(metodo,url,**kw)
+        if r.status_code>=400:
+            self.amb.logger.error("Rundeck API %s %s HTTP %s: %s", metodo, url, r.status_code, r.text[:500])
+            raise RuntimeError(f"Rundeck API HTTP {r.status_code}")
+        return r
+    @staticmethod
+    def _job_id(job_url:str)->str:
+        return job_url.rstrip("/").split("/")[-1]
+    def _enviar_arquivo(self,job_id:str,p:Path,opcao:str="FILE")->str:
+        with self.amb.spans.medir("rundeck.upload",arquivo=p.name,bytes=p.stat().st_size):
+            r=self._req("POST",f"{self.api_url}/job/{job_id}/input/file",params={"optionName":opcao,"fileName":p.name},data=p.read_bytes(),headers={"Content-Type":"application/octet-stream"})
+        chave=((r.json() or {}).get("options") or {}).get(opcao)
+        if not chave: raise RuntimeError("Upload de arquivo sem chave retornada")
+        return str(chave)
+    def _iniciar(self,job_id:str,opcoes:dict)->str:
+        r=self._req("POST",f"{self.api_url}/job/{job_id}/run",json={"options":opcoes})
+        exec_id=(r.json() or {}).get("id")
+        if exec_id is None: raise RuntimeError("Execução sem id retornado")
+        return str(exec_id)
+    def _aguardar(self,exec_id:str)->str:
+        start=time.monotonic()
+        while True:
+            j=self._req("GET",f"{self.api_url}/execution/{exec_id}/state").json() or {}
+            estado=str(j.get("executionState") or "").upper()
+            if j.get("completed") or estado in RUNDECK_ESTADOS_FINAIS:
+                return estado or "FALHA"
+            if time.monotonic()-start>self.max_wait:
+                self.amb.logger.error("Timeout aguardando execução %s", exec_id)
+                return "FALHA"
+            time.sleep(self.poll_interval)
+    def _pagina_saida(self,exec_id:str,offset:int)->dict:
+        return self._req("GET",f"{self.api_url}/execution/{exec_id}/output",params={"offset":offset,"maxlines":RUNDECK_LOG_PAGINA}).json() or {}
+    def rodar_job(self,parametros:list[dict],job_url:str,arquivo:str)->tuple[str,Optional[str]]:
+        p=Path(arquivo or "")
+        if not p.exists(): return "FALHA",None
+        job_id=self._job_id(job_url)
+        opcoes={str(c.get("campo")).upper():str(c.get("valor","")) for c in parametros if c.get("campo")}
+        opcoes["FILE"]=self._enviar_arquivo(job_id,p)
+        exec_id=self._iniciar(job_id,opcoes)
+        self.amb.logger.info("Execução Rundeck %s iniciada | job=%s", exec_id, job_id)
+        with self.amb.spans.medir("rundeck.espera",arquivo=p.name,execucao=exec_id):
+            estado=self._aguardar(exec_id)
+        if estado!="SUCCEEDED":
+            self.amb.logger.warning("Execução Rundeck %s terminou em %s", exec_id, estado)
+            return "FALHA",None
+        coletor=self.amb.logs_rundeck
+        if coletor is None: return "SUCCEEDED",None
+        destino=coletor.destino(arquivo,exec_id)
+        coletor.agendar(lambda offset:self._pagina_saida(exec_id,offset),destino)
+        return "SUCCEEDED",str(destino)
 
-def enviar_email(amb:Ambiente,status:str,tempo_hms:str,tabelas:List[str],linhas:int,anexos:List[Path],resumo:Optional[dict])->None:
+class RundeckApiAsync:
+    def __init__(self,amb:Ambiente,req,base_url:str=RUNDECK_URL,api_version:str=RUNDECK_API_VERSION):
+        self.amb=amb
+        self.req=req
+        self.base_url=base_url.rstrip("/")
+        self.api_url=f"{self.base_url}/api/{api_version}"
+        self.poll_interval=float(os.getenv("RUNDECK_POLL_INTERVAL_SEC","2"))
+        self.max_wait=float(os.getenv("RUNDECK_MAX_WAIT_SEC","600"))
+        self._logado=bool(os.getenv("RUNDECK_API_TOKEN"))
+        self._lock=asyncio.Lock()
+        self._saidas=set()
+    async def _login(self,forcar:bool=False)->None:
+        async with self._lock:
+            if self._logado and not forcar: return
+            self.amb.logger.info("Login Rundeck API como '%s'", self.amb.cred_user)
+            with self.amb.spans.medir("rundeck.login"):
+                r=await self.req.post(f"{self.base_url}/j_security_check",form={"j_username":self.amb.cred_user,"j_password":self.amb.cred_pass},timeout=30000)
+            if r.status>=400 or "/user/login" in (r.url or "") or "/user/error" in (r.url or ""):
+                self.amb.logger.error("Falha login Rundeck API: HTTP %s %s", r.status, r.url)
+                raise RuntimeError("Login API não efetivado.")
+            self._logado=True
+            self.amb.logger.info("Login Rundeck API OK")
+    async def _req(self,metodo:str,url:str,**kw):
+        await self._login()
+        kw.setdefault("timeout",60000)
+        r=await self.req.fetch(url,method=metodo,**kw)
+        if r.status in (401,403) or "/user/login" in (r.url or ""):
+            await self._login(forcar=True)
+            r=await self.req.fetch(url,method=metodo,**kw)
+        if r.status>=400:
+            txt=await r.text()
+            self.amb.logger.error("Rundeck API %s %s HTTP %s: %s", metodo, url, r.status, txt[:500])
+            raise RuntimeError(f"Rundeck API HTTP {r.status}")
+        return r
+    async def _aguardar(self,exec_id:str)->str:
+        loop=asyncio.get_running_loop(); start=loop.time()
+        while True:
+            j=await (await self._req("GET",f"{self.api_url}/execution/{exec_id}/state")).json() or {}
+            estado=str(j.get("executionState") or "").upper()
+            if j.get("completed") or estado in RUNDECK_ESTADOS_FINAIS:
+                return estado or "FALHA"
+            if loop.time()-start>self.max_wait:
+                self.amb.logger.error("Timeout aguardando execução %s", exec_id)
+                return "FALHA"
+            await asyncio.sleep(self.poll_interval)
+    async def _abortar(self,exec_id:str)->None:
+        try:
+            await self._req("POST",f"{self.api_url}/execution/{exec_id}/abort")
+            self.amb.logger.warning("Execução Rundeck %s abortada", exec_id)
+        except Exception:
+            self.amb.logger.warning("Falha ao abortar execução %s", exec_id, exc_info=True)
+    async def _gravar_saida(self,exec_id:str,destino:Path)->None:
+        offset=0
+        try:
+            with self.amb.spans.medir("rundeck.log",arquivo=destino.name),open(destino,"w",encoding="utf-8") as fh:
+                while True:
+                    j=await (await self._req("GET",f"{self.api_url}/execution/{exec_id}/output",params={"offset":offset,"maxlines":RUNDECK_LOG_PAGINA})).json() or {}
+                    for e in j.get("entries") or []: fh.write(str(e.get("log",""))+"\n")
+                    fh.flush()
+                    novo=int(j.get("offset",offset) or offset)
+                    if j.get("completed") and j.get("execCompleted",True): break
+                    if novo==offset: break
+                    offset=novo
+        except Exception:
+            self.amb.logger.warning("Falha ao gravar saída da execução %s", exec_id, exc_info=True)
+    async def concluir_saidas(self)->None:
+        if self._saidas: await asyncio.gather(*list(self._saidas),return_exceptions=True)
+    async def rodar_job(self,parametros:list[dict],job_url:str,arquivo:str)->tuple[str,Optional[str]]:
+        p=Path(arquivo or "")
+        if not p.exists(): return "FALHA",None
+        job_id=RundeckApi._job_id(job_url)
+        opcoes={str(c.get("campo")).upper():str(c.get("valor","")) for c in parametros if c.get("campo")}
+        with self.amb.spans.medir("rundeck.upload",arquivo=p.name,bytes=p.stat().st_size):
+            r=await self._req("POST",f"{self.api_url}/job/{job_id}/input/file",params={"optionName":"FILE","fileName":p.name},data=await asyncio.to_thread(p.read_bytes),headers={"Content-Type":"application/octet-stream"})
+        chave=((await r.json() or {}).get("options") or {}).get("FILE")
+        if not chave: raise RuntimeError("Upload de arquivo sem chave retornada")
+        opcoes["FILE"]=str(chave)
+        r=await self._req("POST",f"{self.api_url}/job/{job_id}/run",data={"options":opcoes})
+        exec_id=(await r.json() or {}).get("id")
+        if exec_id is None: raise RuntimeError("Execução sem id retornado")
+        exec_id=str(exec_id)
+        self.amb.logger.info("Execução Rundeck %s iniciada | job=%s", exec_id, job_id)
+        try:
+            with self.amb.spans.medir("rundeck.espera",arquivo=p.name,execucao=exec_id):
+                estado=await self._aguardar(exec_id)
+        except asyncio.CancelledError:
+            await asyncio.shield(self._abortar(exec_id))
+            raise
+        if estado!="SUCCEEDED":
+            self.amb.logger.warning("Execução Rundeck %s terminou em %s", exec_id, estado)
+            return "FALHA",None
+        coletor=self.amb.logs_rundeck
+        if coletor is None: return "SUCCEEDED",None
+        destino=coletor.destino(arquivo,exec_id)
+        tarefa=asyncio.create_task(self._gravar_saida(exec_id,destino))
+        self._saidas.add(tarefa); tarefa.add_done_callback(self._saidas.discard); coletor.pendente(destino,tarefa)
+        return "SUCCEEDED",str(destino)
+
+NOTIFICACAO_TIMEOUT_SEC = float(os.getenv("NOTIFICACAO_TIMEOUT_SEC","60"))
+
+def montar_email(amb:Ambiente,status:str,tempo_hms:str,tabelas:List[str],linhas:int,anexos:List[Path],resumo:Optional[dict])->dict:
     st=(status or "").strip().upper()
     subj=f"CÉLULA PYTHON MONITORAÇÃO - {NOME_SCRIPT} - {st}"
     if st=="SUCESSO": dest=amb.dest_sucesso
     else: dest=ENVIAR_EMAIL_FALHA
+    linhas_publico="-"
     try:
+        if resumo and isinstance(resumo.get("bq_rows_parcela"),int):
+            linhas_publico=str(resumo["bq_rows_parcela"])
+    except Exception:
+        linhas_publico="-"
+    tabelas_html="<br>".join(tabelas) if tabelas else "-"
+    etapas=(resumo or {}).get("etapas") or {}
+    tabela_etapas=("<table cellpadding='6' style='border-collapse:collapse;font-size:13px;margin-top:12px'>"
+        "<tr><td><b>ETAPA</b></td><td><b>N</b></td><td><b>P50</b></td><td><b>P95</b></td><td><b>TOTAL</b></td></tr>"
+        +"".join(f"<tr><td>{nome}</td><td>{r['n']}</td><td>{r['p50_s']:.2f}s</td><td>{r['p95_s']:.2f}s</td><td>{r['total_s']:.1f}s</td></tr>" for nome,r in etapas.items())
+        +"</table>") if etapas else ""
+    linhas_processadas=int(linhas)
+    linhas_inseridas=int(resumo.get("linhas_persistidas",0) if resumo else 0)
+    linhas_ignoradas=max(linhas_processadas-linhas_inseridas,0)+int(resumo.get("linhas_ja_vinculadas",0) if resumo else 0)
+    hora_fim=datetime.now(TZ).strftime("%H:%M:%S")
+    html=(
+        f"<html><body style=\"font-family:Montserrat,sans-serif;text-transform:uppercase\">"
+        f"<div style=\"padding:10px;border-left:6px solid {'#2e7d32' if st=='SUCESSO' else ('#f57c00' if st=='SEM DADOS PARA PROCESSAR' else '#c62828')};background:#fafafa;font-weight:600;margin-bottom:12px\">{st}</div>"
+        f"<table cellpadding='6' style='border-collapse:collapse;font-size:14px'>"
+        f"<tr><td><b>AUTOMAÇÃO:</b></td><td>{NOME_AUTOMACAO}</td></tr>"
+        f"<tr><td><b>SCRIPT:</b></td><td>{NOME_SCRIPT}</td></tr>"
+        f"<tr><td><b>STATUS:</b></td><td>{st}</td></tr>"
+        f"<tr><td><b>HORA INICIO:</b></td><td>{amb.hora_exec}</td></tr>"
+        f"<tr><td><b>HORA FIM:</b></td><td>{hora_fim}</td></tr>"
+        f"<tr><td><b>TEMPO EXECUCAO:</b></td><td>{tempo_hms}</td></tr>"
+        f"<tr><td><b>LINHAS PROCESSADAS:</b></td><td>{linhas_processadas}</td></tr>"
+        f"<tr><td><b>LINHAS INSERIDAS:</b></td><td>{linhas_inseridas}</td></tr>"
+        f"<tr><td><b>LINHAS IGNORADAS (DUPLICADAS):</b></td><td>{linhas_ignoradas}</td></tr>"
+        f"<tr><td><b>TABELAS:</b></td><td>{tabelas_html}</td></tr>"
+        f"<tr><td><b>LINHAS PÚBLICO:</b></td><td>{linhas_publico}</td></tr>"
+        f"</table>{tabela_etapas}</body></html>"
+    )
+    anexos=[Path(a) for a in (anexos or []) if a]
+    if amb.log_file_path.exists():
+        anexos.append(amb.log_file_path)
+    if st=="FALHA":
+        try:
+            tb_path=amb.caminho_logs/f"{STEM}_{amb.run_ts}_traceback.txt"
+            tb_path.write_text("",encoding="utf-8")
+            anexos.append(tb_path)
+        except Exception:
+            pass
+    return {"status":st,"assunto":subj,"para":list(dest),"html":html,"anexos":[str(a) for a in anexos]}
+
+def _mensagem_mime(msg:dict,remetente:str):
+    import mimetypes
+    from email.message import EmailMessage
+    m=EmailMessage()
+    m["Subject"]=msg["assunto"]; m["From"]=remetente; m["To"]=", ".join(msg["para"])
+    m.set_content(f"{msg['assunto']}\n")
+    m.add_alternative(msg["html"],subtype="html")
+    for ap in msg["anexos"]:
+        p=Path(ap)
+        if not p.exists(): continue
+        tipo,_=mimetypes.guess_type(p.name)
+        principal,sub=(tipo or "application/octet-stream").split("/",1)
+        m.add_attachment(p.read_bytes(),maintype=principal,subtype=sub,filename=p.name)
+    return m
+
+class BackendOutlook:
+    nome="outlook"
+    tipos=("email",)
+    def __init__(self,amb:Ambiente):
+        self.amb=amb
+        self._pythoncom=None
+    def iniciar(self)->None:
+        import pythoncom
+        self._pythoncom=pythoncom
         try:
             pythoncom.CoInitialize()
         except Exception:
             pass
+    def enviar(self,tipo:str,msg:dict)->None:
+        from win32com.client import Dispatch
         outlook=Dispatch("Outlook.Application")
         mail=outlook.CreateItem(0)
-        mail.Subject=subj
-        mail.To="; ".join(dest)
-        linhas_publico="-"
-        try:
-            if resumo and isinstance(resumo.get("bq_rows_parcela"),int):
-                linhas_publico=str(resumo["bq_rows_parcela"])
-        except Exception:
-            linhas_publico="-"
-        tabelas_html="<br>".join(tabelas) if tabelas else "-"
-        linhas_processadas=int(linhas)
-        linhas_inseridas=int(resumo.get("linhas_persistidas",0) if resumo else 0)
-        linhas_ignoradas=max(linhas_processadas-linhas_inseridas,0)
-        hora_fim=datetime.now(TZ).strftime("%H:%M:%S")
-        html=(
-            f"<html><body style=\"font-family:Montserrat,sans-serif;text-transform:uppercase\">"
-            f"<div style=\"padding:10px;border-left:6px solid {'#2e7d32' if st=='SUCESSO' else ('#f57c00' if st=='SEM DADOS PARA PROCESSAR' else '#c62828')};background:#fafafa;font-weight:600;margin-bottom:12px\">{st}</div>"
-            f"<table cellpadding='6' style='border-collapse:collapse;font-size:14px'>"
-            f"<tr><td><b>AUTOMAÇÃO:</b></td><td>{NOME_AUTOMACAO}</td></tr>"
-            f"<tr><td><b>SCRIPT:</b></td><td>{NOME_SCRIPT}</td></tr>"
-            f"<tr><td><b>STATUS:</b></td><td>{st}</td></tr>"
-            f"<tr><td><b>HORA INICIO:</b></td><td>{amb.hora_exec}</td></tr>"
-            f"<tr><td><b>HORA FIM:</b></td><td>{hora_fim}</td></tr>"
-            f"<tr><td><b>TEMPO EXECUCAO:</b></td><td>{tempo_hms}</td></tr>"
-            f"<tr><td><b>LINHAS PROCESSADAS:</b></td><td>{linhas_processadas}</td></tr>"
-            f"<tr><td><b>LINHAS INSERIDAS:</b></td><td>{linhas_inseridas}</td></tr>"
-            f"<tr><td><b>LINHAS IGNORADAS (DUPLICADAS):</b></td><td>{linhas_ignoradas}</td></tr>"
-            f"<tr><td><b>TABELAS:</b></td><td>{tabelas_html}</td></tr>"
-            f"<tr><td><b>LINHAS PÚBLICO:</b></td><td>{linhas_publico}</td></tr>"
-            f"</table></body></html>"
-        )
-        mail.HTMLBody=html
-        anexos=list(anexos or [])
-        if amb.log_file_path.exists():
-            anexos.append(amb.log_file_path)
-        for ap in anexos:
+        mail.Subject=msg["assunto"]
+        mail.To="; ".join(msg["para"])
+        mail.HTMLBody=msg["html"]
+        for ap in msg["anexos"]:
             try:
                 if ap and Path(ap).exists():
                     mail.Attachments.Add(str(ap))
             except Exception:
-                amb.logger.warning("Falha ao anexar: %s", ap)
-        if st=="FALHA":
-            try:
-                tb_path=amb.caminho_logs/f"{STEM}_{amb.run_ts}_traceback.txt"
-                tb_path.write_text("",encoding="utf-8")
-                mail.Attachments.Add(str(tb_path))
-            except Exception:
-                pass
+                self.amb.logger.warning("Falha ao anexar: %s", ap)
         mail.Send()
-        amb.logger.info("E-mail enviado: %s", st)
-    except Exception:
-        amb.logger.error("Falha ao enviar e-mail", exc_info=True)
-    finally:
+    def finalizar(self)->None:
         try:
-            pythoncom.CoUninitialize()
+            if self._pythoncom is not None: self._pythoncom.CoUninitialize()
         except Exception:
             pass
 
+class BackendSmtp:
+    nome="smtp"
+    tipos=("email",)
+    def __init__(self,amb:Ambiente):
+        self.amb=amb
+        self.host=os.getenv("SMTP_HOST","localhost")
+        self.porta=int(os.getenv("SMTP_PORT","25"))
+        self.usuario=os.getenv("SMTP_USUARIO")
+        self.senha=os.getenv("SMTP_SENHA")
+        self.starttls=os.getenv("SMTP_STARTTLS","0").strip().lower() in ("1","true","sim")
+        self.remetente=os.getenv("SMTP_REMETENTE") or amb.usuario
+    def iniciar(self)->None:
+        pass
+    def enviar(self,tipo:str,msg:dict)->None:
+        import smtplib
+        with smtplib.SMTP(self.host,self.porta,timeout=30) as cli:
+            if self.starttls: cli.starttls()
+            if self.usuario: cli.login(self.usuario,self.senha or "")
+            cli.send_message(_mensagem_mime(msg,self.remetente))
+    def finalizar(self)->None:
+        pass
+
+class BackendArquivo:
+    nome="arquivo"
+    tipos=("email","metricas")
+    def __init__(self,amb:Ambiente):
+        self.amb=amb
+        self.pasta=Path(os.getenv("NOTIFICACAO_DIR") or (amb.caminho_logs/"notificacoes"))
+        self._n=0
+    def iniciar(self)->None:
+        self.pasta.mkdir(parents=True,exist_ok=True)
+    def enviar(self,tipo:str,dados:dict)->None:
+        self._n+=1
+        if tipo=="email":
+            (self.pasta/f"{STEM}_{self.amb.run_ts}_{self._n:02d}.eml").write_bytes(bytes(_mensagem_mime(dados,self.amb.usuario)))
+        else:
+            with open(self.pasta/f"{STEM}_{self.amb.run_ts}_metricas.jsonl","a",encoding="utf-8") as fh:
+                fh.write(json.dumps(dados,ensure_ascii=False,default=str)+"\n")
+    def finalizar(self)->None:
+        pass
+
+class BackendMetricas:
+    nome="metricas"
+    tipos=("metricas",)
+    def __init__(self,amb:Ambiente):
+        self.amb=amb
+    def iniciar(self)->None:
+        pass
+    def enviar(self,tipo:str,dados:dict)->None:
+        _modulos_corporativos()
+        from _utilAutomacoesExec import AutomacoesExecClient
+        cli=AutomacoesExecClient(logger=self.amb.logger,log_file=self.amb.log_file_path)
+        cli.publicar(**dados)
+    def finalizar(self)->None:
+        pass
+
+BACKENDS_NOTIFICACAO = {"outlook":BackendOutlook,"smtp":BackendSmtp,"arquivo":BackendArquivo,"metricas":BackendMetricas}
+
+class Notificador:
+    def __init__(self,amb:Ambiente,backends:Optional[List[Any]]=None):
+        self.amb=amb
+        self._backends=backends
+        self._filas=[]
+        self._lock=threading.Lock()
+    def backends(self)->List[Any]:
+        if self._backends is None:
+            padrao="outlook,metricas" if sys.platform=="win32" else "arquivo,metricas"
+            nomes=[n.strip().lower() for n in os.getenv("NOTIFICACAO_BACKENDS",padrao).split(",") if n.strip()]
+            self._backends=[]
+            for n in nomes:
+                if n in BACKENDS_NOTIFICACAO: self._backends.append(BACKENDS_NOTIFICACAO[n](self.amb))
+                else: self.amb.logger.warning("Backend de notificação desconhecido: %s", n)
+        return self._backends
+    def _iniciar(self)->None:
+        for b in self.backends():
+            fila=queue.Queue()
+            t=threading.Thread(target=self._loop,args=(b,fila),name=f"notificacao-{b.nome}",daemon=True)
+            t.start(); self._filas.append((b,fila,t))
+    def _loop(self,backend:Any,fila:queue.Queue)->None:
+        try:
+            backend.iniciar()
+        except Exception:
+            self.amb.logger.error("Falha ao iniciar backend de notificação %s", backend.nome, exc_info=True)
+        try:
+            while True:
+                item=fila.get()
+                if item is None: break
+                tipo,dados=item
+                t0=time.monotonic()
+                try:
+                    backend.enviar(tipo,dados)
+                    self.amb.logger.info("Notificação %s enviada via %s em %.1fs", tipo, backend.nome, time.monotonic()-t0)
+                except Exception:
+                    self.amb.logger.error("Falha ao enviar %s via %s", tipo, backend.nome, exc_info=True)
+        finally:
+            backend.finalizar()
+    def _publicar(self,tipo:str,dados:dict)->None:
+        with self._lock:
+            if not self._filas: self._iniciar()
+            for b,fila,_ in self._filas:
+                if tipo in b.tipos: fila.put((tipo,dados))
+    def email(self,msg:dict)->None:
+        self._publicar("email",msg)
+    def metricas(self,dados:dict)->None:
+        self._publicar("metricas",dados)
+    def fechar(self,timeout:float=NOTIFICACAO_TIMEOUT_SEC)->bool:
+        with self._lock:
+            filas=self._filas; self._filas=[]
+        for _,fila,_ in filas: fila.put(None)
+        limite=time.monotonic()+timeout
+        for _,_,t in filas: t.join(max(0.0,limite-time.monotonic()))
+        pendentes=[b.nome for b,_,t in filas if t.is_alive()]
+        if pendentes:
+            self.amb.logger.warning("Notificações ainda pendentes após %.0fs: %s", timeout, ", ".join(pendentes))
+        return not pendentes
+
+def enviar_email(amb:Ambiente,status:str,tempo_hms:str,tabelas:List[str],linhas:int,anexos:List[Path],resumo:Optional[dict])->None:
+    try:
+        amb.notificador.email(montar_email(amb,status,tempo_hms,tabelas,linhas,anexos,resumo))
+    except Exception:
+        amb.logger.error("Falha ao enviar e-mail", exc_info=True)
+
 def selecionar_data_especifica(amb:Ambiente)->Optional[str]:
+    from PySide6.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel, QPushButton, QHBoxLayout, QDateEdit
+    from PySide6.QtCore import QDate
     app=QApplication.instance() or QApplication(sys.argv)
     dlg=QDialog(); dlg.setWindowTitle("Selecionar Data de Corte")
     layout=QVBoxLayout(dlg)
@@ -326,50 +937,258 @@ def selecionar_data_especifica(amb:Ambiente)->Optional[str]:
         amb.logger.warning("Data inválida selecionada")
     return out
 
-def _get_access_token()->str:
-    tok=os.getenv("GCP_ACCESS_TOKEN") or os.getenv("BQ_TOKEN")
-    if tok: return tok.strip()
+class ProvedorToken:
+    def __init__(self,margem_sec:Optional[float]=None,ttl_padrao_sec:Optional[float]=None):
+        self.margem=float(margem_sec if margem_sec is not None else os.getenv("BQ_TOKEN_REFRESH_MARGIN_SEC","300"))
+        self.ttl_padrao=float(ttl_padrao_sec if ttl_padrao_sec is not None else os.getenv("BQ_TOKEN_TTL_SEC","3300"))
+        self.logger=logging.getLogger(NOME_SCRIPT)
+        self._lock=threading.Lock()
+        self._token=None
+        self._expira=None
+        self._creds=None
+        self._thread=None
+        self._parar=threading.Event()
+    def _valido(self)->bool:
+        return bool(self._token) and (self._expira is None or time.time()<self._expira-self.margem)
+    def _obter(self)->Tuple[str,Optional[float]]:
+        tok=os.getenv("GCP_ACCESS_TOKEN") or os.getenv("BQ_TOKEN")
+        if tok: return tok.strip(),None
+        try:
+            import google.auth, google.auth.transport.requests as tr
+            if self._creds is None:
+                self._creds,_=google.auth.default(scopes=["https://www.googleapis.com/auth/bigquery"])
+            self._creds.refresh(tr.Request())
+            exp=getattr(self._creds,"expiry",None)
+            return self._creds.token,(exp.replace(tzinfo=timezone.utc).timestamp() if exp else time.time()+self.ttl_padrao)
+        except Exception:
+            self._creds=None
+        out=subprocess.check_output(["gcloud","auth","print-access-token"],stderr=subprocess.STDOUT,text=True,timeout=15)
+        return out.strip(),time.time()+self.ttl_padrao
+    def token(self,forcar:bool=False)->str:
+        with self._lock:
+            if forcar or not self._valido():
+                self._token,self._expira=self._obter()
+                self.logger.info("Token GCP renovado | expira=%s", datetime.fromtimestamp(self._expira,TZ).strftime("%H:%M:%S") if self._expira else "-")
+                self._agendar()
+            return self._token
+    def _agendar(self)->None:
+        if self._expira is None or (self._thread and self._thread.is_alive()): return
+        self._thread=threading.Thread(target=self._loop,name="token-refresh",daemon=True)
+        self._thread.start()
+    def _loop(self)->None:
+        espera_falha=30.0
+        while True:
+            with self._lock:
+                exp=self._expira
+            if exp is None: return
+            if self._parar.wait(max(1.0,exp-self.margem-time.time())): return
+            try:
+                self.token(forcar=True)
+            except Exception:
+                self.logger.warning("Falha ao renovar token GCP em segundo plano", exc_info=True)
+                if self._parar.wait(espera_falha): return
+    def parar(self)->None:
+        self._parar.set()
+
+PROVEDOR_TOKEN = ProvedorToken()
+
+class ClienteBQ:
+    def __init__(self,logger:logging.Logger,base_url:str=BQ_API_URL,pool:Optional[int]=None,tokens:Optional[ProvedorToken]=None):
+        self.logger=logger
+        self.tokens=tokens or PROVEDOR_TOKEN
+        self.base_url=base_url.rstrip("/")
+        self.api_url=f"{self.base_url}/bigquery/v2"
+        self.tentativas=max(1,int(os.getenv("BQ_HTTP_RETRIES","6")))
+        self.backoff_base=float(os.getenv("BQ_HTTP_BACKOFF_SEC","1"))
+        self.backoff_max=float(os.getenv("BQ_HTTP_BACKOFF_MAX_SEC","32"))
+        tamanho=max(1,int(pool or max(10,2*int(os.getenv("BQ_PAGE_WORKERS","8")))))
+        self.session=requests.Session()
+        from requests.adapters import HTTPAdapter
+        adapter=HTTPAdapter(pool_connections=tamanho,pool_maxsize=tamanho)
+        self.session.mount("http://",adapter); self.session.mount("https://",adapter)
+        ca=os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("SSL_CERT_FILE")
+        self.session.verify=ca if ca else True
+    def _auth(self,renovar:bool=False)->dict:
+        return {"Authorization":f"Bearer {self.tokens.token(forcar=renovar)}"}
+    def _esperar(self,tent:int,motivo:str,metodo:str,url:str,retry_after:Optional[str]=None)->None:
+        espera=random.uniform(0,min(self.backoff_max,self.backoff_base*(2**(tent-1))))
+        try:
+            if retry_after: espera=max(espera,float(retry_after))
+        except ValueError:
+            pass
+        self.logger.warning("BQ %s %s | %s | retry %d em %.1fs", metodo, url.split("?")[0], motivo, tent, espera)
+        time.sleep(espera)
+    def request(self,metodo:str,url:str,**kw)->requests.Response:
+        headers=dict(kw.pop("headers",None) or {})
+        tentativas=max(1,int(kw.pop("tentativas",None) or self.tentativas))
+        renovado=False; tent=0
+        while True:
+            tent+=1
+            try:
+                r=self.session.request(metodo,url,headers={**self._auth(),**headers},**kw)
+            except (requests.ConnectionError,requests.Timeout) as e:
+                if tent>=tentativas: raise
+                self._esperar(tent,type(e).__name__,metodo,url); continue
+            if r.status_code==401 and not renovado:
+                renovado=True; self._auth(renovar=True); tent-=1; continue
+            if r.status_code in BQ_RETRY_STATUS and tent<tentativas:
+                self._esperar(tent,f"HTTP {r.status_code}",metodo,url,r.headers.get("Retry-After")); continue
+            return r
+    def get(self,url:str,**kw)->requests.Response:
+        return self.request("GET",url,**kw)
+    def post(self,url:str,**kw)->requests.Response:
+        return self.request("POST",url,**kw)
+    def put(self,url:str,**kw)->requests.Response:
+        return self.request("PUT",url,**kw)
+    def projeto(self,project_id:str)->str:
+        return f"{self.api_url}/projects/{project_id}"
+    def upload(self,project_id:str)->str:
+        return f"{self.base_url}/upload/bigquery/v2/projects/{project_id}"
+
+BQ_TIPOS_INT = ("INT64","INTEGER")
+BQ_TIPOS_FLOAT = ("FLOAT64","FLOAT","NUMERIC","BIGNUMERIC")
+BQ_TIPOS_BOOL = ("BOOL","BOOLEAN")
+BQ_TIPOS_RECORD = ("RECORD","STRUCT")
+
+def _bq_valor(campo:dict,v:Any)->Any:
+    if v is None: return None
+    t=str(campo.get("type","STRING")).upper()
+    if campo.get("mode")=="REPEATED":
+        item={**campo,"mode":"NULLABLE"}
+        return [_bq_valor(item,x.get("v") if isinstance(x,dict) else x) for x in v]
+    if t in BQ_TIPOS_RECORD:
+        subs=campo.get("fields") or []
+        fs=(v.get("f") if isinstance(v,dict) else None) or []
+        return {sf["name"]:_bq_valor(sf,fs[i].get("v") if i<len(fs) else None) for i,sf in enumerate(subs)}
     try:
-        import google.auth, google.auth.transport.requests as tr
-        creds,_=google.auth.default(scopes=["https://www.googleapis.com/auth/bigquery"])
-        if not creds.valid:
-            req=tr.Request()
-            creds.refresh(req)
-        return creds.token
-    except Exception:
+        if t in BQ_TIPOS_INT: return int(v)
+        if t in BQ_TIPOS_FLOAT: return float(v)
+        if t in BQ_TIPOS_BOOL: return str(v).lower()=="true"
+    except (TypeError,ValueError):
+        return None
+    return str(v)
+
+def _bq_colunas(n:int,rows:List[dict])->List[Any]:
+    if not rows: return [[] for _ in range(n)]
+    try:
+        fs=[r["f"] for r in rows]
+        return [[f[i]["v"] for f in fs] for i in range(n)]
+    except (KeyError,TypeError,IndexError):
         pass
-    out=subprocess.check_output(["gcloud","auth","print-access-token"],stderr=subprocess.STDOUT,text=True,timeout=15)
-    return out.strip()
+    def _celula(r:dict,i:int)->Any:
+        f=r.get("f") or []
+        return f[i].get("v") if i<len(f) else None
+    return [[_celula(r,i) for r in rows] for i in range(n)]
+
+def _bq_escalar(campo:dict)->bool:
+    return campo.get("mode")!="REPEATED" and str(campo.get("type","STRING")).upper() not in BQ_TIPOS_RECORD
+
+def _bq_cast(campo:dict)->Optional[pl.Expr]:
+    n=campo["name"]; t=str(campo.get("type","STRING")).upper()
+    if t in BQ_TIPOS_INT: return pl.col(n).cast(pl.Int64,strict=False)
+    if t in BQ_TIPOS_FLOAT: return pl.col(n).cast(pl.Float64,strict=False)
+    if t in BQ_TIPOS_BOOL: return (pl.col(n).str.to_lowercase()=="true").alias(n)
+    return None
 
 def _rows_to_polars(schema:List[dict],rows:List[dict])->pl.DataFrame:
-    cols=[f["name"] for f in schema]
-    data={c:[] for c in cols}
-    for r in rows or []:
-        f=r.get("f",[])
-        for i,c in enumerate(cols):
-            v=f[i]["v"] if i<len(f) else None
-            data[c].append(v)
-    df=pl.DataFrame(data)
-    for f in schema:
-        n=f["name"]; t=f.get("type","STRING")
-        if t in ("INT64","INTEGER"): df=df.with_columns(pl.col(n).cast(pl.Int64,strict=False))
-        elif t in ("FLOAT64","FLOAT","NUMERIC","BIGNUMERIC"): df=df.with_columns(pl.col(n).cast(pl.Float64,strict=False))
-        elif t in ("BOOL","BOOLEAN"): df=df.with_columns(pl.col(n).cast(pl.Boolean,strict=False))
-        elif t in ("DATE",): df=df.with_columns(pl.col(n).cast(pl.Utf8,strict=False))
-        else: df=df.with_columns(pl.col(n).cast(pl.Utf8,strict=False))
-    return df
-
-def bq_query_rest(amb:Ambiente,sql:str,project_id:str=BQ_PROJECT_ID,location:str=BQ_LOCATION,timeout:int=120)->pl.DataFrame:
-    token=_get_access_token()
-    url=f"https://bigquery.googleapis.com/bigquery/v2/projects/{project_id}/queries"
-    headers={"Authorization":f"Bearer {token}","Content-Type":"application/json"}
+    series=[]; casts=[]
+    for f,vals in zip(schema,_bq_colunas(len(schema),rows or [])):
+        if not _bq_escalar(f):
+            series.append(pl.Series(f["name"],[_bq_valor(f,v) for v in vals]))
+            continue
+        series.append(pl.Series(f["name"],vals,dtype=pl.Utf8))
+        c=_bq_cast(f)
+        if c is not None: casts.append(c)
+    df=pl.DataFrame(series)
+    return df.with_columns(casts) if casts else df
+
+def _bq_pagina(schema:List[dict],conteudo:bytes)->Tuple[pl.DataFrame,dict]:
+    if schema and all(_bq_escalar(f) for f in schema):
+        try:
+            bruto=pl.read_json(io.BytesIO(conteudo),schema={"pageToken":pl.Utf8,"totalRows":pl.Utf8,"rows":pl.List(pl.Struct({"f":pl.List(pl.Struct({"v":pl.Utf8}))}))})
+            df=(bruto.select(pl.col("rows").explode()).filter(pl.col("rows").is_not_null())
+                .select([pl.col("rows").struct.field("f").list.get(i,null_on_oob=True).struct.field("v").alias(f["name"]) for i,f in enumerate(schema)]))
+            casts=[c for c in (_bq_cast(f) for f in schema) if c is not None]
+            return (df.with_columns(casts) if casts else df),{"pageToken":bruto["pageToken"][0],"totalRows":bruto["totalRows"][0]}
+        except Exception:
+            pass
+    j=json.loads(conteudo)
+    return _rows_to_polars(schema,j.get("rows") or []),{"pageToken":j.get("pageToken"),"totalRows":j.get("totalRows")}
+
+class _DestinoPaginas:
+    def __init__(self,pasta:Optional[Path],limite_bytes:int,spans:Optional[Spans]=None):
+        self.pasta=pasta
+        self.spans=spans
+        self.limite_bytes=max(1,int(limite_bytes))
+        self.frames=[]
+        self.bytes=0
+        self.partes=0
+        self.linhas=0
+        if pasta is not None:
+            shutil.rmtree(pasta,ignore_errors=True)
+            pasta.mkdir(parents=True,exist_ok=True)
+    def adicionar(self,df:pl.DataFrame)->None:
+        self.frames.append(df); self.linhas+=df.height
+        if self.pasta is None: return
+        self.bytes+=df.estimated_size()
+        if self.bytes>=self.limite_bytes: self._despejar()
+    def _despejar(self)->None:
+        if not self.frames: return
+        df=pl.concat(self.frames,how="vertical_relaxed") if len(self.frames)>1 else self.frames[0]
+        if self.spans is None: df.write_parquet(self.pasta/f"part-{self.partes:05d}.parquet")
+        else:
+            with self.spans.medir("parquet.escrita",arquivo=f"part-{self.partes:05d}.parquet",linhas=df.height):
+                df.write_parquet(self.pasta/f"part-{self.partes:05d}.parquet")
+        self.partes+=1; self.frames=[]; self.bytes=0
+    def resultado(self)->"pl.DataFrame|pl.LazyFrame":
+        if self.pasta is None:
+            return pl.concat(self.frames,how="vertical_relaxed") if len(self.frames)>1 else self.frames[0]
+        self._despejar()
+        return pl.scan_parquet(self.pasta/"*.parquet")
+
+def _bq_faixa(amb:Ambiente,qurl:str,location:str,schema:List[dict],inicio:int,fim:int,timeout:int)->pl.DataFrame:
+    frames=[]; pos=inicio; vazias=0
+    tentativas=max(1,int(os.getenv("BQ_PAGINA_VAZIA_RETRIES","3")))
+    while pos<fim:
+        with amb.spans.medir("bq.pagina.busca",inicio=pos):
+            rr=amb.bq.get(qurl,params={"location":location,"startIndex":str(pos),"maxResults":str(fim-pos)},timeout=timeout)
+        if rr.status_code!=200:
+            amb.logger.error("BQ page HTTP %s startIndex=%d: %s", rr.status_code, pos, rr.text)
+            raise RuntimeError("BigQuery page falhou")
+        with amb.spans.medir("bq.pagina.decodificacao",bytes=len(rr.content)):
+            df_pag,_=_bq_pagina(schema,rr.content)
+        if df_pag.height==0:
+            vazias+=1
+            if vazias>tentativas:
+                amb.logger.error("BQ page vazia startIndex=%d fim=%d após %d tentativas", pos, fim, tentativas)
+                raise RuntimeError("BigQuery page incompleta")
+            amb.bq._esperar(vazias,"página vazia antes do fim da faixa","GET",qurl); continue
+        frames.append(df_pag); pos+=df_pag.height; vazias=0
+    if not frames: return _rows_to_polars(schema,[])
+    return pl.concat(frames,how="vertical_relaxed") if len(frames)>1 else frames[0]
+
+def _bq_parametros(params:dict)->List[dict]:
+    out=[]
+    for nome,valor in params.items():
+        if isinstance(valor,bool): tipo,v="BOOL","true" if valor else "false"
+        elif isinstance(valor,int): tipo,v="INT64",str(valor)
+        elif isinstance(valor,float): tipo,v="FLOAT64",repr(valor)
+        elif isinstance(valor,datetime): tipo,v="TIMESTAMP",valor.isoformat()
+        elif isinstance(valor,date): tipo,v="DATE",valor.isoformat()
+        else: tipo,v="STRING",None if valor is None else str(valor)
+        out.append({"name":nome,"parameterType":{"type":tipo},"parameterValue":{"value":v}})
+    return out
+
+def bq_query_rest(amb:Ambiente,sql:str,project_id:str=BQ_PROJECT_ID,location:str=BQ_LOCATION,timeout:int=120,destino:Optional[Path]=None,ordenado:bool=True,params:Optional[dict]=None)->"pl.DataFrame|pl.LazyFrame":
+    url=f"{amb.bq.projeto(project_id)}/queries"
     max_results=int(os.getenv("BQ_MAX_RESULTS","100000"))
     poll_interval=float(os.getenv("BQ_POLL_INTERVAL_SEC","1.5"))
     max_wait=float(os.getenv("BQ_MAX_WAIT_SEC","600"))
     payload={"query":sql,"useLegacySql":False,"location":location,"maxResults":max_results}
-    ca=os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("SSL_CERT_FILE")
+    if params: payload.update({"parameterMode":"NAMED","queryParameters":_bq_parametros(params)})
     amb.logger.info("BQ REST submit | project=%s | location=%s", project_id, location)
-    r=requests.post(url,headers=headers,data=json.dumps(payload),timeout=timeout,verify=ca if ca else True)
+    with amb.spans.medir("bq.submit"):
+        r=amb.bq.post(url,json=payload,timeout=timeout)
     if r.status_code!=200:
         amb.logger.error("BQ submit HTTP %s: %s", r.status_code, r.text)
         raise RuntimeError("BigQuery submit falhou")
@@ -380,15 +1199,17 @@ def bq_query_rest(amb:Ambiente,sql:str,project_id:str=BQ_PROJECT_ID,location:str
     schema_fields=(j.get("schema") or {}).get("fields",[]) or []
     rows_acc=list(j.get("rows") or [])
     total=int(j.get("totalRows",len(rows_acc) if rows_acc else 0) or 0)
+    informado="totalRows" in j
     amb.logger.info("BQ job_id=%s | complete=%s | total=%s", job_ref, complete, total)
-    qurl=f"https://bigquery.googleapis.com/bigquery/v2/projects/{project_id}/queries/{job_ref}"
+    qurl=f"{amb.bq.projeto(project_id)}/queries/{job_ref}"
     start=datetime.now(tz=timezone.utc).timestamp()
     while not complete:
         if datetime.now(tz=timezone.utc).timestamp()-start>max_wait:
             amb.logger.error("BQ timeout aguardando jobComplete id=%s", job_ref)
             raise RuntimeError("BigQuery timeout")
-        import time as _t; _t.sleep(poll_interval)
-        rr=requests.get(qurl,headers=headers,params={"location":location,"maxResults":str(max_results)},timeout=timeout,verify=ca if ca else True)
+        time.sleep(poll_interval)
+        with amb.spans.medir("bq.poll"):
+            rr=amb.bq.get(qurl,params={"location":location,"maxResults":str(max_results)},timeout=timeout)
         if rr.status_code!=200:
             amb.logger.error("BQ poll HTTP %s: %s", rr.status_code, rr.text)
             raise RuntimeError("BigQuery poll falhou")
@@ -397,19 +1218,46 @@ def bq_query_rest(amb:Ambiente,sql:str,project_id:str=BQ_PROJECT_ID,location:str
         if not schema_fields: schema_fields=(jj.get("schema") or {}).get("fields",[]) or schema_fields
         new=jj.get("rows") or []
         if new: rows_acc.extend(new)
-        page_token=jj.get("pageToken"); total=int(jj.get("totalRows",total or 0) or 0)
+        page_token=jj.get("pageToken"); total=int(jj.get("totalRows",total or 0) or 0); informado=informado or "totalRows" in jj
+    if not schema_fields:
+        amb.logger.warning("BQ schema vazio id=%s", job_ref)
+        return pl.DataFrame().lazy() if destino is not None else pl.DataFrame()
+    saida=_DestinoPaginas(destino,int(float(os.getenv("BQ_STREAM_MEM_MB","256"))*1024*1024),amb.spans)
+    with amb.spans.medir("bq.pagina.decodificacao",linhas=len(rows_acc)):
+        df_pag=_rows_to_polars(schema_fields,rows_acc)
+    saida.adicionar(df_pag); rows_acc=[]
+    workers=int(os.getenv("BQ_PAGE_WORKERS","8"))
+    if page_token and workers>1 and total>saida.linhas:
+        faixas=[(i,min(i+max_results,total)) for i in range(saida.linhas,total,max_results)]
+        amb.logger.info("BQ paginação paralela id=%s | paginas=%d | workers=%d | ordenado=%s", job_ref, len(faixas), min(workers,len(faixas)), ordenado)
+        with ThreadPoolExecutor(max_workers=min(workers,len(faixas))) as executor:
+            futuros={executor.submit(_bq_faixa,amb,qurl,location,schema_fields,a,b,timeout):k for k,(a,b) in enumerate(faixas)}
+            prontos={}; prox=0
+            try:
+                for fut in as_completed(futuros):
+                    if not ordenado:
+                        saida.adicionar(fut.result()); continue
+                    prontos[futuros[fut]]=fut.result()
+                    while prox in prontos:
+                        saida.adicionar(prontos.pop(prox)); prox+=1
+            except Exception:
+                for fut in futuros: fut.cancel()
+                raise
+        page_token=None
     while page_token:
-        rr=requests.get(qurl,headers=headers,params={"location":location,"maxResults":str(max_results),"pageToken":page_token},timeout=timeout,verify=ca if ca else True)
+        with amb.spans.medir("bq.pagina.busca",token=page_token):
+            rr=amb.bq.get(qurl,params={"location":location,"maxResults":str(max_results),"pageToken":page_token},timeout=timeout)
         if rr.status_code!=200:
             amb.logger.error("BQ page HTTP %s: %s", rr.status_code, rr.text)
             raise RuntimeError("BigQuery page falhou")
-        jj=rr.json(); rows_acc.extend(jj.get("rows") or []); page_token=jj.get("pageToken")
-    if not schema_fields:
-        amb.logger.warning("BQ schema vazio id=%s", job_ref)
-        return pl.DataFrame()
-    df=_rows_to_polars(schema_fields,rows_acc)
-    amb.logger.info("BQ concluído id=%s | linhas=%d | colunas=%d", job_ref, df.height, len(df.columns))
-    return df
+        with amb.spans.medir("bq.pagina.decodificacao",bytes=len(rr.content)):
+            df_pag,meta=_bq_pagina(schema_fields,rr.content)
+        saida.adicionar(df_pag); page_token=meta.get("pageToken")
+    if informado and saida.linhas!=total:
+        amb.logger.error("BQ linhas recebidas divergem de totalRows id=%s | recebidas=%d | total=%d", job_ref, saida.linhas, total)
+        raise RuntimeError("BigQuery resultado incompleto")
+    amb.logger.info("BQ concluído id=%s | linhas=%d | colunas=%d | partes=%d", job_ref, saida.linhas, len(schema_fields), saida.partes)
+    return saida.resultado()
 
 def locator_from(page:Page,spec:Any):
     if isinstance(spec,dict):
@@ -457,12 +1305,139 @@ def immortal_click(amb:Ambiente,page:Page,spec:Any)->None:
 def wait_visible(page:Page,spec:Any)->None:
     locator_from(page,spec).wait_for(state="visible")
 
-def criar_contexto(amb:Ambiente,pw)->Tuple[BrowserContext,Page]:
-    engine={"chromium":pw.chromium,"firefox":pw.firefox,"webkit":pw.webkit}.get("chromium",pw.chromium)
-    browser=engine.launch(headless=HEADLESS)
-    context=browser.new_context(accept_downloads=True,viewport={"width":1920,"height":1080})
-    page=context.new_page(); page.set_default_timeout(int(os.getenv("PLAYWRIGHT_TIMEOUT_MS","60000")))
-    return context,page
+class ProxyNavegador:
+    def __init__(self,loop,obj:Any):
+        self._loop=loop
+        self._obj=obj
+    def _no_loop(self,fn:Callable[[],Any])->Any:
+        async def _executar():
+            r=fn()
+            return (await r) if hasattr(r,"__await__") else r
+        r=asyncio.run_coroutine_threadsafe(_executar(),self._loop).result()
+        return ProxyNavegador(self._loop,r) if hasattr(r,"_impl_obj") else r
+    def __getattr__(self,nome:str)->Any:
+        attr=getattr(self._obj,nome)
+        if hasattr(attr,"_impl_obj"): return ProxyNavegador(self._loop,attr)
+        if not callable(attr): return attr
+        return lambda *a,**k:self._no_loop(lambda:attr(*a,**k))
+
+class PoolNavegador:
+    def __init__(self,amb:Ambiente,tamanho:int):
+        self.amb=amb
+        self.tamanho=max(1,int(tamanho))
+        self.paginas=queue.Queue()
+        self.executor=None
+        self.thread=None
+        self.loop=None
+        self.context=None
+        self._parar=None
+        self._pronto=threading.Event()
+        self._erro=None
+    async def _hospedar(self)->None:
+        from playwright.async_api import async_playwright
+        try:
+            async with async_playwright() as pw:
+                browser=await pw.chromium.launch(headless=HEADLESS)
+                try:
+                    self.context=await browser.new_context(accept_downloads=True,viewport={"width":1920,"height":1080})
+                    self._parar=asyncio.Event()
+                    self._pronto.set()
+                    await self._parar.wait()
+                finally:
+                    await browser.close()
+        except BaseException as e:
+            self._erro=e
+        finally:
+            self._pronto.set()
+    def _loop(self)->None:
+        self.loop=asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._hospedar())
+        finally:
+            self.loop.close()
+    def _nova_pagina(self)->ProxyNavegador:
+        with self.amb.spans.medir("navegador.pagina"):
+            page=ProxyNavegador(self.loop,self.context).new_page()
+            page.set_default_timeout(int(os.getenv("PLAYWRIGHT_TIMEOUT_MS","60000")))
+        return page
+    def _autenticar(self)->None:
+        tentativas=max(1,int(os.getenv("LOGIN_TENTATIVAS",str(self.amb.retry.max_tentativas))))
+        page=self._nova_pagina()
+        for tent in range(1,tentativas+1):
+            try:
+                Rundeck(self.amb,page)._login()
+                self.paginas.put(page)
+                return
+            except Exception:
+                if tent>=tentativas: raise
+                espera=self.amb.retry.espera(tent)
+                self.amb.logger.warning("Login inicial do pool falhou | tentativa %d/%d | nova tentativa em %.1fs", tent, tentativas, espera, exc_info=True)
+                time.sleep(espera)
+    def __enter__(self)->"PoolNavegador":
+        with self.amb.spans.medir("navegador.inicio"):
+            self.thread=threading.Thread(target=self._loop,name="navegador",daemon=True)
+            self.thread.start()
+            self._pronto.wait()
+            if self._erro is not None:
+                self.thread.join()
+                raise RuntimeError("Falha ao abrir navegador do pool") from self._erro
+            try:
+                self._autenticar()
+            except BaseException:
+                self._fechar_navegador(); raise
+        self.executor=ThreadPoolExecutor(max_workers=self.tamanho,thread_name_prefix="pagina")
+        self.amb.logger.info("Pool de navegador pronto | paginas=%d", self.tamanho)
+        return self
+    def _executar(self,fn,args:tuple)->Any:
+        try:
+            page=self.paginas.get_nowait()
+        except queue.Empty:
+            page=self._nova_pagina()
+        try:
+            return fn(*args,Rundeck(self.amb,page))
+        finally:
+            if not page.is_closed(): self.paginas.put(page)
+    def submit(self,fn,*args)->Future:
+        return self.executor.submit(self._executar,fn,args)
+    def _fechar_navegador(self)->None:
+        if self.thread is None: return
+        if self._parar is not None and not self.loop.is_closed(): self.loop.call_soon_threadsafe(self._parar.set)
+        self.thread.join()
+        self.thread=None
+    def __exit__(self,*exc)->None:
+        if self.executor is not None: self.executor.shutdown(wait=True)
+        self._fechar_navegador()
+
+class JournalCampanhas:
+    def __init__(self,path:Path,run_id:str):
+        self.path=path
+        self.run_id=run_id
+        self._lock=threading.Lock()
+    def registrar(self,cid:str,estado:str,**extra)->None:
+        linha=json.dumps({"ts":datetime.now(TZ).isoformat(timespec="seconds"),"run_id":self.run_id,"campaign_id":str(cid),"estado":estado,**extra},ensure_ascii=False)
+        with self._lock:
+            with open(self.path,"a",encoding="utf-8") as fh:
+                fh.write(linha+"\n"); fh.flush(); os.fsync(fh.fileno())
+    def estados(self)->dict:
+        out={}
+        try:
+            with open(self.path,"r",encoding="utf-8") as fh:
+                for linha in fh:
+                    try:
+                        rec=json.loads(linha)
+                    except ValueError:
+                        continue
+                    out[str(rec.get("campaign_id"))]=rec
+        except FileNotFoundError:
+            pass
+        return out
+    def concluidas(self)->dict:
+        return {cid:rec for cid,rec in self.estados().items() if rec.get("estado")=="SUCCEEDED" or (rec.get("estado")=="PERSISTIDA" and rec.get("status")=="SUCCEEDED")}
+    def persistidas(self)->set:
+        return {cid for cid,rec in self.estados().items() if rec.get("estado")=="PERSISTIDA"}
+    def reiniciar(self)->None:
+        with self._lock:
+            self.path.unlink(missing_ok=True)
 
 def safe_prepare_dir(amb:Ambiente,dirpath:Path,label:str)->None:
     amb.logger.info("Preparando %s: %s", label, dirpath)
@@ -484,114 +1459,643 @@ def safe_prepare_dir(amb:Ambiente,dirpath:Path,label:str)->None:
     except Exception:
         amb.logger.error("Falha ao preparar %s: %s", label, dirpath, exc_info=True); raise
 
-def baixar_dados(amb:Ambiente,data_corte:str)->pl.DataFrame:
-    safe_prepare_dir(amb,amb.caminho_input,"arquivos_input")
+def _chave_campanha(colunas:List[str])->pl.Expr:
+    if "Data_Vencimento" in colunas: return pl.concat_str([pl.col("Data_Vencimento"),pl.col("CAMPAIGN_ID").cast(pl.Utf8)],separator="_")
+    return pl.col("CAMPAIGN_ID").cast(pl.Utf8)
+
+def _separar_chave(chave:str)->Tuple[Optional[str],str]:
+    venc,_,cid=str(chave).rpartition("_")
+    return venc or None,cid
+
+def _colunas(df:"pl.DataFrame|pl.LazyFrame")->List[str]:
+    return df.collect_schema().names()
+
+def _total_campanhas(df:"pl.DataFrame|pl.LazyFrame")->int:
+    return int(df.lazy().select(_chave_campanha(_colunas(df)).drop_nulls().n_unique()).collect().item())
+
+def _filtrar_base(lf:pl.LazyFrame)->pl.LazyFrame:
+    return lf.filter(pl.col("CAMPAIGN_ID").is_not_null()).select(["DATA_CORTE","Data_Vencimento","ACCOUNT_ID","CAMPAIGN_ID"] if "DATA_CORTE" in _colunas(lf) else ["ACCOUNT_ID","CAMPAIGN_ID"])
+
+def _partes_base(pasta:Path)->List[Path]:
+    return sorted((pasta/BASE_PUBLICO).glob("part-*.parquet")) or [p for p in (pasta/"base.parquet",) if p.exists()]
+
+def ler_base(pasta:Path)->Optional[pl.LazyFrame]:
+    partes=_partes_base(pasta)
+    return _filtrar_base(pl.scan_parquet(partes)) if partes else None
+
+def _lotes_base(pasta:Path)->Iterator[pl.DataFrame]:
+    for p in _partes_base(pasta):
+        lote=_filtrar_base(pl.scan_parquet(p)).collect()
+        if lote.height: yield lote
+
+def _anexar_csv_campanha(pasta:Path,e:dict,grp:pl.DataFrame,max_linhas:int)->None:
+    inicio=0
+    while inicio<grp.height:
+        if e["partes"] is None: nome=f"{e['chave']}.csv"; cabe=grp.height
+        else:
+            n=e["linhas"]//max_linhas+1; cabe=max_linhas-e["linhas"]%max_linhas; nome=f"{e['chave']}__p{n}.csv"
+            if len(e["partes"])<n: e["partes"].append({"unidade":Path(nome).stem,"arquivo":nome,"linhas":0,"bytes":0,"_h":hashlib.sha256()})
+        fatia=grp.slice(inicio,cabe)
+        conteudo=fatia.select("ACCOUNT_ID").write_csv(include_header=False).encode("utf-8")
+        with open(pasta/nome,"ab" if nome in e["_abertos"] else "wb") as fh: fh.write(conteudo)
+        e["_abertos"].add(nome); e["_h"].update(conteudo)
+        e["linhas"]+=fatia.height; e["bytes"]+=len(conteudo); e["gravadas"]+=conteudo.count(b"\n")
+        if e["partes"] is not None:
+            x=e["partes"][-1]; x["linhas"]+=fatia.height; x["bytes"]+=len(conteudo); x["_h"].update(conteudo)
+        inicio+=fatia.height
+
+def escrever_campanhas(amb:Ambiente,pasta:Path,max_linhas:int=MAX_LINHAS_EXECUCAO)->dict:
+    lf=ler_base(pasta)
+    colunas=_colunas(lf)
+    backfill="Data_Vencimento" in colunas
+    grupo=(["Data_Vencimento"] if backfill else [])+["CAMPAIGN_ID"]
+    contagem=lf.group_by(grupo).len().with_columns(_chave_campanha(colunas).alias("chave")).collect()
+    estado={}
+    for r in contagem.iter_rows(named=True):
+        dividir=max_linhas>0 and r["len"]>max_linhas
+        estado[tuple(r[c] for c in grupo)]={"chave":r["chave"],"campaign_id":int(r["CAMPAIGN_ID"]),"vencimento":r.get("Data_Vencimento"),"esperadas":int(r["len"]),"linhas":0,"gravadas":0,"bytes":0,"partes":[] if dividir else None,"_h":hashlib.sha256(),"_abertos":set()}
+    workers=max(1,int(os.getenv("CSV_WORKERS","8")))
+    with ThreadPoolExecutor(max_workers=min(workers,max(1,len(estado)))) as executor:
+        for lote in _lotes_base(pasta):
+            with amb.spans.medir("csv.lote",linhas=lote.height):
+                grupos=lote.partition_by(grupo,as_dict=True)
+                list(executor.map(lambda kg:_anexar_csv_campanha(pasta,estado[kg[0]],kg[1],max_linhas),grupos.items()))
+    entradas=[]
+    for e in sorted(estado.values(),key=lambda e:(e["vencimento"] or "",e["campaign_id"])):
+        extra={"chave":e["chave"],"vencimento":e["vencimento"]} if backfill else {}
+        entrada={"campaign_id":e["campaign_id"],**extra,"arquivo":None if e["partes"] is not None else f"{e['chave']}.csv","linhas":e["linhas"],"bytes":e["bytes"],"sha256":e["_h"].hexdigest()}
+        if e["partes"] is not None: entrada["partes"]=[{**{k:v for k,v in x.items() if k!="_h"},"sha256":x["_h"].hexdigest()} for x in e["partes"]]
+        entradas.append(entrada)
+    for idx,e in enumerate(entradas,start=1):
+        if e.get("partes"): amb.logger.info("[%d] CSV salvo: campanha %s em %d partes | linhas=%d", idx, e["campaign_id"], len(e["partes"]), e["linhas"])
+        else: amb.logger.info("[%d] CSV salvo: %s | linhas=%d", idx, e["arquivo"], e["linhas"])
+    total_csv=sum(e["linhas"] for e in entradas)
+    manifesto={"run_id":amb.run_ts,"gerado_em":datetime.now(TZ).isoformat(timespec="seconds"),"data_corte":amb.last_data_corte,"data_ate":amb.last_data_ate,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"linhas_publico":amb.last_rows_publico,"bq_rows_ja_vinculadas":amb.last_rows_ja_vinculadas,"cache":amb.last_cache_chave,"linhas":total_csv,"campanhas":entradas}
+    (pasta/MANIFESTO_CSV).write_text(json.dumps(manifesto,ensure_ascii=False,indent=2),encoding="utf-8")
+    fonte=amb.last_rows_publico if amb.last_rows_publico is not None else sum(e["esperadas"] for e in estado.values())
+    gravadas=sum(e["gravadas"] for e in estado.values())
+    if gravadas!=fonte:
+        amb.logger.warning("Inconsistência contagem: parquet=%d csvs=%d", fonte, gravadas)
+    return manifesto
+
+def ler_manifesto(pasta:Path)->Optional[dict]:
     try:
-        datetime.strptime(data_corte,"%Y-%m-%d")
-    except ValueError:
-        amb.logger.error("Data inválida: %s", data_corte); raise
-    amb.logger.info("BAIXAR_DADOS | data_corte=%s", data_corte)
-    sql_corte=f"SELECT Data_Vencimento FROM `{BQ_SOURCE_PROJECT_ID}.SHARED_OPS.TB_DATA_CORTE_FATURAS` WHERE DATA_GERACAO_ROBO = '{data_corte}'"
-    amb.last_sql_corte=sql_corte
-    corte_df=bq_query_rest(amb,sql_corte,project_id=BQ_PROJECT_ID,location=BQ_LOCATION)
-    amb.last_rows_corte=int(corte_df.height or 0)
-    if corte_df.height==0:
-        amb.last_vencimento=None
-        amb.logger.info("Sem registros de corte para %s", data_corte)
-        return pl.DataFrame()
+        return json.loads((pasta/MANIFESTO_CSV).read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+def bq_ultima_modificacao(amb:Ambiente,tabela:str)->Optional[str]:
     try:
-        venc=str(corte_df["Data_Vencimento"].cast(pl.Utf8,strict=False).str.strip_chars().to_list()[0])
+        project_id,dataset_id,table_id=tabela.split(".")
+        r=amb.bq.get(f"{amb.bq.projeto(project_id)}/datasets/{dataset_id}/tables/{table_id}",timeout=30)
+        if r.status_code!=200:
+            amb.logger.warning("BQ metadados HTTP %s: %s", r.status_code, tabela); return None
+        return str((r.json() or {}).get("lastModifiedTime") or "") or None
     except Exception:
-        venc=str(corte_df["Data_Vencimento"].to_list()[0])
+        amb.logger.warning("Falha ao ler metadados de %s", tabela, exc_info=True)
+        return None
+
+class CacheExtracao:
+    ARQUIVOS = (f"{BASE_PUBLICO}/part-*.parquet",MANIFESTO_CSV,"*.csv")
+    def __init__(self,amb:Ambiente,raiz:Optional[Path]=None):
+        self.amb=amb
+        base=Path(os.getenv("LOCALAPPDATA") or (Path.home()/".cache"))
+        self.raiz=Path(os.getenv("CACHE_EXTRACAO_DIR") or (base/NOME_AUTOMACAO/STEM)) if raiz is None else raiz
+        self.ttl=float(os.getenv("CACHE_TTL_HORAS","24"))*3600
+        self.max_bytes=int(float(os.getenv("CACHE_MAX_MB","2048"))*1024*1024)
+    def chave(self,*partes:Any)->Optional[str]:
+        if any(p is None for p in partes): return None
+        return hashlib.sha256("\x1f".join([CACHE_VERSAO,*[str(p) for p in partes]]).encode("utf-8")).hexdigest()[:32]
+    def _arquivos(self,pasta:Path)->List[Path]:
+        out=[]
+        for padrao in self.ARQUIVOS: out.extend(p for p in pasta.glob(padrao) if p.is_file())
+        return out
+    def _expirada(self,pasta:Path)->bool:
+        try:
+            meta=json.loads((pasta/"meta.json").read_text(encoding="utf-8"))
+            return time.time()-float(meta.get("criado_em",0))>self.ttl
+        except Exception:
+            return True
+    def obter(self,chave:str)->Optional[Path]:
+        pasta=self.raiz/chave
+        if not (pasta/"meta.json").exists(): return None
+        if self._expirada(pasta):
+            shutil.rmtree(pasta,ignore_errors=True); return None
+        os.utime(pasta/"meta.json")
+        return pasta
+    def restaurar(self,pasta:Path,destino:Path)->None:
+        destino.mkdir(parents=True,exist_ok=True)
+        for p in self._arquivos(pasta):
+            alvo=destino/p.relative_to(pasta); alvo.parent.mkdir(parents=True,exist_ok=True)
+            shutil.copy2(p,alvo)
+    def guardar(self,chave:str,origem:Path)->None:
+        try:
+            self.raiz.mkdir(parents=True,exist_ok=True)
+            tmp=self.raiz/f".{chave}.{uuid.uuid4().hex[:8]}"
+            tmp.mkdir()
+            arquivos=self._arquivos(origem)
+            for p in arquivos:
+                alvo=tmp/p.relative_to(origem); alvo.parent.mkdir(parents=True,exist_ok=True)
+                shutil.copy2(p,alvo)
+            (tmp/"meta.json").write_text(json.dumps({"chave":chave,"criado_em":time.time(),"run_id":self.amb.run_ts,"bytes":sum(p.stat().st_size for p in arquivos)}),encoding="utf-8")
+            shutil.rmtree(self.raiz/chave,ignore_errors=True)
+            tmp.rename(self.raiz/chave)
+            self.amb.logger.info("Cache de extração gravado: %s", chave)
+        except Exception:
+            self.amb.logger.warning("Falha ao gravar cache de extração", exc_info=True)
+        self.limpar()
+    def limpar(self)->None:
+        try:
+            entradas=[]
+            for pasta in self.raiz.iterdir():
+                if not pasta.is_dir(): continue
+                if pasta.name.startswith(".") and time.time()-pasta.stat().st_mtime>3600:
+                    shutil.rmtree(pasta,ignore_errors=True); continue
+                if pasta.name.startswith("."): continue
+                if self._expirada(pasta):
+                    shutil.rmtree(pasta,ignore_errors=True); continue
+                tamanho=sum(p.stat().st_size for p in pasta.rglob("*") if p.is_file())
+                entradas.append(((pasta/"meta.json").stat().st_mtime,tamanho,pasta))
+            total=sum(t for _,t,_ in entradas)
+            for _,tamanho,pasta in sorted(entradas,key=lambda e:e[0]):
+                if total<=self.max_bytes: break
+                shutil.rmtree(pasta,ignore_errors=True); total-=tamanho
+                self.amb.logger.info("Cache de extração removido por tamanho: %s", pasta.name)
+        except Exception:
+            self.amb.logger.warning("Falha ao limpar cache de extração", exc_info=True)
+
+def _restaurar_manifesto(amb:Ambiente,manifesto:dict)->None:
+    amb.last_data_ate=manifesto.get("data_ate")
+    amb.last_vencimento=manifesto.get("vencimento")
+    amb.last_rows_corte=manifesto.get("bq_rows_corte")
+    amb.last_rows_publico=manifesto.get("linhas_publico")
+    amb.last_rows_ja_vinculadas=int(manifesto.get("bq_rows_ja_vinculadas") or 0)
+    amb.last_cache_chave=manifesto.get("cache")
+
+def _mapear_periodo(amb:Ambiente,cabecalho:pl.DataFrame,data_de:str,data_ate:str)->None:
+    datas=set()
+    for venc,dc,ds in zip(cabecalho["Data_Vencimento"].to_list(),cabecalho["DATA_CORTE"].to_list(),cabecalho["DATAS"].to_list()):
+        xs=[d for d in str(ds or "").split(",") if d]; datas.update(xs)
+        if len(xs)>1: amb.logger.info("Vencimento %s compartilhado por %d datas de corte (%s); extraído uma vez como %s", venc, len(xs), ", ".join(xs), dc)
+    inicio=date.fromisoformat(data_de).toordinal()
+    faltantes=[date.fromordinal(d).isoformat() for d in range(inicio,date.fromisoformat(data_ate).toordinal()+1) if date.fromordinal(d).isoformat() not in datas]
+    if faltantes: amb.logger.warning("Datas sem corte no período: %s", ", ".join(faltantes))
+    amb.logger.info("BACKFILL | datas com corte=%d | vencimentos=%d | deduplicadas=%d", len(datas), cabecalho.height, len(datas)-cabecalho.height)
+
+def baixar_dados(amb:Ambiente,data_corte:str,data_ate:Optional[str]=None)->Optional[pl.LazyFrame]:
+    try:
+        for d in (data_corte,data_ate):
+            if d: datetime.strptime(d,"%Y-%m-%d")
+    except ValueError:
+        amb.logger.error("Data inválida: %s", data_corte if not data_ate else f"{data_corte}..{data_ate}"); raise
+    if data_ate and data_ate<data_corte:
+        amb.logger.error("Período inválido: %s > %s", data_corte, data_ate)
+        raise ValueError("Período inválido")
+    amb.logger.info("BAIXAR_DADOS | data_corte=%s%s", data_corte, f" | data_ate={data_ate}" if data_ate else "")
+    amb.last_data_corte=data_corte
+    amb.last_data_ate=data_ate
+    sql=SQL_EXTRACAO_PERIODO if data_ate else SQL_EXTRACAO
+    params={"data_de":date.fromisoformat(data_corte),"data_ate":date.fromisoformat(data_ate)} if data_ate else {"data_corte":date.fromisoformat(data_corte)}
+    destino_mod=None; amb.last_rows_ja_vinculadas=0
+    if amb.incremental:
+        tabela=f"{BQ_PROJECT_ID}.{BQ_DATASET_DESTINO}.{BQ_TABELA_DESTINO}"
+        destino_mod=bq_ultima_modificacao(amb,tabela)
+        if destino_mod:
+            sql=SQL_INCREMENTAL.format(sql=sql,tabela=tabela)
+            amb.logger.info("Modo incremental | anti-join com %s", tabela)
+        else: amb.logger.info("Modo incremental ignorado: %s indisponível", tabela)
+    amb.last_sql_corte=sql
+    amb.last_sql_parcela=sql
+    cache=CacheExtracao(amb) if CACHE_EXTRACAO else None
+    chave=cache.chave(sql,f"{data_corte}..{data_ate}" if data_ate else data_corte,bq_ultima_modificacao(amb,TB_DATA_CORTE),bq_ultima_modificacao(amb,TB_PUBLICO),*([destino_mod] if destino_mod else [])) if cache else None
+    amb.last_cache_chave=chave
+    if chave:
+        atual=ler_manifesto(amb.caminho_input)
+        if atual and atual.get("cache")==chave and _partes_base(amb.caminho_input):
+            _restaurar_manifesto(amb,atual)
+            amb.logger.info("Cache de extração reaproveitado no local: %s", chave)
+            return ler_base(amb.caminho_input)
+        pasta=cache.obter(chave)
+        if pasta is not None:
+            safe_prepare_dir(amb,amb.caminho_input,"arquivos_input")
+            cache.restaurar(pasta,amb.caminho_input)
+            _restaurar_manifesto(amb,ler_manifesto(amb.caminho_input) or {})
+            amb.logger.info("Cache de extração restaurado: %s", chave)
+            return ler_base(amb.caminho_input)
+    safe_prepare_dir(amb,amb.caminho_input,"arquivos_input")
+    base=amb.caminho_input/BASE_PUBLICO
+    result=bq_query_rest(amb,sql,project_id=BQ_PROJECT_ID,location=BQ_LOCATION,destino=base if BQ_STREAMING else None,ordenado=False,params=params)
+    if isinstance(result,pl.DataFrame) and result.height:
+        base.mkdir(parents=True,exist_ok=True)
+        with amb.spans.medir("parquet.escrita",arquivo="part-00000.parquet",linhas=result.height):
+            result.write_parquet(base/"part-00000.parquet")
+    lf=result.lazy()
+    colunas=lf.collect_schema().names()
+    if "Data_Vencimento" not in colunas: cabecalho=pl.DataFrame()
+    elif data_ate: cabecalho=lf.select(["Data_Vencimento","DATA_CORTE","DATAS","QTD_CORTE"]).unique().drop_nulls("Data_Vencimento").sort("Data_Vencimento").collect()
+    else: cabecalho=lf.select([pl.col("Data_Vencimento").first(),pl.col("QTD_CORTE").first()]).collect()
+    if cabecalho.height==0 or cabecalho["Data_Vencimento"][0] is None:
+        amb.last_rows_corte=0; amb.last_rows_publico=0; amb.last_vencimento=None
+        amb.logger.info("Sem registros de corte para %s", data_corte if not data_ate else f"{data_corte}..{data_ate}")
+        shutil.rmtree(base,ignore_errors=True)
+        return None
+    venc=",".join(str(v).strip() for v in cabecalho["Data_Vencimento"].to_list())
+    amb.last_rows_corte=int(cabecalho["QTD_CORTE"].sum() or 0)
     amb.last_vencimento=venc
     amb.logger.info("VENCIMENTO: %s", venc)
-    sql_parcela=f"SELECT ACCOUNT_ID, CAMPAIGN_ID FROM `{BQ_SOURCE_PROJECT_ID}.SHARED_OPS.TB_PUBLICO_PARCELAMENTO_FATURA_PF` WHERE DT_VENCIMENTOCOBRANCA = '{venc}'"
-    amb.last_sql_parcela=sql_parcela
-    result=bq_query_rest(amb,sql_parcela,project_id=BQ_PROJECT_ID,location=BQ_LOCATION)
-    amb.last_rows_parcela=int(result.height or 0)
-    if result.height==0 or "CAMPAIGN_ID" not in result.columns:
+    if data_ate: _mapear_periodo(amb,cabecalho,data_corte,data_ate)
+    if "QTD_JA_VINCULADA" in colunas:
+        amb.last_rows_ja_vinculadas=int(lf.select(["Data_Vencimento","QTD_JA_VINCULADA"]).unique().select(pl.col("QTD_JA_VINCULADA").sum()).collect().item() or 0)
+        amb.logger.info("INCREMENTAL | linhas já vinculadas ignoradas=%d", amb.last_rows_ja_vinculadas)
+    amb.last_rows_publico=int(_filtrar_base(lf).select(pl.len()).collect().item())
+    if amb.last_rows_publico==0:
         amb.logger.info("Público zero linhas para %s", venc)
-        return pl.DataFrame()
-    df=(result.unique().with_columns(pl.col("CAMPAIGN_ID").cast(pl.Int64,strict=False)).drop_nulls("CAMPAIGN_ID"))
-    parquet_path=amb.caminho_input/"base.parquet"
-    df.write_parquet(parquet_path)
-    pdf=df.to_pandas()
-    for idx,(cid,grp) in enumerate(pdf.groupby("CAMPAIGN_ID"),start=1):
-        path=amb.caminho_input/f"{int(cid)}.csv"
-        grp[["ACCOUNT_ID"]].to_csv(path,index=False,header=False)
-        amb.logger.info("[%d] CSV salvo: %s | linhas=%d", idx, path.name, len(grp))
-    try:
-        total_csv=0
-        for f in amb.caminho_input.glob("*.csv"):
-            try:
-                total_csv+=sum(1 for _ in open(f,"r",encoding="utf-8",errors="ignore"))
-            except Exception:
-                pass
-        if total_csv!=int(df.height or 0):
-            amb.logger.warning("Inconsistência contagem: parquet=%d csvs=%d", df.height, total_csv)
-    except Exception:
-        pass
-    amb.logger.info("BAIXAR_DADOS OK | linhas=%d campanhas=%d", df.height, int(pdf["CAMPAIGN_ID"].nunique()))
-    return df
+        shutil.rmtree(base,ignore_errors=True)
+        return None
+    manifesto=escrever_campanhas(amb,amb.caminho_input)
+    if cache and chave: cache.guardar(chave,amb.caminho_input)
+    amb.logger.info("BAIXAR_DADOS OK | linhas=%d campanhas=%d", manifesto["linhas"], len(manifesto["campanhas"]))
+    return ler_base(amb.caminho_input)
+
+def rodar_campanha(amb:Ambiente,arquivo:str,cid:str,rd:"Rundeck|RundeckApi")->Tuple[str,Optional[str],int,float]:
+    amb.logger.info("Rodando campanha %s", cid)
+    p=Path(arquivo) if arquivo else None
+    if not p or not p.exists():
+        amb.logger.error("Arquivo da campanha %s não encontrado: %s", cid, arquivo)
+        return "FALHA",None,0,0.0
+    tent=0; espera=0.0
+    while True:
+        tent+=1
+        espera+=amb.retry.aguardar_circuito(JOB_VINCULAR_URL)
+        amb.logger.info("Tentativa rodada campanha %s | tentativa=%d", cid, tent)
+        try:
+            status,logs=rd.rodar_job(
+                [{"campo":"CAMPAIGN_ID","valor":cid}],
+                JOB_VINCULAR_URL,
+                arquivo
+            )
+        except Exception:
+            amb.logger.warning("Erro na tentativa %d da campanha %s", tent, cid, exc_info=True)
+            status,logs="FALHA",None
+        amb.logger.info("Status campanha %s: %s", cid, status)
+        ok="SUCCEEDED" in str(status).upper()
+        amb.retry.registrar(JOB_VINCULAR_URL,ok)
+        if ok:
+            return status,logs,tent,espera
+        if amb.limitador is not None: amb.limitador.congestionado()
+        if tent>=amb.retry.max_tentativas:
+            amb.logger.error("Campanha %s sem sucesso após %d tentativas", cid, tent)
+            return "FALHA",logs,tent,espera
+        s=amb.retry.espera(tent)
+        amb.logger.info("Nova tentativa da campanha %s em %.1fs", cid, s)
+        time.sleep(s); espera+=s
 
-def rodar_campanha(amb:Ambiente,arquivo:str,cid:str,rd:Rundeck)->tuple[str,Optional[str]]:
+async def rodar_campanha_async(amb:Ambiente,arquivo:str,cid:str,rd:RundeckApiAsync,progresso:Optional[dict]=None)->Tuple[str,Optional[str],int,float]:
     amb.logger.info("Rodando campanha %s", cid)
     p=Path(arquivo) if arquivo else None
     if not p or not p.exists():
         amb.logger.error("Arquivo da campanha %s não encontrado: %s", cid, arquivo)
-        return "FALHA",None
-    tent=0
+        return "FALHA",None,0,0.0
+    tent=0; espera=0.0
     while True:
         tent+=1
+        espera+=await amb.retry.aguardar_circuito_async(JOB_VINCULAR_URL)
+        if progresso is not None: progresso.update(tentativas=tent,espera_s=espera)
         amb.logger.info("Tentativa rodada campanha %s | tentativa=%d", cid, tent)
-        status,logs=rd.rodar_job(
-            [{"campo":"CAMPAIGN_ID","valor":cid}],
-            "https://tasks.corp/project/attfincards/job/show/bcd7569b-ddf2-4a4b-8561-5f0b6926175c",
-            arquivo
-        )
+        try:
+            status,logs=await rd.rodar_job([{"campo":"CAMPAIGN_ID","valor":cid}],JOB_VINCULAR_URL,arquivo)
+        except Exception:
+            amb.logger.warning("Erro na tentativa %d da campanha %s", tent, cid, exc_info=True)
+            status,logs="FALHA",None
         amb.logger.info("Status campanha %s: %s", cid, status)
-        if "SUCCEEDED" in str(status).upper():
-            return status,logs
+        ok="SUCCEEDED" in str(status).upper()
+        amb.retry.registrar(JOB_VINCULAR_URL,ok)
+        if ok:
+            return status,logs,tent,espera
+        if amb.limitador is not None: amb.limitador.congestionado()
+        if tent>=amb.retry.max_tentativas:
+            amb.logger.error("Campanha %s sem sucesso após %d tentativas", cid, tent)
+            return "FALHA",logs,tent,espera
+        s=amb.retry.espera(tent)
+        amb.logger.info("Nova tentativa da campanha %s em %.1fs", cid, s)
+        espera+=s
+        if progresso is not None: progresso.update(espera_s=espera)
+        await asyncio.sleep(s)
 
-def _rodar_campanha_worker(amb:Ambiente,cid:str,path_csv:Path)->dict:
+def _linha_relatorio(amb:Ambiente,relatorio:"RelatorioResultados",res:dict)->None:
     try:
-        with sync_playwright() as pw:
-            context,page=criar_contexto(amb,pw)
+        if res.get("log_arquivo"): res["log"]=resumo_log(Path(res["log_arquivo"]))
+        relatorio.adicionar(res)
+    except Exception:
+        amb.logger.warning("Falha ao gravar relatório da campanha %s", res.get("campaign_id"), exc_info=True)
+
+def _registrar_resultado(amb:Ambiente,res:dict,relatorio:bool=True)->dict:
+    if relatorio and amb.relatorio is not None:
+        linha=functools.partial(_linha_relatorio,amb,amb.relatorio,res)
+        if amb.logs_rundeck is not None and res.get("log_arquivo"): amb.logs_rundeck.quando_pronto(res["log_arquivo"],linha)
+        else: linha()
+    if amb.journal is not None:
+        try:
+            amb.journal.registrar(res.get("unidade") or res.get("chave") or res["campaign_id"],res["status"],log=res.get("log",""),log_arquivo=res.get("log_arquivo",""))
+        except Exception:
+            amb.logger.warning("Falha ao gravar journal da campanha %s", res.get("campaign_id"), exc_info=True)
+    return res
+
+def _registrar_inicio(amb:Ambiente,cid:str)->None:
+    if amb.journal is not None:
+        try:
+            amb.journal.registrar(cid,"INICIADA")
+        except Exception:
+            amb.logger.warning("Falha ao gravar journal da campanha %s", cid, exc_info=True)
+
+def _resultado_base(unidade:dict)->dict:
+    return {"campaign_id":unidade["campaign_id"],"chave":unidade["chave"],"vencimento":unidade["vencimento"],"unidade":unidade["unidade"]}
+
+def _rodar_campanha_worker(amb:Ambiente,unidade:dict,rd:"Rundeck|RundeckApi")->dict:
+    cid=unidade["campaign_id"]; uid=unidade["unidade"]
+    base=_resultado_base(unidade)
+    _registrar_inicio(amb,uid)
+    try:
+        with amb.spans.medir("campanha",unidade=uid,linhas=unidade["linhas"]):
+            status,logs,tent,espera=rodar_campanha(amb,str(unidade["arquivo"]),cid,rd)
+        return _registrar_resultado(amb,{**base,"status":str(status).upper(),"log":"","log_arquivo":logs or "","tentativas":tent,"espera_s":round(espera,1)})
+    except Exception:
+        amb.logger.error("Falha ao processar campanha %s", uid, exc_info=True)
+        return _registrar_resultado(amb,{**base,"status":"FALHA","log":"","tentativas":0,"espera_s":0.0})
+
+class LimiteAdaptativo:
+    def __init__(self,amb:Ambiente,maximo:int,inicial:Optional[int]=None,minimo:int=1):
+        self.amb=amb
+        self.maximo=max(1,int(maximo))
+        self.minimo=max(1,min(int(minimo),self.maximo))
+        self.limite=float(max(self.minimo,min(self.maximo,inicial if inicial is not None else self.maximo)))
+        self.em_voo=0
+        self.base_seg_linha=None
+        self.base_duracao=None
+        self.fator_lento=float(os.getenv("LIMITE_FATOR_LENTO","2.0"))
+        self.intervalo_corte=float(os.getenv("LIMITE_INTERVALO_CORTE_SEC","30"))
+        self._ultimo_corte=0.0
+        self._cond=threading.Condition()
+        self._acond=None
+    def _cabe(self)->bool:
+        return self.em_voo<int(self.limite)
+    def _registrar(self,ok:bool,duracao:float,linhas:int)->None:
+        if not ok:
+            self._cortar("falha"); return
+        linhas=max(1,linhas)
+        if self.base_seg_linha is None or duracao/linhas<self.base_seg_linha: self.base_seg_linha=duracao/linhas
+        if self.base_duracao is None or duracao<self.base_duracao: self.base_duracao=duracao
+        esperado=max(self.base_seg_linha*linhas,self.base_duracao)
+        if duracao<=esperado*self.fator_lento and self.limite<self.maximo:
+            anterior=int(self.limite)
+            self.limite=min(float(self.maximo),self.limite+1.0/max(1.0,self.limite))
+            if int(self.limite)!=anterior: self.amb.logger.info("Concorrência ampliada para %d", int(self.limite))
+    def _cortar(self,motivo:str)->None:
+        agora=time.monotonic()
+        if agora-self._ultimo_corte<self.intervalo_corte: return
+        self._ultimo_corte=agora
+        anterior=int(self.limite)
+        self.limite=max(float(self.minimo),self.limite/2.0)
+        self.amb.logger.warning("Concorrência reduzida de %d para %d | motivo=%s", anterior, int(self.limite), motivo)
+    def congestionado(self)->None:
+        with self._cond:
+            self._cortar("congestionamento")
+    def adquirir(self,timeout:Optional[float]=None)->bool:
+        with self._cond:
+            ok=self._cond.wait_for(self._cabe,timeout)
+            if ok: self.em_voo+=1
+            return ok
+    def liberar(self,ok:bool,duracao:float,linhas:int)->None:
+        with self._cond:
+            self.em_voo-=1
+            self._registrar(ok,duracao,linhas)
+            self._cond.notify_all()
+    async def adquirir_async(self,timeout:Optional[float]=None)->bool:
+        if self._acond is None: self._acond=asyncio.Condition()
+        async with self._acond:
             try:
-                rd=Rundeck(amb,page)
-                status,logs=rodar_campanha(amb,str(path_csv),cid,rd)
-            finally:
-                try:
-                    context.close()
-                except Exception:
-                    pass
-        return {"campaign_id":cid,"status":str(status).upper(),"log":logs or ""}
+                await asyncio.wait_for(self._acond.wait_for(self._cabe),timeout)
+            except asyncio.TimeoutError:
+                return False
+            self.em_voo+=1
+            return True
+    async def liberar_async(self,ok:bool,duracao:float,linhas:int)->None:
+        async with self._acond:
+            self.em_voo-=1
+            self._registrar(ok,duracao,linhas)
+            self._acond.notify_all()
+
+def _tamanhos_campanhas(amb:Ambiente,df:"pl.DataFrame|pl.LazyFrame")->dict:
+    contagem=df.lazy().group_by(_chave_campanha(_colunas(df)).alias("chave")).len().drop_nulls("chave").collect()
+    return {str(c):int(n) for c,n in zip(contagem["chave"].to_list(),contagem["len"].to_list())}
+
+class RelatorioResultados:
+    def __init__(self,path:Path):
+        self.path=path
+        self.linhas=0
+        self._lock=threading.Lock()
+        self._fh=None
+        self._csv=None
+    def __enter__(self)->"RelatorioResultados":
+        self.path.parent.mkdir(parents=True,exist_ok=True)
+        self._fh=open(self.path,"w",encoding="utf-8-sig",newline="")
+        self._csv=csv.writer(self._fh,delimiter=";")
+        self._csv.writerow(RELATORIO_COLUNAS); self._fh.flush()
+        return self
+    def adicionar(self,res:dict)->None:
+        with self._lock:
+            if self._csv is None: return
+            self._csv.writerow([res.get(c,"") for c in RELATORIO_COLUNAS]); self._fh.flush()
+            self.linhas+=1
+    def __exit__(self,*exc)->None:
+        with self._lock:
+            if self._fh is not None: self._fh.close()
+            self._fh=None; self._csv=None
+
+def escrever_relatorio_xlsx(amb:Ambiente,resultados:List[dict],path:Path)->Optional[Path]:
+    try:
+        import xlsxwriter
+    except ImportError:
+        amb.logger.warning("xlsxwriter indisponível; relatório segue apenas em CSV")
+        return None
+    colunas=("campaign_id","vencimento","status","tentativas","espera_s","partes","partes_ok","log_arquivo","log")
+    try:
+        with xlsxwriter.Workbook(str(path),{"constant_memory":True,"strings_to_urls":False}) as wb:
+            ws=wb.add_worksheet("resultados")
+            ws.write_row(0,0,colunas,wb.add_format({"bold":True}))
+            for i,r in enumerate(resultados,start=1):
+                ok=str(r.get("status","")).upper()=="SUCCEEDED"
+                ws.write_row(i,0,[str(r.get("campaign_id","")),str(r.get("vencimento") or ""),str(r.get("status","")),int(r.get("tentativas") or 0),float(r.get("espera_s") or 0),int(r.get("partes") or 1),int(r.get("partes_ok") if r.get("partes_ok") is not None else ok),str(r.get("log_arquivo") or ""),str(r.get("log") or "")[:32000]])
+        return path
     except Exception:
-        amb.logger.error("Falha ao processar campanha %s", cid, exc_info=True)
-        return {"campaign_id":cid,"status":"FALHA","log":""}
+        amb.logger.warning("Falha ao gerar relatório xlsx", exc_info=True)
+        return None
+
+def _unidades_execucao(amb:Ambiente,df:pl.DataFrame,campanhas:List[str])->List[dict]:
+    manifesto=ler_manifesto(amb.caminho_input) or {}
+    entradas={str(e.get("chave") or e["campaign_id"]):e for e in manifesto.get("campanhas") or [] if e.get("campaign_id") is not None}
+    tamanhos=None if entradas else _tamanhos_campanhas(amb,df)
+    unidades=[]
+    for chave in campanhas:
+        e=entradas.get(chave) or {}
+        venc,cid=_separar_chave(chave)
+        base={"chave":chave,"campaign_id":cid,"vencimento":venc or amb.last_vencimento}
+        if e.get("partes"):
+            unidades.extend({"unidade":x["unidade"],**base,"arquivo":amb.caminho_input/x["arquivo"],"linhas":int(x.get("linhas") or 0)} for x in e["partes"])
+        else:
+            unidades.append({"unidade":chave,**base,"arquivo":amb.caminho_input/f"{chave}.csv","linhas":int(e.get("linhas") or (tamanhos or {}).get(chave,0))})
+    return sorted(unidades,key=lambda u:(-u["linhas"],u["unidade"]))
+
+def _agregar_unidades(amb:Ambiente,resultados:List[dict])->Tuple[List[dict],int,int]:
+    grupos={}
+    for res in resultados: grupos.setdefault(str(res.get("chave") or res["campaign_id"]),[]).append(res)
+    saida=[]
+    for chave,itens in grupos.items():
+        tentativas=sum(int(r.get("tentativas") or 0) for r in itens)
+        espera=round(sum(float(r.get("espera_s") or 0) for r in itens),1)
+        base={"campaign_id":itens[0]["campaign_id"],"chave":chave,"vencimento":itens[0].get("vencimento")}
+        if len(itens)==1 and (itens[0].get("unidade") or chave)==chave:
+            saida.append({**base,"status":itens[0]["status"],"log":itens[0].get("log",""),"log_arquivo":itens[0].get("log_arquivo",""),"tentativas":tentativas,"espera_s":espera}); continue
+        itens=sorted(itens,key=lambda r:int(str(r.get("unidade","")).rsplit("__p",1)[-1]) if "__p" in str(r.get("unidade","")) else 0)
+        falhas=[r for r in itens if r.get("status","").upper()!="SUCCEEDED"]
+        status="SUCCEEDED" if not falhas else falhas[0]["status"]
+        log="\n".join(f"### {r.get('unidade')} | {r.get('status')}\n{r.get('log') or ''}" for r in itens)
+        res={**base,"status":status,"log":log,"log_arquivo":"; ".join(r.get("log_arquivo") or "" for r in itens if r.get("log_arquivo")),"tentativas":tentativas,"espera_s":espera,"partes":len(itens),"partes_ok":len(itens)-len(falhas)}
+        if not falhas: _registrar_resultado(amb,res,relatorio=False)
+        else: amb.logger.warning("Campanha %s com %d de %d partes sem sucesso", chave, len(falhas), len(itens))
+        saida.append(res)
+    ok=sum(1 for r in saida if r["status"].upper()=="SUCCEEDED")
+    return saida,ok,len(saida)-ok
+
+def _criar_limitador(amb:Ambiente,limite:int)->LimiteAdaptativo:
+    if not LIMITE_ADAPTATIVO: return LimiteAdaptativo(amb,limite)
+    inicial=int(os.getenv("LIMITE_INICIAL",str(limite)))
+    return LimiteAdaptativo(amb,limite,inicial=inicial,minimo=int(os.getenv("LIMITE_MINIMO","1")))
+
+def _rodar_campanha_cronometrado(amb:Ambiente,unidade:dict,*args)->Tuple[dict,float]:
+    t0=time.monotonic()
+    return _rodar_campanha_worker(amb,unidade,*args),time.monotonic()-t0
+
+def _liberar_ao_concluir(limitador:LimiteAdaptativo,unidade:dict)->Callable[[Future],None]:
+    def _liberar(fut:Future)->None:
+        try:
+            res,duracao=fut.result()
+        except BaseException:
+            res,duracao=None,0.0
+        limitador.liberar(bool(res) and res.get("status","").upper()=="SUCCEEDED",duracao,unidade["linhas"])
+    return _liberar
 
 def processar_campanhas_concorrentes(amb:Ambiente,df:pl.DataFrame,limite_abas:int)->Tuple[List[dict],int,int]:
-    campanhas=df["CAMPAIGN_ID"].unique().drop_nulls().to_list()
-    limite=max(1,min(limite_abas,len(campanhas)))
-    amb.logger.info("Processando campanhas com limite de %d abas", limite)
+    campanhas=[str(c) for c in df.lazy().select(_chave_campanha(_colunas(df)).alias("chave")).unique().drop_nulls().collect()["chave"].to_list()]
+    anteriores=[]; concluidas={}
+    if amb.journal is not None and amb.retomar:
+        concluidas=amb.journal.concluidas()
+        anteriores=[{"campaign_id":_separar_chave(c)[1],"chave":c,"vencimento":_separar_chave(c)[0] or amb.last_vencimento,"status":"SUCCEEDED","log":concluidas[c].get("log",""),"log_arquivo":concluidas[c].get("log_arquivo","")} for c in campanhas if c in concluidas]
+        campanhas=[c for c in campanhas if c not in concluidas]
+        amb.logger.info("Retomada: %d campanhas já concluídas | %d pendentes", len(anteriores), len(campanhas))
+    if not campanhas:
+        return anteriores,len(anteriores),0
+    unidades=_unidades_execucao(amb,df,campanhas)
+    feitas=[{"campaign_id":u["campaign_id"],"chave":u["chave"],"vencimento":u["vencimento"],"unidade":u["unidade"],"status":"SUCCEEDED","log":concluidas[u["unidade"]].get("log",""),"log_arquivo":concluidas[u["unidade"]].get("log_arquivo","")} for u in unidades if u["unidade"]!=u["chave"] and u["unidade"] in concluidas]
+    unidades=[u for u in unidades if not (u["unidade"]!=u["chave"] and u["unidade"] in concluidas)]
+    if len(unidades)+len(feitas)>len(campanhas): amb.logger.info("Campanhas divididas | campanhas=%d | execuções=%d | max_linhas=%d", len(campanhas), len(unidades)+len(feitas), MAX_LINHAS_EXECUCAO)
     resultados=[]
-    ok=0
-    ko=0
-    lock=threading.Lock()
-    with ThreadPoolExecutor(max_workers=limite) as executor:
-        futuros=[]
-        for cid in campanhas:
-            path_csv=amb.caminho_input/f"{cid}.csv"
-            futuros.append(executor.submit(_rodar_campanha_worker,amb,str(cid),path_csv))
-        for fut in as_completed(futuros):
-            res=fut.result()
-            resultados.append(res)
-            with lock:
-                if res.get("status","").upper()=="SUCCEEDED":
-                    ok+=1
+    if unidades:
+        limite=max(1,min(limite_abas,len(unidades)))
+        amb.limitador=_criar_limitador(amb,limite)
+        amb.logs_rundeck=ColetorLogs(amb)
+        amb.logger.info("Agenda por tamanho | maior=%s (%d linhas) | menor=%s (%d linhas) | limite inicial=%d", unidades[0]["unidade"], unidades[0]["linhas"], unidades[-1]["unidade"], unidades[-1]["linhas"], int(amb.limitador.limite))
+        try:
+            with amb.logs_rundeck:
+                if amb.engine=="async":
+                    amb.logger.info("Processando campanhas em asyncio com limite de %d em voo | executor=api", limite)
+                    resultados=asyncio.run(_processar_campanhas_async(amb,unidades,limite))
                 else:
-                    ko+=1
-    return resultados,ok,ko
+                    resultados=_processar_campanhas_threads(amb,unidades,limite)
+        finally:
+            amb.limitador=None; amb.logs_rundeck=None
+        for res in resultados:
+            if res.get("log_arquivo"): res["log"]=resumo_log(Path(res["log_arquivo"]))
+    resultados,ok,ko=_agregar_unidades(amb,feitas+resultados)
+    return anteriores+resultados,ok+len(anteriores),ko
+
+def _processar_campanhas_threads(amb:Ambiente,unidades:List[dict],limite:int)->List[dict]:
+    amb.logger.info("Processando campanhas com limite de %d abas | executor=%s", limite, amb.executor)
+    rd_api=RundeckApi(amb,pool=limite) if amb.executor=="api" else None
+    resultados=[]; limitador=amb.limitador
+    with (ThreadPoolExecutor(max_workers=limite) if rd_api is not None else PoolNavegador(amb,limite)) as executor:
+        futuros={}
+        for unidade in unidades:
+            args=(amb,unidade)+((rd_api,) if rd_api is not None else ())
+            with amb.spans.medir("campanha.fila",unidade=unidade["unidade"]):
+                while not limitador.adquirir(LIMITE_ESPERA_SEC): amb.logger.warning("Sem vaga de concorrência após %.0fs para %s | em voo=%d | limite=%d; aguardando", LIMITE_ESPERA_SEC, unidade["unidade"], limitador.em_voo, int(limitador.limite))
+            fut=executor.submit(_rodar_campanha_cronometrado,*args)
+            fut.add_done_callback(_liberar_ao_concluir(limitador,unidade))
+            futuros[fut]=unidade
+        for fut in as_completed(futuros):
+            try:
+                resultados.append(fut.result()[0])
+            except Exception:
+                unidade=futuros[fut]
+                amb.logger.error("Falha ao processar campanha %s", unidade["unidade"], exc_info=True)
+                resultados.append(_registrar_resultado(amb,{**_resultado_base(unidade),"status":"FALHA","log":"","tentativas":0,"espera_s":0.0}))
+    return resultados
+
+def _deadline_campanha(amb:Ambiente,rd:RundeckApiAsync)->float:
+    if os.getenv("CAMPANHA_DEADLINE_SEC"): return float(os.environ["CAMPANHA_DEADLINE_SEC"])
+    tentativas=amb.retry.max_tentativas
+    por_tentativa=rd.max_wait+rd.poll_interval+RUNDECK_FOLGA_SEC
+    esperas=sum(min(amb.retry.backoff_max,amb.retry.backoff_base*(2**(t-1))) for t in range(1,tentativas))
+    return tentativas*(por_tentativa+amb.retry.pausa)+esperas
+
+async def _processar_campanhas_async(amb:Ambiente,unidades:List[dict],limite:int)->List[dict]:
+    from playwright.async_api import async_playwright
+    limitador=amb.limitador or LimiteAdaptativo(amb,limite)
+    resultados=[]
+    headers={"Accept":"application/json"}
+    tok=os.getenv("RUNDECK_API_TOKEN")
+    if tok: headers["X-Rundeck-Auth-Token"]=tok.strip()
+    async with async_playwright() as pw:
+        req=await pw.request.new_context(extra_http_headers=headers)
+        rd=RundeckApiAsync(amb,req)
+        deadline=_deadline_campanha(amb,rd)
+        amb.logger.info("Prazo por campanha: %.0fs", deadline)
+        async def _uma(unidade:dict)->dict:
+            with amb.spans.medir("campanha.fila",unidade=unidade["unidade"]):
+                while not await limitador.adquirir_async(LIMITE_ESPERA_SEC): amb.logger.warning("Sem vaga de concorrência após %.0fs para %s | em voo=%d | limite=%d; aguardando", LIMITE_ESPERA_SEC, unidade["unidade"], limitador.em_voo, int(limitador.limite))
+            cid=unidade["campaign_id"]; uid=unidade["unidade"]
+            base=_resultado_base(unidade)
+            t0=time.monotonic(); ok_uma=False; progresso={"tentativas":0,"espera_s":0.0}
+            try:
+                _registrar_inicio(amb,uid)
+                try:
+                    with amb.spans.medir("campanha",unidade=uid,linhas=unidade["linhas"]):
+                        status,logs,tent,espera=await asyncio.wait_for(rodar_campanha_async(amb,str(unidade["arquivo"]),cid,rd,progresso),deadline)
+                    ok_uma="SUCCEEDED" in str(status).upper()
+                    return _registrar_resultado(amb,{**base,"status":str(status).upper(),"log":"","log_arquivo":logs or "","tentativas":tent,"espera_s":round(espera,1)})
+                except asyncio.TimeoutError:
+                    amb.logger.error("Campanha %s excedeu o prazo de %.0fs", uid, deadline)
+                except Exception:
+                    amb.logger.error("Falha ao processar campanha %s", uid, exc_info=True)
+                return _registrar_resultado(amb,{**base,"status":"FALHA","log":"","tentativas":progresso["tentativas"],"espera_s":round(progresso["espera_s"],1)})
+            finally:
+                await limitador.liberar_async(ok_uma,time.monotonic()-t0,unidade["linhas"])
+        tarefas=[asyncio.create_task(_uma(u)) for u in unidades]
+        try:
+            for fut in asyncio.as_completed(tarefas):
+                resultados.append(await fut)
+        finally:
+            pendentes=[t for t in tarefas if not t.done()]
+            for t in pendentes: t.cancel()
+            if pendentes: await asyncio.gather(*pendentes,return_exceptions=True)
+            await rd.concluir_saidas()
+            await req.dispose()
+    return resultados
+
+def _limite_concorrencia(amb:Ambiente)->int:
+    if amb.engine=="async": return int(os.getenv("LIMITE_ASYNC",LIMITE_ASYNC))
+    if amb.executor=="api": return int(os.getenv("LIMITE_API",LIMITE_API))
+    return int(os.getenv("LIMITE_ABAS",LIMITE_ABAS))
 
 def remover_campanhas(amb:Ambiente,arquivo:str,rd:Rundeck)->None:
     amb.logger.info("Remoção campanhas")
@@ -599,80 +2103,257 @@ def remover_campanhas(amb:Ambiente,arquivo:str,rd:Rundeck)->None:
     if not p or not p.exists():
         amb.logger.info("Arquivo remoção inexistente")
         return
-    for _ in range(50):
-        status,_=rd.rodar_job([],"https://tasks.corp/project/corecardstax/job/show/6c0f32f3-317f-40de-9d2f-7ac76387f821",arquivo)
+    for tent in range(1,amb.retry.max_tentativas+1):
+        amb.retry.aguardar_circuito(JOB_REMOCAO_URL)
+        try:
+            status,_=rd.rodar_job([],JOB_REMOCAO_URL,arquivo)
+        except Exception:
+            amb.logger.warning("Erro na tentativa %d da remoção", tent, exc_info=True)
+            status="FALHA"
         amb.logger.info("Status remoção: %s", status)
-        if "SUCCEEDED" in str(status).upper():
+        ok="SUCCEEDED" in str(status).upper()
+        amb.retry.registrar(JOB_REMOCAO_URL,ok)
+        if ok:
             return
+        if tent<amb.retry.max_tentativas: time.sleep(amb.retry.espera(tent))
+    amb.logger.error("Remoção de campanhas sem sucesso após %d tentativas", amb.retry.max_tentativas)
+
+def _schema_vinculos()->dict:
+    return {"fields":[{"name":"DATA_GERACAO_ROBO","type":"DATE","mode":"REQUIRED"},{"name":"DT_VENCIMENTOCOBRANCA","type":"DATE","mode":"REQUIRED"},{"name":"CAMPAIGN_ID","type":"INT64","mode":"REQUIRED"},{"name":"ACCOUNT_ID","type":"STRING","mode":"REQUIRED"},{"name":"DT_COLETA","type":"TIMESTAMP","mode":"REQUIRED"},{"name":"JOB_STATUS","type":"STRING","mode":"NULLABLE"},{"name":"RUN_ID","type":"STRING","mode":"REQUIRED"},{"name":"SCRIPT","type":"STRING","mode":"REQUIRED"}]}
+
+def _garantir_tabela_destino(amb:Ambiente,project_id:str,dataset_id:str,table_id:str)->None:
+    ds_url=f"{amb.bq.projeto(project_id)}/datasets"
+    ds_payload={"datasetReference":{"projectId":project_id,"datasetId":dataset_id},"location":BQ_LOCATION}
+    rds=amb.bq.post(ds_url,json=ds_payload,timeout=30)
+    if rds.status_code not in (200,409): raise RuntimeError("Falha garantir dataset")
+    tb_url=f"{amb.bq.projeto(project_id)}/datasets/{dataset_id}/tables"
+    rtb=amb.bq.post(tb_url,json={"tableReference":{"projectId":project_id,"datasetId":dataset_id,"tableId":table_id},"schema":_schema_vinculos()},timeout=30)
+    if rtb.status_code not in (200,409): raise RuntimeError("Falha garantir tabela")
+
+def _df_saida(amb:Ambiente,df:pl.DataFrame,resultados:List[dict],data_corte:Optional[str])->pl.DataFrame:
+    status_map={str(x.get("chave") or x["campaign_id"]):str(x["status"]) for x in resultados}
+    ts_utc=datetime.utcnow().replace(microsecond=0).isoformat()+"Z"
+    colunas=_colunas(df)
+    geracao=pl.col("DATA_CORTE") if "DATA_CORTE" in colunas else pl.lit(data_corte or date.today().isoformat())
+    vencimento=pl.col("Data_Vencimento") if "Data_Vencimento" in colunas else pl.lit(amb.last_vencimento or "")
+    return (df.with_columns([geracao.alias("DATA_GERACAO_ROBO"),vencimento.alias("DT_VENCIMENTOCOBRANCA"),pl.col("CAMPAIGN_ID").cast(pl.Int64,strict=False),pl.col("ACCOUNT_ID").cast(pl.Utf8,strict=False),pl.lit(ts_utc).alias("DT_COLETA"),_chave_campanha(colunas).replace_strict(status_map,default="UNKNOWN",return_dtype=pl.Utf8).alias("JOB_STATUS"),pl.lit(amb.run_ts).alias("RUN_ID"),pl.lit(NOME_SCRIPT).alias("SCRIPT")]).select(["DATA_GERACAO_ROBO","DT_VENCIMENTOCOBRANCA","CAMPAIGN_ID","ACCOUNT_ID","DT_COLETA","JOB_STATUS","RUN_ID","SCRIPT"]))
+
+def _lotes_insertall(df_out:pl.LazyFrame,max_bytes:int,max_linhas:int)->Iterator[List[str]]:
+    pasta=Path(tempfile.mkdtemp(prefix=f"{STEM}_insertall_"))
+    try:
+        arquivo=pasta/"linhas.ndjson"
+        df_out.select([pl.concat_str([pl.col("RUN_ID"),pl.col("DT_VENCIMENTOCOBRANCA"),pl.col("CAMPAIGN_ID").cast(pl.Utf8),pl.col("ACCOUNT_ID")],separator="|").alias("insertId"),pl.struct(_colunas(df_out)).alias("json")]).sink_ndjson(arquivo)
+        lote=[]; tamanho=0
+        with open(arquivo,encoding="utf-8") as fh:
+            for linha in fh:
+                linha=linha.rstrip("\n")
+                if not linha: continue
+                n=len(linha.encode("utf-8"))+1
+                if lote and (tamanho+n>max_bytes or len(lote)>=max_linhas):
+                    yield lote
+                    lote=[]; tamanho=0
+                lote.append(linha); tamanho+=n
+        if lote: yield lote
+    finally:
+        shutil.rmtree(pasta,ignore_errors=True)
+
+def _enviar_lote_insertall(amb:Ambiente,ins_url:str,linhas:List[str],tent:int)->Tuple[int,List[str],int,List[str]]:
+    if tent>1: time.sleep(random.uniform(0,min(30.0,2.0**(tent-1))))
+    corpo='{"kind":"bigquery#tableDataInsertAllRequest","skipInvalidRows":true,"ignoreUnknownValues":false,"rows":['+",".join(linhas)+"]}"
+    try:
+        with amb.spans.medir("bq.insertall.lote",linhas=len(linhas),tentativa=tent):
+            rr=amb.bq.post(ins_url,data=corpo.encode("utf-8"),headers={"Content-Type":"application/json"},timeout=120,tentativas=1)
+    except requests.RequestException as e:
+        amb.logger.warning("insertAll erro de conexão | linhas=%d | tentativa=%d: %s", len(linhas), tent, e)
+        return 0,linhas,tent,[]
+    if rr.status_code!=200:
+        amb.logger.error("insertAll HTTP %s | linhas=%d | tentativa=%d: %s", rr.status_code, len(linhas), tent, rr.text[:500])
+        return 0,linhas,tent,[]
+    errs=(rr.json() or {}).get("insertErrors") or []
+    if not errs: return len(linhas),[],tent,[]
+    reenviar=set(); invalidas=set()
+    for e in errs:
+        razoes={str(x.get("reason","")) for x in (e.get("errors") or [])}
+        (invalidas if "invalid" in razoes else reenviar).add(int(e.get("index",-1)))
+    falhas=[linhas[i] for i in sorted(reenviar) if 0<=i<len(linhas)]
+    descartadas=[linhas[i] for i in sorted(invalidas) if 0<=i<len(linhas)]
+    if descartadas: amb.logger.warning("insertAll linhas inválidas descartadas=%d", len(descartadas))
+    return len(linhas)-len(descartadas)-len(falhas),falhas,tent,descartadas
+
+def _chaves_linhas(linhas:List[str],backfill:bool)->set:
+    out=set()
+    for linha in linhas:
+        j=json.loads(linha)["json"]
+        out.add(f"{j['DT_VENCIMENTOCOBRANCA']}_{j['CAMPAIGN_ID']}" if backfill else str(j["CAMPAIGN_ID"]))
+    return out
+
+def _persistir_insertall(amb:Ambiente,df_out:pl.LazyFrame,project_id:str,dataset_id:str,table_id:str,backfill:bool=False)->Tuple[int,set]:
+    ins_url=f"{amb.bq.projeto(project_id)}/datasets/{dataset_id}/tables/{table_id}/insertAll"
+    workers=max(1,int(os.getenv("BQ_INSERT_WORKERS","4")))
+    max_tent=max(1,int(os.getenv("BQ_INSERT_RETRIES","5")))
+    lotes=_lotes_insertall(df_out,int(float(os.getenv("BQ_INSERT_MAX_MB","8"))*1024*1024),int(os.getenv("BQ_INSERT_BATCH","10000")))
+    reenvios=deque(); voando=set(); esgotado=False
+    inserted=0; perdidas=0; enviados=0; total=0; rejeitadas=set()
+    with closing(lotes),ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(voando)<2*workers:
+                if reenvios:
+                    linhas,tent=reenvios.popleft()
+                elif not esgotado:
+                    linhas=next(lotes,None); tent=1
+                    if linhas is None:
+                        esgotado=True; continue
+                    total+=len(linhas)
+                else:
+                    break
+                voando.add(executor.submit(_enviar_lote_insertall,amb,ins_url,linhas,tent))
+            if not voando: break
+            prontos,voando=wait(voando,return_when=FIRST_COMPLETED)
+            for fut in prontos:
+                ok_rows,falhas,tent,descartadas=fut.result()
+                inserted+=ok_rows; enviados+=1
+                if descartadas: rejeitadas|=_chaves_linhas(descartadas,backfill)
+                if not falhas: continue
+                if tent<max_tent:
+                    reenvios.append((falhas,tent+1))
+                else:
+                    perdidas+=len(falhas); rejeitadas|=_chaves_linhas(falhas,backfill)
+                    amb.logger.error("insertAll desistiu de %d linhas após %d tentativas", len(falhas), tent)
+            if enviados and enviados%50==0:
+                amb.logger.info("insertAll progresso | lotes=%d | inseridas=%d", enviados, inserted)
+    amb.logger.info("insertAll concluído | linhas=%d | inseridas=%d | perdidas=%d | lotes=%d", total, inserted, perdidas, enviados)
+    if rejeitadas: amb.logger.warning("insertAll com linhas não aceitas em %d campanhas", len(rejeitadas))
+    return inserted,rejeitadas
+
+def _enviar_load(amb:Ambiente,project_id:str,job:dict,arquivo:Path)->dict:
+    tamanho=arquivo.stat().st_size
+    url=f"{amb.bq.upload(project_id)}/jobs"
+    if tamanho<=float(os.getenv("BQ_LOAD_MULTIPART_MAX_MB","5"))*1024*1024:
+        fronteira=f"vincular_{uuid.uuid4().hex}"
+        corpo=(f"--{fronteira}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(job)}\r\n--{fronteira}\r\nContent-Type: application/octet-stream\r\n\r\n").encode()+arquivo.read_bytes()+f"\r\n--{fronteira}--\r\n".encode()
+        r=amb.bq.post(url,params={"uploadType":"multipart"},data=corpo,headers={"Content-Type":f"multipart/related; boundary={fronteira}"},timeout=300)
+    else:
+        r=amb.bq.post(url,params={"uploadType":"resumable"},json=job,headers={"X-Upload-Content-Type":"application/octet-stream","X-Upload-Content-Length":str(tamanho)},timeout=60)
+        if r.status_code==409: return job
+        if r.status_code!=200 or not r.headers.get("Location"):
+            amb.logger.error("BQ load sessão HTTP %s: %s", r.status_code, r.text)
+            raise RuntimeError("BigQuery load: sessão resumable falhou")
+        sessao=r.headers["Location"]
+        bloco=max(1,int(float(os.getenv("BQ_LOAD_CHUNK_MB","8"))*4))*256*1024
+        with open(arquivo,"rb") as fh:
+            inicio=0
+            while inicio<tamanho:
+                dados=fh.read(bloco); fim=inicio+len(dados)-1
+                r=amb.bq.put(sessao,data=dados,headers={"Content-Type":"application/octet-stream","Content-Range":f"bytes {inicio}-{fim}/{tamanho}"},timeout=300,allow_redirects=False)
+                if r.status_code==308:
+                    faixa=r.headers.get("Range","")
+                    inicio=int(faixa.rsplit("-",1)[1])+1 if faixa else 0
+                    fh.seek(inicio); continue
+                break
+    if r.status_code==409: return job
+    if r.status_code not in (200,201):
+        amb.logger.error("BQ load upload HTTP %s: %s", r.status_code, r.text)
+        raise RuntimeError("BigQuery load: upload falhou")
+    return r.json() or job
+
+def _persistir_load(amb:Ambiente,df_out:pl.LazyFrame,project_id:str,dataset_id:str,table_id:str)->Tuple[int,set]:
+    pasta=Path(tempfile.mkdtemp(prefix=f"{STEM}_load_"))
+    arquivo=pasta/f"vincular_{amb.run_ts}.parquet"
+    try:
+        (df_out.with_columns([pl.col("DATA_GERACAO_ROBO").str.to_date(strict=False),pl.col("DT_VENCIMENTOCOBRANCA").str.to_date(strict=False),pl.col("DT_COLETA").str.to_datetime("%Y-%m-%dT%H:%M:%SZ",time_zone="UTC",strict=False)])
+            .sink_parquet(arquivo))
+        total=int(pl.scan_parquet(arquivo).select(pl.len()).collect().item())
+        job_id=f"{STEM}_{amb.run_ts}_{uuid.uuid4().hex[:8]}"
+        job={"jobReference":{"projectId":project_id,"jobId":job_id,"location":BQ_LOCATION},"configuration":{"load":{"destinationTable":{"projectId":project_id,"datasetId":dataset_id,"tableId":table_id},"schema":_schema_vinculos(),"sourceFormat":"PARQUET","writeDisposition":"WRITE_APPEND","createDisposition":"CREATE_NEVER"}}}
+        amb.logger.info("BQ load | job_id=%s | arquivo=%s | bytes=%d | linhas=%d", job_id, arquivo.name, arquivo.stat().st_size, total)
+        with amb.spans.medir("bq.load.envio",bytes=arquivo.stat().st_size):
+            _enviar_load(amb,project_id,job,arquivo)
+        poll_interval=float(os.getenv("BQ_POLL_INTERVAL_SEC","1.5"))
+        max_wait=float(os.getenv("BQ_MAX_WAIT_SEC","600"))
+        start=time.monotonic()
+        while True:
+            rj=amb.bq.get(f"{amb.bq.projeto(project_id)}/jobs/{job_id}",params={"location":BQ_LOCATION},timeout=60)
+            if rj.status_code!=200:
+                amb.logger.error("BQ load poll HTTP %s: %s", rj.status_code, rj.text)
+                raise RuntimeError("BigQuery load: poll falhou")
+            jj=rj.json() or {}; st=jj.get("status") or {}
+            if st.get("state")=="DONE":
+                if st.get("errorResult"):
+                    amb.logger.error("BQ load falhou: %s | erros=%s", st.get("errorResult"), (st.get("errors") or [])[:5])
+                    raise RuntimeError("BigQuery load falhou")
+                linhas=int(((jj.get("statistics") or {}).get("load") or {}).get("outputRows",total) or 0)
+                amb.logger.info("BQ load concluído | job_id=%s | linhas=%d", job_id, linhas)
+                return linhas,set()
+            if time.monotonic()-start>max_wait:
+                amb.logger.error("BQ timeout aguardando load id=%s", job_id)
+                raise RuntimeError("BigQuery load timeout")
+            time.sleep(poll_interval)
+    finally:
+        shutil.rmtree(pasta,ignore_errors=True)
+
+def persistir_vinculos(amb:Ambiente,df:"pl.DataFrame|pl.LazyFrame",resultados:List[dict],data_corte:Optional[str])->Tuple[int,Optional[set]]:
+    project_id=BQ_PROJECT_ID; dataset_id=BQ_DATASET_DESTINO; table_id=BQ_TABELA_DESTINO
+    modo=(os.getenv("BQ_PERSIST_MODE") or BQ_PERSIST_MODE).strip().lower()
+    try:
+        _garantir_tabela_destino(amb,project_id,dataset_id,table_id)
+        df_out=_df_saida(amb,df.lazy(),resultados,data_corte)
+        if modo=="load": return _persistir_load(amb,df_out,project_id,dataset_id,table_id)
+        return _persistir_insertall(amb,df_out,project_id,dataset_id,table_id,backfill="Data_Vencimento" in _colunas(df))
+    except Exception:
+        amb.logger.error("Falha persistência BigQuery | modo=%s", modo, exc_info=True)
+        return 0,None
 
-def vincular_campanhas(amb:Ambiente,baixar:bool,data_corte:Optional[str])->tuple[int,int,Optional[Path],dict]:
-    if not garantir_outlook_aberto(amb):
-        amb.logger.warning("Outlook poderá falhar")
+def vincular_campanhas(amb:Ambiente,baixar:bool,data_corte:Optional[str],data_ate:Optional[str]=None)->tuple[int,int,Optional[Path],dict]:
     if not amb.cred_user or not amb.cred_pass:
         amb.logger.error("Credenciais ausentes no Dollynho")
-        return RETCODE_FALHA,0,None,{"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":amb.last_rows_parcela,"campanhas_total":0,"campanhas_ok":0,"campanhas_ko":0,"linhas_persistidas":0,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
-    df=pl.DataFrame()
+        return RETCODE_FALHA,0,None,{"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":amb.last_rows_publico,"campanhas_total":0,"campanhas_ok":0,"campanhas_ko":0,"linhas_persistidas":0,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
+    df=None; linhas=0
     try:
         if baixar:
-            df=baixar_dados(amb,data_corte or date.today().isoformat())
+            with amb.spans.medir("etapa.extracao"):
+                df=baixar_dados(amb,data_corte or date.today().isoformat(),data_ate)
         else:
-            p=amb.caminho_input/"base.parquet"
-            if p.exists(): df=pl.read_parquet(p)
-        amb.logger.info("Dados prontos: %d linhas", df.height)
+            df=ler_base(amb.caminho_input)
+            manifesto=ler_manifesto(amb.caminho_input) or {}
+            amb.last_vencimento=amb.last_vencimento or manifesto.get("vencimento")
+            data_corte=data_corte or manifesto.get("data_corte")
+        linhas=int(df.select(pl.len()).collect().item()) if df is not None else 0
+        amb.logger.info("Dados prontos: %d linhas", linhas)
     except Exception:
         amb.logger.error("Erro em baixar_dados", exc_info=True)
-        return RETCODE_FALHA,0,None,{"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":amb.last_rows_parcela,"campanhas_total":0,"campanhas_ok":0,"campanhas_ko":0,"linhas_persistidas":0,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
-    if df.height==0:
-        return RETCODE_SEMDADOSPARAPROCESSAR,0,None,{"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":0,"campanhas_total":0,"campanhas_ok":0,"campanhas_ko":0,"linhas_persistidas":0,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
-    anexos=[]
+        return RETCODE_FALHA,0,None,{"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":amb.last_rows_publico,"campanhas_total":0,"campanhas_ok":0,"campanhas_ko":0,"linhas_persistidas":0,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
+    if linhas==0:
+        return RETCODE_SEMDADOSPARAPROCESSAR,0,None,{"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":0,"campanhas_total":0,"campanhas_ok":0,"campanhas_ko":0,"linhas_persistidas":0,"linhas_ja_vinculadas":amb.last_rows_ja_vinculadas,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
     resultados=[]; ok=0; ko=0
+    amb.journal=JournalCampanhas(amb.caminho_input/JOURNAL_CAMPANHAS,amb.run_ts)
+    if not amb.retomar: amb.journal.reiniciar()
+    relatorio_csv=amb.caminho_artefatos/f"resultado_{amb.run_ts}.csv"
+    amb.relatorio=RelatorioResultados(relatorio_csv)
     try:
-        resultados,ok,ko=processar_campanhas_concorrentes(amb,df,int(os.getenv("LIMITE_ABAS",LIMITE_ABAS)))
+        with amb.relatorio,amb.spans.medir("etapa.campanhas"):
+            resultados,ok,ko=processar_campanhas_concorrentes(amb,df,_limite_concorrencia(amb))
     except Exception:
         amb.logger.error("Falha Playwright", exc_info=True)
-        return RETCODE_FALHA,0,None,{"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":int(df.height or 0),"campanhas_total":int(len(df.select(pl.col("CAMPAIGN_ID").unique()).to_series())),"campanhas_ok":ok,"campanhas_ko":ko,"linhas_persistidas":0,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
-    resultado=amb.caminho_artefatos/f"resultado_{amb.run_ts}.xlsx"
-    amb.caminho_artefatos.mkdir(parents=True,exist_ok=True)
-    pd.DataFrame(resultados).to_excel(resultado,index=False)
-    if resultado.exists(): anexos.append(resultado)
-    try:
-        token=_get_access_token(); ca=os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("SSL_CERT_FILE")
-        headers={"Authorization":f"Bearer {token}","Content-Type":"application/json"}
-        project_id=BQ_PROJECT_ID; dataset_id="ADMINISTRACAO_CELULA_PYTHON"; table_id="VincularCampanhas"
-        ds_url=f"https://bigquery.googleapis.com/bigquery/v2/projects/{project_id}/datasets"
-        ds_payload={"datasetReference":{"projectId":project_id,"datasetId":dataset_id},"location":BQ_LOCATION}
-        rds=requests.post(ds_url,headers=headers,data=json.dumps(ds_payload),timeout=30,verify=ca if ca else True)
-        if rds.status_code not in (200,409): raise RuntimeError("Falha garantir dataset")
-        tb_url=f"https://bigquery.googleapis.com/bigquery/v2/projects/{project_id}/datasets/{dataset_id}/tables"
-        schema={"fields":[{"name":"DATA_GERACAO_ROBO","type":"DATE","mode":"REQUIRED"},{"name":"DT_VENCIMENTOCOBRANCA","type":"DATE","mode":"REQUIRED"},{"name":"CAMPAIGN_ID","type":"INT64","mode":"REQUIRED"},{"name":"ACCOUNT_ID","type":"STRING","mode":"REQUIRED"},{"name":"DT_COLETA","type":"TIMESTAMP","mode":"REQUIRED"},{"name":"JOB_STATUS","type":"STRING","mode":"NULLABLE"},{"name":"RUN_ID","type":"STRING","mode":"REQUIRED"},{"name":"SCRIPT","type":"STRING","mode":"REQUIRED"}]}
-        rtb=requests.post(tb_url,headers=headers,data=json.dumps({"tableReference":{"projectId":project_id,"datasetId":dataset_id,"tableId":table_id},"schema":schema}),timeout=30,verify=ca if ca else True)
-        if rtb.status_code not in (200,409): raise RuntimeError("Falha garantir tabela")
-        status_map={str(x["campaign_id"]):str(x["status"]) for x in resultados}
-        ts_utc=datetime.utcnow().replace(microsecond=0).isoformat()+"Z"
-        df_out=(df.select(["ACCOUNT_ID","CAMPAIGN_ID"]).with_columns([pl.lit(data_corte or date.today().isoformat()).alias("DATA_GERACAO_ROBO"),pl.lit(amb.last_vencimento or "").alias("DT_VENCIMENTOCOBRANCA"),pl.col("CAMPAIGN_ID").cast(pl.Int64,strict=False),pl.col("ACCOUNT_ID").cast(pl.Utf8,strict=False),pl.lit(ts_utc).alias("DT_COLETA"),pl.col("CAMPAIGN_ID").map_elements(lambda c: status_map.get(str(c),"UNKNOWN")).alias("JOB_STATUS"),pl.lit(amb.run_ts).alias("RUN_ID"),pl.lit(NOME_SCRIPT).alias("SCRIPT")]).select(["DATA_GERACAO_ROBO","DT_VENCIMENTOCOBRANCA","CAMPAIGN_ID","ACCOUNT_ID","DT_COLETA","JOB_STATUS","RUN_ID","SCRIPT"]))
-        rows=df_out.to_dicts(); total_rows=len(rows)
-        ins_url=f"https://bigquery.googleapis.com/bigquery/v2/projects/{project_id}/datasets/{dataset_id}/tables/{table_id}/insertAll"
-        batch=int(os.getenv("BQ_INSERT_BATCH","1000")); inserted=0
-        for i in range(0,total_rows,batch):
-            chunk=rows[i:i+batch]
-            payload={"kind":"bigquery#tableDataInsertAllRequest","skipInvalidRows":True,"ignoreUnknownValues":False,"rows":[{"json":r} for r in chunk]}
-            rr=requests.post(ins_url,headers=headers,data=json.dumps(payload),timeout=120,verify=ca if ca else True)
-            if rr.status_code!=200:
-                amb.logger.error("insertAll HTTP %s: %s", rr.status_code, rr.text)
-                continue
-            resp=rr.json(); errs=resp.get("insertErrors") or []
-            ok_rows=len(chunk)-(len(errs) if errs else 0); inserted+=ok_rows
-            amb.logger.info("insertAll %d..%d ok=%d", i, i+len(chunk)-1, ok_rows)
-    except Exception:
-        amb.logger.error("Falha persistência BigQuery", exc_info=True)
-        inserted=0
-    resumo={"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":int(df.height or 0),"campanhas_total":int(len(df.select(pl.col("CAMPAIGN_ID").unique()).to_series())),"campanhas_ok":ok,"campanhas_ko":ko,"linhas_persistidas":int(inserted),"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
+        return RETCODE_FALHA,0,relatorio_csv if relatorio_csv.exists() else None,{"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":linhas,"campanhas_total":_total_campanhas(df),"campanhas_ok":ok,"campanhas_ko":ko,"linhas_persistidas":0,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
+    finally:
+        amb.relatorio=None
+    with amb.spans.medir("etapa.relatorio"):
+        resultado=(escrever_relatorio_xlsx(amb,resultados,amb.caminho_artefatos/f"resultado_{amb.run_ts}.xlsx") if RELATORIO_XLSX else None) or relatorio_csv
+    persistidas=amb.journal.persistidas() if amb.retomar else set()
+    df_persistir=df.filter(~_chave_campanha(_colunas(df)).is_in(list(persistidas))) if persistidas else df
+    with amb.spans.medir("etapa.persistencia"):
+        inserted,rejeitadas=persistir_vinculos(amb,df_persistir,resultados,data_corte)
+    if rejeitadas is not None:
+        for x in resultados:
+            chave=str(x.get("chave") or x["campaign_id"])
+            if chave not in persistidas and chave not in rejeitadas:
+                amb.journal.registrar(chave,"PERSISTIDA",status=x["status"],log=x.get("log",""))
+    resumo={"data_corte":data_corte,"vencimento":amb.last_vencimento,"bq_rows_corte":amb.last_rows_corte,"bq_rows_parcela":linhas,"campanhas_total":_total_campanhas(df),"campanhas_ok":ok,"campanhas_ko":ko,"linhas_persistidas":int(inserted),"linhas_ja_vinculadas":amb.last_rows_ja_vinculadas,"tabela_destino":f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"}
     return RETCODE_SUCESSO,len(resultados),resultado if resultado.exists() else None,resumo
 
 def publicar_metricas(amb:Ambiente,status:str,tempo_hms:str,tabela_ref:str)->None:
     try:
-        cli=AutomacoesExecClient(logger=amb.logger,log_file=amb.log_file_path)
-        cli.publicar(nome_automacao=NOME_AUTOMACAO or "",metodo_automacao=ARQUIVO_ATUAL.stem,status=status,tempo_exec=tempo_hms,data_exec=amb.data_exec,hora_exec=amb.hora_exec,usuario=amb.usuario,log_path=str(amb.log_file_path),tabela_referencia=tabela_ref,observacao=amb.observacao,modo_execucao=amb.modo_execucao,send_email=False)
+        amb.notificador.metricas(dict(nome_automacao=NOME_AUTOMACAO or "",metodo_automacao=ARQUIVO_ATUAL.stem,status=status,tempo_exec=tempo_hms,data_exec=amb.data_exec,hora_exec=amb.hora_exec,usuario=amb.usuario,log_path=str(amb.log_file_path),tabela_referencia=tabela_ref,observacao=amb.observacao,modo_execucao=amb.modo_execucao,send_email=False))
     except Exception:
         amb.logger.error("Falha publicar métricas", exc_info=True)
 
@@ -704,31 +2385,47 @@ def main()->int:
     parser.add_argument("command",nargs="?",choices=["vincular"],default="vincular")
     parser.add_argument("param",nargs="?")
     parser.add_argument("--no-baixar",action="store_false",dest="baixar")
+    parser.add_argument("--executor",choices=["browser","api"],default=None)
+    parser.add_argument("--engine",choices=["threads","async"],default=None)
+    parser.add_argument("--resume",action="store_true",dest="retomar")
+    parser.add_argument("--from",dest="data_de")
+    parser.add_argument("--to",dest="data_ate")
+    parser.add_argument("--incremental",action="store_true")
     args,unknown=parser.parse_known_args()
+    if args.incremental: amb.incremental=True
+    if args.retomar:
+        amb.retomar=True; args.baixar=False
+    if args.executor: amb.executor=args.executor
+    if args.engine: amb.engine=args.engine
+    if amb.engine=="async" and amb.executor!="api":
+        amb.logger.error("Engine async só suporta o executor api (executor=%s); use --engine threads", amb.executor)
+        return RETCODE_FALHA
     data_corte=args.param
-    if DATA_ESPECIFICA and not execucao.is_servidor():
+    if args.data_de or args.data_ate:
+        if not (args.data_de and args.data_ate):
+            amb.logger.error("Backfill exige --from e --to")
+            return RETCODE_FALHA
+        data_corte=args.data_de
+        amb.logger.info("Modo backfill | de=%s | até=%s", args.data_de, args.data_ate)
+    elif DATA_ESPECIFICA and not execucao.is_servidor():
         escolhida=selecionar_data_especifica(amb)
         if escolhida:
             data_corte=escolhida
-    tempo=""
+    tempo=""; anexos=[]
     try:
-        status_code,total,resultado,resumo=vincular_campanhas(amb,baixar=args.baixar,data_corte=data_corte)
+        status_code,total,resultado,resumo=vincular_campanhas(amb,baixar=args.baixar,data_corte=data_corte,data_ate=args.data_ate)
         tempo=amb.tempo_exec_hms()
+        resumo["etapas"]=amb.spans.resumo()
+        for nome,r in resumo["etapas"].items():
+            amb.logger.info("ETAPA %s | n=%d | p50=%.2fs | p95=%.2fs | total=%.1fs", nome, r["n"], r["p50_s"], r["p95_s"], r["total_s"])
         tabelas=[f"{BQ_SOURCE_PROJECT_ID}.SHARED_OPS.TB_DATA_CORTE_FATURAS",f"{BQ_SOURCE_PROJECT_ID}.SHARED_OPS.TB_PUBLICO_PARCELAMENTO_FATURA_PF",f"{BQ_PROJECT_ID}.ADMINISTRACAO_CELULA_PYTHON.VincularCampanhas"]
-        if status_code==RETCODE_SEMDADOSPARAPROCESSAR:
-            enviar_email(amb,"SEM DADOS PARA PROCESSAR",tempo,tabelas,0,[resultado] if resultado else [],resumo)
-            publicar_metricas(amb,"SEM DADOS PARA PROCESSAR",tempo,",".join(tabelas))
-            mover_artefatos(amb,[resultado] if resultado else [])
-            return RETCODE_SEMDADOSPARAPROCESSAR
-        if status_code==RETCODE_FALHA:
-            enviar_email(amb,"FALHA",tempo,tabelas,0,[resultado] if resultado else [],resumo)
-            publicar_metricas(amb,"FALHA",tempo,",".join(tabelas))
-            mover_artefatos(amb,[resultado] if resultado else [])
-            return RETCODE_FALHA
-        enviar_email(amb,"SUCESSO",tempo,tabelas,total,[resultado] if resultado else [],resumo)
-        publicar_metricas(amb,"SUCESSO",tempo,",".join(tabelas))
-        mover_artefatos(amb,[resultado] if resultado else [])
-        return RETCODE_SUCESSO
+        anexos=[resultado] if resultado else []
+        if status_code==RETCODE_SEMDADOSPARAPROCESSAR: status,retorno,total="SEM DADOS PARA PROCESSAR",RETCODE_SEMDADOSPARAPROCESSAR,0
+        elif status_code==RETCODE_FALHA: status,retorno,total="FALHA",RETCODE_FALHA,0
+        else: status,retorno="SUCESSO",RETCODE_SUCESSO
+        enviar_email(amb,status,tempo,tabelas,total,anexos,resumo)
+        publicar_metricas(amb,status,tempo,",".join(tabelas))
+        return retorno
     except Exception:
         amb.logger.exception("Falha não tratada")
         try:
@@ -740,9 +2437,13 @@ def main()->int:
             pass
         return RETCODE_FALHA
     finally:
+        PROVEDOR_TOKEN.parar()
         try:
-            if amb.log_file_path.exists():
-                mover_artefatos(amb,[amb.log_file_path])
+            amb.spans.fechar()
+            if amb.notificador.fechar():
+                mover_artefatos(amb,anexos+[amb.log_file_path])
+            else:
+                amb.logger.warning("Envio das notificações não concluído; anexos mantidos em %s", ", ".join(str(p) for p in anexos+[amb.log_file_path]))
         except Exception:
             pass
 
@@ -0,0 +1,165 @@
+import sys, os, json, time, argparse, subprocess, tempfile, shutil, functools
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from servidores_falsos import BigQueryFalso, RundeckFalso
+
+BASELINE = Path(__file__).resolve().parent/"baseline.json"
+PRESETS = {
+    "rapido":"10000x1,100000x50,1000000x200",
+    "completo":"10000x1,10000x50,100000x50,100000x500,1000000x200,1000000x500,10000000x500",
+}
+ETAPAS = ("bq_query_rest","escrever_campanhas","baixar_dados","processar_campanhas_concorrentes","persistir_vinculos","escrever_relatorio_xlsx","vincular_campanhas")
+METRICAS_TEMPO = ("total_s","makespan_s")
+PISO_S = 0.25
+PISO_MB = 32.0
+
+def _rss_pico_mb()->float|None:
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset/1024/1024
+        except Exception:
+            return None
+    rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/1024/1024 if sys.platform=="darwin" else rss/1024
+
+def _cronometrar(V,nome:str,tempos:dict)->None:
+    original=getattr(V,nome)
+    @functools.wraps(original)
+    def medido(*a,**k):
+        t0=time.perf_counter()
+        try:
+            return original(*a,**k)
+        finally:
+            tempos[nome]=tempos.get(nome,0.0)+time.perf_counter()-t0
+    setattr(V,nome,medido)
+
+def filho(saida:Path,data_corte:str)->int:
+    import Vincularcampanhas as V
+    class AmbienteBench(V.Ambiente):
+        def _carregar_credencial(self):
+            return "bench","bench"
+    tempos={}
+    for nome in ETAPAS: _cronometrar(V,nome,tempos)
+    t0=time.perf_counter()
+    amb=AmbienteBench()
+    status,total,resultado,resumo=V.vincular_campanhas(amb,True,data_corte)
+    amb.notificador.fechar()
+    total_s=time.perf_counter()-t0
+    saida.write_text(json.dumps({"status":status,"execucoes":total,"total_s":total_s,"etapas":tempos,"rss_mb":_rss_pico_mb(),"resumo":resumo},default=str),encoding="utf-8")
+    return 0 if status==V.RETCODE_SUCESSO else 1
+
+def _navegadores_playwright()->str:
+    if os.getenv("PLAYWRIGHT_BROWSERS_PATH"): return os.environ["PLAYWRIGHT_BROWSERS_PATH"]
+    if sys.platform=="win32": return str(Path(os.getenv("LOCALAPPDATA") or Path.home()/"AppData"/"Local")/"ms-playwright")
+    if sys.platform=="darwin": return str(Path.home()/"Library"/"Caches"/"ms-playwright")
+    return str(Path(os.getenv("XDG_CACHE_HOME") or Path.home()/".cache")/"ms-playwright")
+
+def rodar_cenario(linhas:int,campanhas:int,args)->dict:
+    tmp=Path(tempfile.mkdtemp(prefix="bench_vincular_"))
+    try:
+        with BigQueryFalso(linhas,campanhas,taxa_falha=args.falha_bq) as bq, RundeckFalso(latencia_sec=args.latencia,seg_por_linha=args.seg_por_linha,taxa_falha=args.falha_rundeck) as rd:
+            env=dict(os.environ)
+            env.update({"HOME":str(tmp),"USERPROFILE":str(tmp),"LOCALAPPDATA":str(tmp),"PLAYWRIGHT_BROWSERS_PATH":_navegadores_playwright(),"BQ_API_URL":bq.url,"RUNDECK_URL":rd.url,"GCP_ACCESS_TOKEN":"bench",
+                        "EXECUTOR":args.executor,"ENGINE":args.engine,"CACHE_EXTRACAO":"0","NOTIFICACAO_BACKENDS":"arquivo","BQ_PERSIST_MODE":args.persistencia,
+                        "RUNDECK_POLL_INTERVAL_SEC":str(args.poll),"BQ_POLL_INTERVAL_SEC":"0.05","RETRY_BACKOFF_SEC":"0.1","RETRY_BACKOFF_MAX_SEC":"1","CIRCUITO_PAUSA_SEC":"1"})
+            env.pop("RUNDECK_API_TOKEN",None)
+            arq=tmp/"resultado.json"
+            t0=time.perf_counter()
+            r=subprocess.run([sys.executable,str(Path(__file__).resolve()),"--filho",str(arq),"--data-corte",args.data_corte],cwd=str(RAIZ),env=env,
+                             stdout=None if args.verbose else subprocess.DEVNULL,stderr=None if args.verbose else subprocess.PIPE,text=True)
+            parede=time.perf_counter()-t0
+            if not arq.exists():
+                raise RuntimeError(f"cenário {linhas}x{campanhas} falhou: {(r.stderr or '').strip()[-2000:]}")
+            res=json.loads(arq.read_text(encoding="utf-8"))
+            res.update({"linhas":linhas,"campanhas":campanhas,"parede_s":parede,"makespan_s":rd.makespan(),"execucoes_rundeck":len(rd.execucoes),"falhas_rundeck":rd.falhas(),
+                        "linhas_servidas":bq.linhas_servidas,"linhas_inseridas":bq.linhas_inseridas,"linhas_carregadas":bq.linhas_carregadas})
+            et=res["etapas"]
+            res["vazao"]={"extracao_linhas_s":linhas/et["baixar_dados"] if et.get("baixar_dados") else None,
+                          "campanhas_s":campanhas/et["processar_campanhas_concorrentes"] if et.get("processar_campanhas_concorrentes") else None,
+                          "persistencia_linhas_s":bq.linhas_inseridas/et["persistir_vinculos"] if et.get("persistir_vinculos") else None}
+            return res
+    finally:
+        shutil.rmtree(tmp,ignore_errors=True)
+
+def imprimir(nome:str,res:dict)->None:
+    et=res["etapas"]; vz=res["vazao"]
+    print(f"[{nome}] status={res['status']} total={res['total_s']:.2f}s makespan={res['makespan_s']:.2f}s rss_pico={res['rss_mb'] or 0:.0f}MB execucoes={res['execucoes_rundeck']} falhas={res['falhas_rundeck']} inseridas={res['linhas_inseridas']}")
+    for etapa in ETAPAS:
+        if etapa in et: print(f"    {et[etapa]:8.2f}s  {etapa}")
+    print("    vazão: "+" | ".join(f"{k}={v:,.1f}" for k,v in vz.items() if v))
+
+def melhor(rodadas:list)->dict:
+    res=dict(min(rodadas,key=lambda r:r["total_s"]))
+    for m in METRICAS_TEMPO+("rss_mb",):
+        xs=[r[m] for r in rodadas if r.get(m) is not None]
+        res[m]=min(xs) if xs else None
+    res["etapas"]={e:min(r["etapas"][e] for r in rodadas if e in r["etapas"]) for e in res["etapas"]}
+    return res
+
+def comparar(nome:str,res:dict,base:dict,tolerancia:float,tolerancia_rss:float)->list:
+    regressoes=[]
+    pares=[(m,res.get(m),base.get(m),PISO_S,tolerancia) for m in METRICAS_TEMPO]+[(f"etapas.{e}",res["etapas"].get(e),(base.get("etapas") or {}).get(e),PISO_S,tolerancia) for e in ETAPAS]+[("rss_mb",res.get("rss_mb"),base.get("rss_mb"),PISO_MB,tolerancia_rss)]
+    for metrica,atual,ref,piso,tol in pares:
+        if atual is None or ref is None: continue
+        if atual>ref*(1+tol) and atual-ref>piso:
+            regressoes.append(f"{nome} {metrica}: {atual:.2f} > {ref:.2f} (+{(atual/ref-1)*100 if ref else 0:.0f}%)")
+    return regressoes
+
+def main()->int:
+    ap=argparse.ArgumentParser(description="Benchmark ponta a ponta do vincular_campanhas contra BigQuery e Rundeck falsos locais")
+    ap.add_argument("--filho",type=Path,help=argparse.SUPPRESS)
+    ap.add_argument("--cenarios",default="rapido",help="preset (rapido|completo) ou lista LINHASxCAMPANHAS separada por vírgula")
+    ap.add_argument("--executor",choices=["api","browser"],default="api")
+    ap.add_argument("--engine",choices=["threads","async"],default="threads")
+    ap.add_argument("--persistencia",choices=["insertall","load"],default="insertall",help="BQ_PERSIST_MODE usado no cenário")
+    ap.add_argument("--latencia",type=float,default=0.05,help="latência fixa de cada execução Rundeck (s)")
+    ap.add_argument("--seg-por-linha",type=float,default=2e-6,help="latência Rundeck adicional por linha do arquivo (s)")
+    ap.add_argument("--falha-rundeck",type=float,default=0.0,help="fração de execuções Rundeck que terminam em FAILED")
+    ap.add_argument("--falha-bq",type=float,default=0.0,help="fração de requisições BigQuery respondidas com 503")
+    ap.add_argument("--poll",type=float,default=0.05,help="RUNDECK_POLL_INTERVAL_SEC usado no cenário")
+    ap.add_argument("--data-corte",default="2026-10-19")
+    ap.add_argument("--baseline",type=Path,default=BASELINE)
+    ap.add_argument("--gravar-baseline",action="store_true")
+    ap.add_argument("--repeticoes",type=int,default=3,help="rodadas por cenário; vale o melhor valor de cada métrica")
+    ap.add_argument("--tolerancia",type=float,default=0.25)
+    ap.add_argument("--tolerancia-rss",type=float,default=0.5)
+    ap.add_argument("--json",type=Path,help="grava os resultados brutos neste arquivo")
+    ap.add_argument("--verbose",action="store_true")
+    args=ap.parse_args()
+    if args.filho: return filho(args.filho,args.data_corte)
+    cenarios=[c.strip() for c in PRESETS.get(args.cenarios,args.cenarios).split(",") if c.strip()]
+    if args.executor=="browser" and not any(Path(_navegadores_playwright()).glob("chromium*")):
+        print(f"navegadores do Playwright não encontrados em {_navegadores_playwright()}: rode 'python -m playwright install chromium' ou defina PLAYWRIGHT_BROWSERS_PATH")
+        return 2
+    base=json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    parametros={"latencia":args.latencia,"seg_por_linha":args.seg_por_linha,"falha_rundeck":args.falha_rundeck,"falha_bq":args.falha_bq,"poll":args.poll}
+    resultados={}; regressoes=[]
+    for nome in cenarios:
+        linhas,campanhas=(int(x) for x in nome.lower().split("x"))
+        chave=f"{nome}/{args.executor}/{args.engine}"+(f"/{args.persistencia}" if args.persistencia!="insertall" else "")
+        res=melhor([rodar_cenario(linhas,campanhas,args) for _ in range(max(1,args.repeticoes))])
+        resultados[chave]=res
+        imprimir(chave,res)
+        if res["status"]!=0: regressoes.append(f"{chave}: status {res['status']}")
+        if res["linhas_inseridas"]==0: regressoes.append(f"{chave}: nenhuma linha persistida")
+        if args.gravar_baseline or chave not in base: continue
+        if base[chave].get("parametros")!=parametros:
+            print(f"    aviso: baseline de {chave} gravado com outros parâmetros, comparação ignorada"); continue
+        regressoes.extend(comparar(chave,res,base[chave],args.tolerancia,args.tolerancia_rss))
+    if args.json: args.json.write_text(json.dumps(resultados,indent=2,default=str),encoding="utf-8")
+    if args.gravar_baseline:
+        base.update({n:{**{k:r[k] for k in ("total_s","makespan_s","rss_mb","etapas")},"parametros":parametros} for n,r in resultados.items()})
+        args.baseline.write_text(json.dumps(base,indent=2,sort_keys=True),encoding="utf-8")
+        print(f"baseline gravado em {args.baseline}")
+        return 0
+    for r in regressoes: print(f"REGRESSAO: {r}")
+    return 1 if regressoes else 0
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import sys, time, random, json
+from pathlib import Path
+import polars as pl
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from Vincularcampanhas import _rows_to_polars, _bq_pagina
+
+SCHEMA = [{"name":"ACCOUNT_ID","type":"STRING"},{"name":"CAMPAIGN_ID","type":"INT64"}]
+
+def _rows_to_polars_legado(schema:list,rows:list)->pl.DataFrame:
+    cols=[f["name"] for f in schema]
+    data={c:[] for c in cols}
+    for r in rows or []:
+        f=r.get("f",[])
+        for i,c in enumerate(cols):
+            v=f[i]["v"] if i<len(f) else None
+            data[c].append(v)
+    df=pl.DataFrame(data)
+    for f in schema:
+        n=f["name"]; t=f.get("type","STRING")
+        if t in ("INT64","INTEGER"): df=df.with_columns(pl.col(n).cast(pl.Int64,strict=False))
+        elif t in ("FLOAT64","FLOAT","NUMERIC","BIGNUMERIC"): df=df.with_columns(pl.col(n).cast(pl.Float64,strict=False))
+        elif t in ("BOOL","BOOLEAN"): df=df.with_columns(pl.col(n).cast(pl.Boolean,strict=False))
+        else: df=df.with_columns(pl.col(n).cast(pl.Utf8,strict=False))
+    return df
+
+def gerar_rows(n:int,campanhas:int=200,seed:int=7)->list:
+    rnd=random.Random(seed)
+    return [{"f":[{"v":f"{rnd.randrange(10**11):011d}"},{"v":str(rnd.randrange(campanhas)) if i%997 else None}]} for i in range(n)]
+
+def medir(fn,schema:list,rows:list,repeticoes:int)->tuple:
+    melhor=float("inf"); df=None
+    for _ in range(repeticoes):
+        t0=time.perf_counter(); df=fn(schema,rows); melhor=min(melhor,time.perf_counter()-t0)
+    return melhor,df
+
+def _pagina_legado(schema:list,conteudo:bytes)->pl.DataFrame:
+    return _rows_to_polars_legado(schema,json.loads(conteudo).get("rows") or [])
+
+def _pagina_nova(schema:list,conteudo:bytes)->pl.DataFrame:
+    return _bq_pagina(schema,conteudo)[0]
+
+def main()->int:
+    n=int(sys.argv[1]) if len(sys.argv)>1 else 1_000_000
+    repeticoes=int(sys.argv[2]) if len(sys.argv)>2 else 3
+    rows=gerar_rows(n)
+    conteudo=json.dumps({"kind":"bigquery#getQueryResultsResponse","totalRows":str(n),"rows":rows,"pageToken":"fim"}).encode()
+    print(f"linhas={n} repeticoes={repeticoes}")
+    for etapa,legado,novo,entrada in (("rows",_rows_to_polars_legado,_rows_to_polars,rows),("payload",_pagina_legado,_pagina_nova,conteudo)):
+        t_legado,df_legado=medir(legado,SCHEMA,entrada,repeticoes)
+        t_novo,df_novo=medir(novo,SCHEMA,entrada,repeticoes)
+        if not df_novo.equals(df_legado):
+            print(f"DIVERGENCIA entre decoder novo e legado ({etapa})")
+            return 1
+        print(f"[{etapa}] legado: {t_legado:.3f}s ({n/t_legado:,.0f} linhas/s)")
+        print(f"[{etapa}] novo:   {t_novo:.3f}s ({n/t_novo:,.0f} linhas/s)")
+        print(f"[{etapa}] ganho:  {t_legado/t_novo:.2f}x")
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import sys, subprocess, os, py_compile, time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+MODULO = "Vincularcampanhas"
+PROIBIDOS = ("PySide6","pandas","polars","pythoncom","win32com","playwright","dollynho","_utilAutomacoesExec","openpyxl","xlsxwriter")
+
+def medir()->tuple:
+    r=subprocess.run([sys.executable,"-X","importtime","-c",f"import {MODULO}"],cwd=str(RAIZ),capture_output=True,text=True)
+    if r.returncode!=0:
+        raise RuntimeError(r.stderr.strip().splitlines()[-1] if r.stderr.strip() else "import falhou")
+    linhas=[]
+    for l in r.stderr.splitlines():
+        if not l.startswith("import time:") or "self [us]" in l: continue
+        _,proprio,cumulativo,nome=l.replace("import time:","|",1).split("|")
+        linhas.append((nome.strip(),len(nome)-len(nome.lstrip())-1,int(proprio),int(cumulativo)))
+    fim=next(i for i,(n,d,_,_) in enumerate(linhas) if n==MODULO and d==0)
+    inicio=max([i for i,(_,d,_,_) in enumerate(linhas[:fim]) if d==0],default=-1)+1
+    return linhas[fim][3],[(n,p,c) for n,_,p,c in linhas[inicio:fim+1]]
+
+def compilar()->float:
+    t0=time.perf_counter()
+    py_compile.compile(str(RAIZ/f"{MODULO}.py"),doraise=True)
+    return time.perf_counter()-t0
+
+def main()->int:
+    orcamento_ms=float(sys.argv[1]) if len(sys.argv)>1 else float(os.getenv("IMPORT_BUDGET_MS","120"))
+    repeticoes=int(sys.argv[2]) if len(sys.argv)>2 else 5
+    compilacao=compilar()
+    medir()
+    melhor=None; linhas=[]
+    for _ in range(repeticoes):
+        total,ls=medir()
+        if melhor is None or total<melhor: melhor,linhas=total,ls
+    carregados=sorted({n.split(".")[0] for n,_,_ in linhas} & set(PROIBIDOS))
+    print(f"import {MODULO}: {melhor/1000:.1f}ms (orçamento {orcamento_ms:.0f}ms, melhor de {repeticoes}, bytecode em cache)")
+    print(f"  compilação do fonte sem cache: {compilacao*1000:.1f}ms")
+    for nome,proprio,cumulativo in sorted(linhas,key=lambda x:-x[1])[:10]:
+        print(f"  {proprio/1000:8.1f}ms  {nome}")
+    falhou=False
+    if carregados:
+        print(f"REGRESSAO: módulos pesados importados no topo: {', '.join(carregados)}"); falhou=True
+    if melhor/1000>orcamento_ms:
+        print(f"REGRESSAO: import acima do orçamento ({melhor/1000:.1f}ms > {orcamento_ms:.0f}ms)"); falhou=True
+    return 1 if falhou else 0
+
+if __name__=="__main__":
+    sys.exit(main())
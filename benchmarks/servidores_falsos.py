@@ -0,0 +1,286 @@
+import json, re, threading, time, random, io
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+ESQUEMA_PUBLICO = [{"name":"Data_Vencimento","type":"STRING"},{"name":"QTD_CORTE","type":"INT64"},{"name":"ACCOUNT_ID","type":"STRING"},{"name":"CAMPAIGN_ID","type":"INT64"}]
+ESQUEMA_PERIODO = [{"name":"DATA_CORTE","type":"STRING"},{"name":"Data_Vencimento","type":"STRING"},{"name":"DATAS","type":"STRING"},{"name":"QTD_CORTE","type":"INT64"},{"name":"ACCOUNT_ID","type":"STRING"},{"name":"CAMPAIGN_ID","type":"INT64"}]
+
+def campanha_sintetica(i:int,campanhas:int)->int|None:
+    if i%997==996: return None
+    h=(i*2654435761)&0xFFFFFFFF
+    return 1+(((h*h)>>32)*campanhas>>32)
+
+def linhas_sinteticas(inicio:int,fim:int,campanhas:int,vencimento:str)->bytes:
+    partes=[]
+    for i in range(inicio,fim):
+        c=campanha_sintetica(i,campanhas)
+        partes.append('{"f":[{"v":"%s"},{"v":"1"},{"v":"%011d"},{"v":%s}]}'%(vencimento,i,'"%d"'%c if c is not None else "null"))
+    return ",".join(partes).encode()
+
+def linha_json(valores:tuple)->bytes:
+    return ('{"f":['+",".join('{"v":null}' if v is None else '{"v":%s}'%json.dumps(str(v)) for v in valores)+"]}").encode()
+
+class _Servidor:
+    def __init__(self):
+        self._srv=None
+        self.lock=threading.Lock()
+        self.requisicoes=0
+    def _handler(self):
+        raise NotImplementedError
+    @property
+    def url(self)->str:
+        return f"http://127.0.0.1:{self._srv.server_port}"
+    def __enter__(self):
+        self._srv=ThreadingHTTPServer(("127.0.0.1",0),self._handler())
+        self._srv.daemon_threads=True
+        threading.Thread(target=self._srv.serve_forever,name=type(self).__name__,daemon=True).start()
+        return self
+    def __exit__(self,exc_type,exc,tb):
+        self._srv.shutdown(); self._srv.server_close()
+        return False
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version="HTTP/1.1"
+    def log_message(self,*a):
+        pass
+    def _corpo(self)->bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+    def _bytes(self,codigo:int,corpo:bytes,tipo:str="application/json",cabecalhos:dict|None=None)->None:
+        self.send_response(codigo)
+        self.send_header("Content-Type",tipo); self.send_header("Content-Length",str(len(corpo)))
+        for k,v in (cabecalhos or {}).items(): self.send_header(k,v)
+        self.end_headers(); self.wfile.write(corpo)
+    def _json(self,codigo:int,obj:dict,cabecalhos:dict|None=None)->None:
+        self._bytes(codigo,json.dumps(obj).encode(),cabecalhos=cabecalhos)
+
+class BigQueryFalso(_Servidor):
+    def __init__(self,linhas:int,campanhas:int,vencimento:str="2026-10-20",latencia_job_sec:float=0.0,taxa_falha:float=0.0,seed:int=7):
+        super().__init__()
+        self.linhas=linhas; self.campanhas=campanhas; self.vencimento=vencimento
+        self.latencia_job_sec=latencia_job_sec; self.taxa_falha=taxa_falha
+        self._rnd=random.Random(seed)
+        self.jobs={}
+        self.tabelas={}
+        self.uploads={}
+        self.cargas={}
+        self.linhas_servidas=0
+        self.linhas_inseridas=0
+        self.linhas_carregadas=0
+        self.campanhas_invalidas=set()
+        self.cortes={}
+        self.vinculados=None
+    def _falhar(self)->bool:
+        with self.lock:
+            self.requisicoes+=1
+            return self.taxa_falha>0 and self._rnd.random()<self.taxa_falha
+    def _consulta(self,p:dict):
+        params={q["name"]:(q.get("parameterValue") or {}).get("value") for q in p.get("queryParameters") or []}
+        incremental="QTD_JA_VINCULADA" in (p.get("query") or "")
+        if not self.cortes and not incremental: return self.linhas
+        datas=sorted(d for d in self.cortes if params["data_de"]<=d<=params["data_ate"]) if "data_de" in params else [params.get("data_corte")]
+        vencimentos={}
+        for d in datas:
+            v=self.cortes.get(d,self.vencimento if not self.cortes else None)
+            if v: vencimentos.setdefault(v,[]).append(d)
+        linhas=[]
+        for v,ds in sorted(vencimentos.items()):
+            cab=(min(ds),v,",".join(ds),len(ds)) if "data_de" in params else (v,1)
+            for i in range(self.linhas):
+                c=campanha_sintetica(i,self.campanhas); conta="%011d"%i
+                linhas.append(cab+((None,None) if incremental and (v,str(c),conta) in (self.vinculados or ()) else (conta,c)))
+        esquema=list(ESQUEMA_PERIODO if "data_de" in params else ESQUEMA_PUBLICO)
+        if incremental:
+            linhas=list(dict.fromkeys(linhas))
+            ja={}
+            for v,ds in vencimentos.items():
+                ja[v]=sum(1 for i in range(self.linhas) if (v,str(campanha_sintetica(i,self.campanhas)),"%011d"%i) in (self.vinculados or ()))
+            idx=[f["name"] for f in esquema].index("Data_Vencimento")
+            linhas=[x+(ja[x[idx]],) for x in linhas]
+            esquema.append({"name":"QTD_JA_VINCULADA","type":"INT64"})
+        return {"esquema":esquema,"linhas":[linha_json(x) for x in linhas]}
+    def _vincular(self,linhas:list)->None:
+        if self.vinculados is None: return
+        with self.lock:
+            self.vinculados.update((str(r["DT_VENCIMENTOCOBRANCA"]),str(r["CAMPAIGN_ID"]),str(r["ACCOUNT_ID"])) for r in linhas if r.get("JOB_STATUS")=="SUCCEEDED")
+    def _pagina(self,job:str,inicio:int,maximo:int)->bytes:
+        spec=self.jobs[job]
+        total=spec if isinstance(spec,int) else len(spec["linhas"])
+        fim=min(total,inicio+maximo)
+        with self.lock: self.linhas_servidas+=max(0,fim-inicio)
+        cauda=',"pageToken":"%d"'%fim if fim<total else ""
+        esquema=ESQUEMA_PUBLICO if isinstance(spec,int) else spec["esquema"]
+        corpo=linhas_sinteticas(inicio,fim,self.campanhas,self.vencimento) if isinstance(spec,int) else b",".join(spec["linhas"][inicio:fim])
+        return (b'{"kind":"bigquery#getQueryResultsResponse","jobReference":{"jobId":"%s"},"jobComplete":true,"schema":{"fields":%s},"totalRows":"%d","rows":['%(job.encode(),json.dumps(esquema).encode(),total)
+                +corpo+b"]"+cauda.encode()+b"}")
+    def _carregar(self,job:dict,dados:bytes)->dict:
+        import polars as pl
+        cfg=(job.get("configuration") or {}).get("load") or {}
+        tabela=(cfg.get("destinationTable") or {}).get("tableId")
+        job_id=(job.get("jobReference") or {}).get("jobId") or f"load_{len(self.cargas)}"
+        erro=None; n=0
+        try:
+            df=pl.read_parquet(io.BytesIO(dados)); n=df.height
+            fornecido={f["name"]:f.get("mode","NULLABLE") for f in (cfg.get("schema") or {}).get("fields") or []} or {c:"NULLABLE" for c in df.columns}
+            for f in (self.tabelas.get(tabela) or {}).get("fields") or []:
+                if f.get("mode")!="REQUIRED": continue
+                if fornecido.get(f["name"],"NULLABLE")!="REQUIRED":
+                    erro=f"Provided Schema does not match Table. Field {f['name']} has changed mode from REQUIRED to NULLABLE"; break
+                if f["name"] not in df.columns or df[f["name"]].null_count():
+                    erro=f"Required field {f['name']} cannot be null"; break
+        except Exception as e:
+            erro=f"Error while reading data: {e}"
+        status={"state":"DONE"}; estatisticas={}
+        if erro:
+            status.update(errorResult={"reason":"invalid","message":erro},errors=[{"reason":"invalid","message":erro}])
+        else:
+            estatisticas={"load":{"outputRows":str(n)}}
+            with self.lock: self.linhas_inseridas+=n; self.linhas_carregadas+=n
+            if self.vinculados is not None: self._vincular(df.to_dicts())
+        with self.lock:
+            self.cargas[job_id]={"kind":"bigquery#job","jobReference":{"jobId":job_id},"status":status,"statistics":estatisticas,"configuration":job.get("configuration")}
+            return self.cargas[job_id]
+    def _handler(self):
+        srv=self
+        class H(_Handler):
+            def _multipart(self,corpo:bytes)->tuple:
+                fronteira=self.headers.get("Content-Type","").split("boundary=",1)[-1].strip().encode()
+                partes=[p for p in corpo.split(b"--"+fronteira) if p not in (b"",b"--",b"--\r\n")]
+                job,dados=(p.partition(b"\r\n\r\n")[2][:-2] for p in partes[:2])
+                return json.loads(job),dados
+            def do_PUT(self):
+                u=urlparse(self.path); corpo=self._corpo()
+                m=re.match(r"/upload/sessao/(\w+)$",u.path)
+                if not m or m.group(1) not in srv.uploads: return self._json(404,{})
+                sessao=srv.uploads[m.group(1)]
+                inicio=int(re.match(r"bytes (\d+)-",self.headers.get("Content-Range","bytes 0-")).group(1))
+                del sessao["dados"][inicio:]; sessao["dados"]+=corpo
+                if len(sessao["dados"])<sessao["total"]: return self._bytes(308,b"",cabecalhos={"Range":f"bytes=0-{len(sessao['dados'])-1}"})
+                self._json(200,srv._carregar(sessao["job"],bytes(sessao["dados"])))
+            def do_POST(self):
+                u=urlparse(self.path); q={k:v[0] for k,v in parse_qs(u.query).items()}; corpo=self._corpo()
+                if srv._falhar(): return self._json(503,{"error":{"message":"falha injetada"}})
+                if u.path.startswith("/upload/") and u.path.endswith("/jobs"):
+                    if q.get("uploadType")=="multipart": return self._json(200,srv._carregar(*self._multipart(corpo)))
+                    with srv.lock:
+                        chave=f"s{len(srv.uploads)+1}"; srv.uploads[chave]={"job":json.loads(corpo),"dados":bytearray(),"total":int(self.headers.get("X-Upload-Content-Length") or 0)}
+                    return self._bytes(200,b"",cabecalhos={"Location":f"{srv.url}/upload/sessao/{chave}"})
+                if u.path.endswith("/tables"):
+                    tb=json.loads(corpo or b"{}"); tabela=(tb.get("tableReference") or {}).get("tableId")
+                    with srv.lock:
+                        if tabela in srv.tabelas: return self._json(409,{"error":{"message":"Already Exists"}})
+                        srv.tabelas[tabela]=tb.get("schema") or {}
+                    return self._json(200,tb)
+                if u.path.endswith("/queries"):
+                    p=json.loads(corpo)
+                    if srv.latencia_job_sec: time.sleep(srv.latencia_job_sec)
+                    spec=srv._consulta(p)
+                    with srv.lock:
+                        job=f"bench_{len(srv.jobs)}"; srv.jobs[job]=spec
+                    return self._bytes(200,srv._pagina(job,0,int(p.get("maxResults") or 100000)))
+                if u.path.endswith("/insertAll"):
+                    rows=json.loads(corpo).get("rows") or []
+                    erros=[{"index":i,"errors":[{"reason":"invalid","message":"campanha rejeitada"}]} for i,r in enumerate(rows) if str((r.get("json") or {}).get("CAMPAIGN_ID")) in srv.campanhas_invalidas]
+                    with srv.lock: srv.linhas_inseridas+=len(rows)-len(erros)
+                    rejeitadas={e["index"] for e in erros}
+                    srv._vincular([r.get("json") or {} for i,r in enumerate(rows) if i not in rejeitadas])
+                    return self._json(200,{"kind":"bigquery#tableDataInsertAllResponse",**({"insertErrors":erros} if erros else {})})
+                if u.path.endswith("/datasets"): return self._json(409,{"error":{"message":"Already Exists"}})
+                self._json(404,{})
+            def do_GET(self):
+                u=urlparse(self.path); q={k:v[0] for k,v in parse_qs(u.query).items()}
+                if srv._falhar(): return self._json(503,{"error":{"message":"falha injetada"}})
+                m=re.search(r"/queries/([^/]+)$",u.path)
+                if m and m.group(1) in srv.jobs:
+                    inicio=int(q.get("startIndex") or q.get("pageToken") or 0)
+                    return self._bytes(200,srv._pagina(m.group(1),inicio,int(q.get("maxResults") or 100000)))
+                m=re.search(r"/jobs/([^/]+)$",u.path)
+                if m and m.group(1) in srv.cargas: return self._json(200,srv.cargas[m.group(1)])
+                if "/tables/" in u.path: return self._json(200,{"lastModifiedTime":str(int(time.time()*1000))})
+                self._json(404,{})
+        return H
+
+PAGINA_LOGIN = b"""<html><body><form method="post" action="/j_security_check">
+<input id="login" name="j_username"><input id="password" name="j_password" type="password"><button id="btn-login" type="submit">Login</button>
+</form></body></html>"""
+
+PAGINA_JOB = """<html><body><form method="post" enctype="multipart/form-data" action="/project/{projeto}/job/run/{job}">
+<label for="cid">CAMPAIGN_ID</label><input id="cid" name="extra.option.CAMPAIGN_ID">
+<input type="file" name="extra.option.FILE"><button id="execFormRunButton" type="submit">Run Job Now</button>
+</form></body></html>"""
+
+PAGINA_EXECUCAO = """<html><body><span class="execstate overall" data-execstate="RUNNING">RUNNING</span>
+<a id="btn_view_output" href="#">Log Output</a><div id="saida"></div>
+<script>
+async function poll(){{
+  const r=await fetch("/api/{versao}/execution/{id}/state"); const j=await r.json();
+  if(!j.completed){{setTimeout(poll,50);return;}}
+  const s=document.querySelector("span.execstate"); s.dataset.execstate=j.executionState; s.textContent=j.executionState;
+  const o=await (await fetch("/api/{versao}/execution/{id}/output?maxlines=100000")).json();
+  document.getElementById("saida").innerHTML=o.entries.map(e=>'<span class="execution-log__content-text">'+e.log+'</span>').join("");
+}}
+poll();
+</script></body></html>"""
+
+class RundeckFalso(_Servidor):
+    def __init__(self,latencia_sec:float=0.05,seg_por_linha:float=2e-6,taxa_falha:float=0.0,linhas_log:int=20,api_versao:str="41",seed:int=7):
+        super().__init__()
+        self.latencia_sec=latencia_sec; self.seg_por_linha=seg_por_linha; self.taxa_falha=taxa_falha
+        self.linhas_log=linhas_log; self.api_versao=api_versao
+        self._rnd=random.Random(seed)
+        self.arquivos={}
+        self.execucoes={}
+    def _nova_execucao(self,linhas:int)->int:
+        with self.lock:
+            n=len(self.execucoes)+1
+            inicio=time.monotonic()
+            estado="FAILED" if self.taxa_falha>0 and self._rnd.random()<self.taxa_falha else "SUCCEEDED"
+            self.execucoes[n]={"inicio":inicio,"fim":inicio+self.latencia_sec+self.seg_por_linha*linhas,"estado":estado,"linhas":linhas}
+        return n
+    def makespan(self)->float:
+        with self.lock:
+            xs=list(self.execucoes.values())
+        return max(x["fim"] for x in xs)-min(x["inicio"] for x in xs) if xs else 0.0
+    def falhas(self)->int:
+        with self.lock:
+            return sum(1 for x in self.execucoes.values() if x["estado"]!="SUCCEEDED")
+    def _handler(self):
+        srv=self
+        class H(_Handler):
+            def _estado(self,n:int)->dict:
+                e=srv.execucoes[n]; pronto=time.monotonic()>=e["fim"]
+                return {"completed":pronto,"executionState":e["estado"] if pronto else "RUNNING"}
+            def do_POST(self):
+                u=urlparse(self.path); q={k:v[0] for k,v in parse_qs(u.query).items()}; corpo=self._corpo()
+                with srv.lock: srv.requisicoes+=1
+                if u.path.endswith("/j_security_check"):
+                    return self._bytes(302,b"",cabecalhos={"Location":"/menu/home","Set-Cookie":"JSESSIONID=bench; Path=/"})
+                if u.path.endswith("/input/file"):
+                    with srv.lock:
+                        chave=f"arq{len(srv.arquivos)+1}"; srv.arquivos[chave]=max(0,corpo.count(b"\n")-1)
+                    return self._json(200,{"total":1,"options":{q.get("optionName","FILE"):chave}})
+                if u.path.endswith("/run") and "/api/" in u.path:
+                    opcoes=(json.loads(corpo or b"{}").get("options") or {})
+                    return self._json(200,{"id":srv._nova_execucao(srv.arquivos.get(opcoes.get("FILE"),0))})
+                m=re.match(r"/project/([^/]+)/job/run/",u.path)
+                if m:
+                    n=srv._nova_execucao(max(0,corpo.count(b"\n")-8))
+                    return self._bytes(302,b"",cabecalhos={"Location":f"/project/{m.group(1)}/execution/show/{n}"})
+                if u.path.endswith("/abort"): return self._json(200,{"abort":{"status":"aborted"}})
+                self._json(404,{})
+            def do_GET(self):
+                u=urlparse(self.path); q={k:v[0] for k,v in parse_qs(u.query).items()}
+                with srv.lock: srv.requisicoes+=1
+                if u.path in ("/user/login","/menu/home"): return self._bytes(200,PAGINA_LOGIN if u.path=="/user/login" else b"<html><body>home</body></html>","text/html")
+                m=re.match(r"/project/([^/]+)/job/show/([^/]+)",u.path)
+                if m:
+                    if "JSESSIONID" not in (self.headers.get("Cookie") or ""): return self._bytes(302,b"",cabecalhos={"Location":"/user/login"})
+                    return self._bytes(200,PAGINA_JOB.format(projeto=m.group(1),job=m.group(2)).encode(),"text/html")
+                m=re.match(r"/project/[^/]+/execution/show/(\d+)",u.path)
+                if m: return self._bytes(200,PAGINA_EXECUCAO.format(versao=srv.api_versao,id=m.group(1)).encode(),"text/html")
+                m=re.search(r"/execution/(\d+)/(state|output)$",u.path)
+                if not m or int(m.group(1)) not in srv.execucoes: return self._json(404,{})
+                n=int(m.group(1))
+                if m.group(2)=="state": return self._json(200,self._estado(n))
+                inicio=int(q.get("offset") or 0); fim=min(srv.linhas_log,inicio+int(q.get("maxlines") or srv.linhas_log))
+                self._json(200,{"id":n,"offset":str(fim),"completed":fim>=srv.linhas_log,"execCompleted":self._estado(n)["completed"],"entries":[{"log":f"execucao {n} linha {i}","level":"NORMAL"} for i in range(inicio,fim)]})
+        return H
@@ -0,0 +1,47 @@
+import sys, importlib
+from pathlib import Path
+import pytest
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(RAIZ/"benchmarks"))
+from servidores_falsos import BigQueryFalso, RundeckFalso
+
+AMBIENTE_TESTES = {"GCP_ACCESS_TOKEN":"teste","EXECUTOR":"api","ENGINE":"threads","NOTIFICACAO_BACKENDS":"arquivo","CACHE_EXTRACAO":"0","INCREMENTAL":"0",
+                   "RUNDECK_POLL_INTERVAL_SEC":"0.01","BQ_POLL_INTERVAL_SEC":"0.01","BQ_HTTP_BACKOFF_SEC":"0.01","RETRY_BACKOFF_SEC":"0.01","RETRY_BACKOFF_MAX_SEC":"0.05",
+                   "RETRY_MAX_TENTATIVAS":"2","CIRCUITO_PAUSA_SEC":"0","NOTIFICACAO_TIMEOUT_SEC":"10"}
+
+@pytest.fixture(scope="session")
+def servidores():
+    with BigQueryFalso(2000,5) as bq, RundeckFalso(latencia_sec=0.01,seg_por_linha=0.0) as rd, pytest.MonkeyPatch.context() as mp:
+        for k,v in {**AMBIENTE_TESTES,"BQ_API_URL":bq.url,"RUNDECK_URL":rd.url}.items(): mp.setenv(k,v)
+        mp.delenv("RUNDECK_API_TOKEN",raising=False)
+        yield bq,rd
+
+@pytest.fixture(scope="session")
+def V(servidores):
+    sys.modules.pop("Vincularcampanhas",None)
+    return importlib.import_module("Vincularcampanhas")
+
+@pytest.fixture
+def bq(servidores):
+    bq=servidores[0]
+    bq.linhas=2000; bq.campanhas=5; bq.taxa_falha=0.0
+    bq.jobs={}; bq.tabelas={}; bq.uploads={}; bq.cargas={}; bq.campanhas_invalidas=set(); bq.cortes={}; bq.vinculados=set()
+    bq.linhas_servidas=0; bq.linhas_inseridas=0; bq.linhas_carregadas=0
+    return bq
+
+@pytest.fixture
+def rd(servidores):
+    rd=servidores[1]
+    rd.taxa_falha=0.0; rd.arquivos={}; rd.execucoes={}
+    return rd
+
+@pytest.fixture
+def amb(V,bq,rd,tmp_path,monkeypatch):
+    monkeypatch.setenv("HOME",str(tmp_path))
+    monkeypatch.setattr(V.Ambiente,"_carregar_credencial",lambda self:("usuario","senha"))
+    amb=V.Ambiente()
+    yield amb
+    amb.notificador.fechar()
+    amb.spans.fechar()
@@ -0,0 +1,15 @@
+def test_divisao_desligada_por_padrao(V,amb,bq,rd):
+    assert V.MAX_LINHAS_EXECUCAO==0
+    bq.linhas=300; bq.campanhas=3
+    status,execucoes,_,_=V.vincular_campanhas(amb,True,"2026-10-19")
+    assert status==V.RETCODE_SUCESSO and execucoes==len(rd.execucoes)==3
+    assert sorted(p.name for p in amb.caminho_input.glob("*.csv"))==["1.csv","2.csv","3.csv"]
+
+def test_divisao_com_limite_configurado(V,amb,bq):
+    bq.linhas=300; bq.campanhas=3
+    V.baixar_dados(amb,"2026-10-19")
+    manifesto=V.escrever_campanhas(amb,amb.caminho_input,max_linhas=50)
+    for e in manifesto["campanhas"]:
+        partes=e.get("partes") or [{"arquivo":e["arquivo"],"linhas":e["linhas"]}]
+        assert all(p["linhas"]<=50 for p in partes) and sum(p["linhas"] for p in partes)==e["linhas"]
+        assert len(partes)==-(-e["linhas"]//50)
@@ -0,0 +1,25 @@
+import csv
+
+def _relatorio(amb)->list:
+    (p,)=amb.caminho_artefatos.glob("resultado_*.csv")
+    with open(p,encoding="utf-8-sig",newline="") as fh:
+        return list(csv.DictReader(fh,delimiter=";"))
+
+def test_engine_async_processa_todas_as_campanhas(V,amb,bq,rd):
+    amb.engine="async"
+    status,execucoes,_,resumo=V.vincular_campanhas(amb,True,"2026-10-19")
+    assert status==V.RETCODE_SUCESSO and execucoes==len(rd.execucoes)==bq.campanhas
+    assert resumo["campanhas_ok"]==bq.campanhas and resumo["linhas_persistidas"]==bq.linhas_inseridas
+    assert {(r["status"],r["tentativas"]) for r in _relatorio(amb)}=={("SUCCEEDED","1")}
+
+def test_engine_async_prazo_estourado_registra_tentativas(V,amb,bq,rd,monkeypatch):
+    amb.engine="async"; bq.campanhas=2
+    monkeypatch.setenv("CAMPANHA_DEADLINE_SEC","0.3")
+    rd.latencia_sec=5.0
+    try:
+        status,_,_,resumo=V.vincular_campanhas(amb,True,"2026-10-19")
+    finally:
+        rd.latencia_sec=0.01
+    assert status==V.RETCODE_SUCESSO and resumo["campanhas_ko"]==2
+    linhas=_relatorio(amb)
+    assert [(r["status"],r["tentativas"],r["espera_s"]) for r in linhas]==[("FALHA","1","0.0")]*2
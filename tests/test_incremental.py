@@ -0,0 +1,22 @@
+def test_incremental_ignora_pares_ja_vinculados(V,amb,bq,rd,monkeypatch):
+    bq.linhas=300; bq.campanhas=3; bq.campanhas_invalidas={"2"}
+    status,_,_,resumo=V.vincular_campanhas(amb,True,"2026-10-19")
+    assert status==V.RETCODE_SUCESSO and resumo["linhas_ja_vinculadas"]==0
+    ja=resumo["linhas_persistidas"]
+    assert len(bq.vinculados)==ja and {c for _,c,_ in bq.vinculados}=={"1","3"}
+
+    monkeypatch.setattr(amb,"incremental",True)
+    bq.campanhas_invalidas=set(); bq.linhas_inseridas=0; rd.execucoes={}
+    status,execucoes,_,resumo=V.vincular_campanhas(amb,True,"2026-10-19")
+    assert status==V.RETCODE_SUCESSO and "QTD_JA_VINCULADA" in amb.last_sql_parcela
+    assert resumo["linhas_ja_vinculadas"]==ja
+    assert execucoes==len(rd.execucoes)==1
+    assert resumo["linhas_persistidas"]==bq.linhas_inseridas==bq.linhas-ja
+    assert {c for _,c,_ in bq.vinculados}=={"1","2","3"} and len(bq.vinculados)==bq.linhas
+
+def test_incremental_sem_pares_vinculados_processa_tudo(V,amb,bq,rd,monkeypatch):
+    bq.linhas=300; bq.campanhas=3
+    monkeypatch.setattr(amb,"incremental",True)
+    status,execucoes,_,resumo=V.vincular_campanhas(amb,True,"2026-10-19")
+    assert status==V.RETCODE_SUCESSO and resumo["linhas_ja_vinculadas"]==0
+    assert execucoes==3 and resumo["linhas_persistidas"]==300
@@ -0,0 +1,52 @@
+import json
+
+def test_journal_guarda_o_ultimo_estado_por_campanha(V,tmp_path):
+    j=V.JournalCampanhas(tmp_path/"journal.jsonl","r1")
+    j.registrar("1","SUCCEEDED",log="ok")
+    j.registrar("2","FALHA")
+    j.registrar(3,"PERSISTIDA",status="SUCCEEDED")
+    j.registrar("2","SUCCEEDED")
+    j.registrar("4","PERSISTIDA",status="FALHA")
+    assert {cid:rec["estado"] for cid,rec in j.estados().items()}=={"1":"SUCCEEDED","2":"SUCCEEDED","3":"PERSISTIDA","4":"PERSISTIDA"}
+    assert set(j.concluidas())=={"1","2","3"}
+    assert j.persistidas()=={"3","4"}
+    assert j.estados()["1"]["run_id"]=="r1" and j.estados()["1"]["log"]=="ok"
+
+def test_journal_ignora_linha_truncada(V,tmp_path):
+    p=tmp_path/"journal.jsonl"
+    j=V.JournalCampanhas(p,"r1")
+    j.registrar("1","SUCCEEDED")
+    with open(p,"a",encoding="utf-8") as fh: fh.write('{"campaign_id":"2","esta')
+    assert set(j.concluidas())=={"1"}
+
+def test_journal_reiniciar_e_arquivo_ausente(V,tmp_path):
+    j=V.JournalCampanhas(tmp_path/"journal.jsonl","r1")
+    assert j.estados()=={}
+    j.registrar("1","SUCCEEDED")
+    j.reiniciar()
+    assert j.estados()=={} and not j.path.exists()
+    j.reiniciar()
+
+def test_retomada_reenvia_apenas_campanhas_nao_persistidas(V,amb,bq,rd):
+    bq.campanhas_invalidas={"2"}
+    status,execucoes,_,resumo=V.vincular_campanhas(amb,True,"2026-10-19")
+    assert status==V.RETCODE_SUCESSO and execucoes==bq.campanhas==len(rd.execucoes)
+    rejeitadas=resumo["bq_rows_parcela"]-resumo["linhas_persistidas"]
+    assert resumo["linhas_persistidas"]==bq.linhas_inseridas and rejeitadas>0
+    journal=V.JournalCampanhas(amb.caminho_input/V.JOURNAL_CAMPANHAS,amb.run_ts)
+    assert journal.persistidas()=={str(c) for c in range(1,bq.campanhas+1)}-{"2"}
+    assert set(journal.concluidas())=={str(c) for c in range(1,bq.campanhas+1)}
+
+    bq.campanhas_invalidas=set(); bq.linhas_inseridas=0
+    retomada=V.Ambiente()
+    try:
+        retomada.retomar=True
+        status,execucoes,_,resumo=V.vincular_campanhas(retomada,False,None)
+    finally:
+        retomada.notificador.fechar(); retomada.spans.fechar()
+    assert status==V.RETCODE_SUCESSO and execucoes==bq.campanhas
+    assert len(rd.execucoes)==bq.campanhas
+    assert resumo["linhas_persistidas"]==bq.linhas_inseridas==rejeitadas
+    assert journal.persistidas()=={str(c) for c in range(1,bq.campanhas+1)}
+    registros=[json.loads(l) for l in journal.path.read_text(encoding="utf-8").splitlines()]
+    assert [r["campaign_id"] for r in registros if r["estado"]=="PERSISTIDA"].count("2")==1
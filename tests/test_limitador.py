@@ -0,0 +1,40 @@
+import asyncio, threading
+import pytest
+
+def test_adquirir_sem_vaga_nao_ocupa_o_limite(V,amb):
+    lim=V.LimiteAdaptativo(amb,1)
+    assert lim.adquirir(0.01)
+    assert not lim.adquirir(0.01) and lim.em_voo==1
+    threading.Timer(0.05,lim.liberar,(True,1.0,10)).start()
+    assert lim.adquirir(5) and lim.em_voo==1
+
+def test_adquirir_async_sem_vaga_nao_ocupa_o_limite(V,amb):
+    async def cenario():
+        lim=V.LimiteAdaptativo(amb,2)
+        assert await lim.adquirir_async(0.01) and await lim.adquirir_async(0.01)
+        assert not await lim.adquirir_async(0.01) and lim.em_voo==2
+        asyncio.get_running_loop().call_later(0.05,lambda:asyncio.ensure_future(lim.liberar_async(True,1.0,10)))
+        assert await lim.adquirir_async(5) and lim.em_voo==2
+    asyncio.run(cenario())
+
+def _pico_execucoes(rd)->int:
+    eventos=sorted([(e["inicio"],1) for e in rd.execucoes.values()]+[(e["fim"],-1) for e in rd.execucoes.values()],key=lambda x:(x[0],x[1]))
+    pico=atual=0
+    for _,d in eventos:
+        atual+=d; pico=max(pico,atual)
+    return pico
+
+@pytest.mark.parametrize("engine",["threads","async"])
+def test_campanhas_nao_passam_do_limite_quando_a_espera_expira(V,amb,bq,rd,monkeypatch,engine):
+    monkeypatch.setattr(V,"LIMITE_ESPERA_SEC",0.01)
+    monkeypatch.setenv("LIMITE_API","2"); monkeypatch.setenv("LIMITE_ASYNC","2")
+    amb.engine=engine
+    criados=[]; criar=V._criar_limitador
+    monkeypatch.setattr(V,"_criar_limitador",lambda *a:criados.append(criar(*a)) or criados[-1])
+    rd.latencia_sec=0.2
+    try:
+        status,execucoes,_,_=V.vincular_campanhas(amb,True,"2026-10-19")
+    finally:
+        rd.latencia_sec=0.01
+    assert status==V.RETCODE_SUCESSO and execucoes==len(rd.execucoes)==bq.campanhas
+    assert _pico_execucoes(rd)<=2 and criados[0].em_voo==0
@@ -0,0 +1,86 @@
+import json, email, socket, threading
+import pytest
+
+def _email(V,amb,anexo=None)->dict:
+    msg=V.montar_email(amb,"SUCESSO","00:00:01",["P.D.T"],10,[anexo] if anexo else [],{"bq_rows_parcela":10,"linhas_persistidas":8})
+    msg["para"]=["destino@exemplo.com"]
+    return msg
+
+class BackendQuebrado:
+    nome="quebrado"
+    tipos=("email","metricas")
+    def __init__(self):
+        self.finalizado=threading.Event()
+    def iniciar(self)->None:
+        pass
+    def enviar(self,tipo:str,dados:dict)->None:
+        raise OSError("servidor fora do ar")
+    def finalizar(self)->None:
+        self.finalizado.set()
+
+def test_backend_arquivo_grava_eml_e_metricas(V,amb,tmp_path,monkeypatch):
+    monkeypatch.setenv("NOTIFICACAO_DIR",str(tmp_path/"notif"))
+    anexo=tmp_path/"resultado.csv"; anexo.write_text("a,b\n1,2\n",encoding="utf-8")
+    n=V.Notificador(amb,[V.BackendArquivo(amb)])
+    n.email(_email(V,amb,anexo)); n.metricas({"status":"SUCESSO","tempo_exec":"00:00:01"})
+    assert n.fechar()
+    (eml,)=(tmp_path/"notif").glob("*.eml")
+    m=email.message_from_bytes(eml.read_bytes())
+    assert m["Subject"].endswith("SUCESSO") and m["To"]=="destino@exemplo.com"
+    assert "resultado.csv" in [p.get_filename() for p in m.walk() if p.get_filename()]
+    (metricas,)=(tmp_path/"notif").glob("*_metricas.jsonl")
+    assert [json.loads(l) for l in metricas.read_text(encoding="utf-8").splitlines()]==[{"status":"SUCESSO","tempo_exec":"00:00:01"}]
+
+def test_backend_arquivo_usa_pasta_de_logs_por_padrao(V,amb,monkeypatch):
+    monkeypatch.delenv("NOTIFICACAO_DIR",raising=False)
+    assert V.BackendArquivo(amb).pasta==amb.caminho_logs/"notificacoes"
+
+def test_backend_smtp_entrega_ao_servidor(V,amb,monkeypatch):
+    controller=pytest.importorskip("aiosmtpd.controller")
+    from aiosmtpd.handlers import Sink
+    class Caixa(Sink):
+        def __init__(self):
+            self.mensagens=[]
+        async def handle_DATA(self,server,session,envelope):
+            self.mensagens.append(envelope); return "250 OK"
+    caixa=Caixa()
+    with socket.socket() as s:
+        s.bind(("127.0.0.1",0)); porta=s.getsockname()[1]
+    srv=controller.Controller(caixa,hostname="127.0.0.1",port=porta)
+    srv.start()
+    try:
+        monkeypatch.setenv("SMTP_HOST","127.0.0.1"); monkeypatch.setenv("SMTP_PORT",str(porta))
+        monkeypatch.setenv("SMTP_REMETENTE","robo@exemplo.com")
+        n=V.Notificador(amb,[V.BackendSmtp(amb)])
+        n.email(_email(V,amb)); n.metricas({"status":"SUCESSO"})
+        assert n.fechar()
+    finally:
+        srv.stop()
+    (env,)=caixa.mensagens
+    assert env.mail_from=="robo@exemplo.com" and env.rcpt_tos==["destino@exemplo.com"]
+    assert b"SUCESSO" in env.original_content
+
+def test_backend_desconhecido_e_ignorado(V,amb,monkeypatch):
+    monkeypatch.setenv("NOTIFICACAO_BACKENDS","arquivo, pombo-correio")
+    assert [b.nome for b in V.Notificador(amb).backends()]==["arquivo"]
+
+def test_falha_de_um_backend_nao_bloqueia_os_demais(V,amb,tmp_path,monkeypatch):
+    monkeypatch.setenv("NOTIFICACAO_DIR",str(tmp_path/"notif"))
+    quebrado=BackendQuebrado()
+    n=V.Notificador(amb,[quebrado,V.BackendArquivo(amb)])
+    n.email(_email(V,amb)); n.email(_email(V,amb))
+    assert n.fechar(timeout=10)
+    assert quebrado.finalizado.is_set()
+    assert len(list((tmp_path/"notif").glob("*.eml")))==2
+
+@pytest.mark.parametrize("entregue",[True,False],ids=["entregue","pendente"])
+def test_main_so_move_anexos_apos_o_envio(V,amb,tmp_path,monkeypatch,entregue):
+    relatorio=tmp_path/"resultado.csv"; relatorio.write_text("a\n1\n",encoding="utf-8")
+    monkeypatch.setattr(V.sys,"argv",["Vincularcampanhas.py","vincular"])
+    monkeypatch.setattr(V,"vincular_campanhas",lambda *a,**k:(V.RETCODE_SUCESSO,1,relatorio,{"bq_rows_parcela":1,"linhas_persistidas":1}))
+    monkeypatch.setattr(V.PROVEDOR_TOKEN,"parar",lambda:None)
+    fechar=V.Notificador.fechar
+    monkeypatch.setattr(V.Notificador,"fechar",lambda self,*a,**k:fechar(self,*a,**k) and entregue)
+    assert V.main()==V.RETCODE_SUCESSO
+    assert relatorio.exists()!=entregue
+    assert (amb.caminho_artefatos/relatorio.name).exists()==entregue
@@ -0,0 +1,31 @@
+import csv
+
+CORTES = {"2026-10-19":"2026-10-20","2026-10-20":"2026-10-20","2026-10-21":"2026-10-22"}
+
+def test_periodo_consolida_vencimentos_em_um_relatorio_e_uma_persistencia(V,amb,bq,rd,monkeypatch):
+    bq.linhas=300; bq.campanhas=3; bq.cortes=dict(CORTES)
+    chamadas=[]; persistir=V.persistir_vinculos
+    monkeypatch.setattr(V,"persistir_vinculos",lambda *a:chamadas.append(a) or persistir(*a))
+    status,execucoes,relatorio,resumo=V.vincular_campanhas(amb,True,"2026-10-19","2026-10-21")
+    assert status==V.RETCODE_SUCESSO and resumo["vencimento"]=="2026-10-20,2026-10-22"
+    assert execucoes==len(rd.execucoes)==6
+    assert sorted(p.name for p in amb.caminho_input.glob("*.csv"))==[f"{v}_{c}.csv" for v in ("2026-10-20","2026-10-22") for c in (1,2,3)]
+    assert len(chamadas)==1
+    assert resumo["linhas_persistidas"]==bq.linhas_inseridas==600
+    (_,df,_,_),=chamadas
+    assert sorted(df.select("Data_Vencimento").unique().collect()["Data_Vencimento"].to_list())==["2026-10-20","2026-10-22"]
+    assert relatorio.parent==amb.caminho_artefatos and len(list(amb.caminho_artefatos.glob("resultado_*.csv")))==1
+    with open(relatorio.with_suffix(".csv"),encoding="utf-8-sig",newline="") as fh:
+        linhas=list(csv.DictReader(fh,delimiter=";"))
+    assert sorted((r["vencimento"],r["campaign_id"],r["status"]) for r in linhas)==[(v,str(c),"SUCCEEDED") for v in ("2026-10-20","2026-10-22") for c in (1,2,3)]
+
+def test_periodo_sem_corte_nao_processa(V,amb,bq,rd):
+    bq.cortes=dict(CORTES)
+    status,execucoes,_,_=V.vincular_campanhas(amb,True,"2026-11-01","2026-11-03")
+    assert status==V.RETCODE_SEMDADOSPARAPROCESSAR and execucoes==0 and not rd.execucoes
+
+def test_manifesto_registra_linhas_do_publico_filtrado(V,amb,bq,rd):
+    status,_,_,resumo=V.vincular_campanhas(amb,True,"2026-10-19")
+    manifesto=V.ler_manifesto(amb.caminho_input)
+    assert status==V.RETCODE_SUCESSO and "bq_rows_parcela" not in manifesto
+    assert amb.last_rows_publico==manifesto["linhas_publico"]==manifesto["linhas"]==resumo["bq_rows_parcela"]==bq.linhas-2
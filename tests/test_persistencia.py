@@ -0,0 +1,60 @@
+from pathlib import Path
+import polars as pl
+import pytest
+
+def _publico(linhas:int=300,campanhas:int=3)->pl.DataFrame:
+    return pl.DataFrame({"ACCOUNT_ID":[f"{i:011d}" for i in range(linhas)],"CAMPAIGN_ID":[1+i%campanhas for i in range(linhas)]})
+
+def _resultados(campanhas:int=3)->list:
+    return [{"campaign_id":str(c),"chave":str(c),"status":"SUCCEEDED"} for c in range(1,campanhas+1)]
+
+@pytest.fixture
+def temporarios(V,tmp_path,monkeypatch):
+    criadas=[]; mkdtemp=V.tempfile.mkdtemp
+    def registrar(*a,**k):
+        criadas.append(Path(mkdtemp(*a,**{**k,"dir":tmp_path}))); return str(criadas[-1])
+    monkeypatch.setattr(V.tempfile,"mkdtemp",registrar)
+    return criadas
+
+def test_insertall_persiste_todas_as_linhas(V,amb,bq,monkeypatch,temporarios):
+    monkeypatch.setenv("BQ_PERSIST_MODE","insertall")
+    monkeypatch.setenv("BQ_INSERT_BATCH","40")
+    amb.last_vencimento="2026-10-20"
+    inseridas,rejeitadas=V.persistir_vinculos(amb,_publico(),_resultados(),"2026-10-19")
+    assert (inseridas,rejeitadas)==(300,set())
+    assert bq.linhas_inseridas==300
+    assert len(temporarios)==1 and not temporarios[0].exists()
+    assert not list(amb.caminho_artefatos.rglob("*.ndjson"))
+
+def test_insertall_reporta_campanhas_rejeitadas(V,amb,bq,monkeypatch):
+    monkeypatch.setenv("BQ_PERSIST_MODE","insertall")
+    bq.campanhas_invalidas={"2"}
+    inseridas,rejeitadas=V.persistir_vinculos(amb,_publico(),_resultados(),"2026-10-19")
+    assert inseridas==200 and rejeitadas=={"2"}
+
+def test_insertall_retenta_lotes_com_503(V,amb,bq,monkeypatch):
+    monkeypatch.setenv("BQ_PERSIST_MODE","insertall")
+    monkeypatch.setenv("BQ_INSERT_BATCH","25")
+    monkeypatch.setenv("BQ_INSERT_RETRIES","20")
+    bq.taxa_falha=0.3
+    inseridas,rejeitadas=V.persistir_vinculos(amb,_publico(),_resultados(),"2026-10-19")
+    assert (inseridas,rejeitadas)==(300,set()) and bq.linhas_inseridas==300
+
+@pytest.mark.parametrize("multipart_mb",["5","0"],ids=["multipart","resumable"])
+def test_load_job_com_schema(V,amb,bq,monkeypatch,multipart_mb,temporarios):
+    monkeypatch.setenv("BQ_PERSIST_MODE","load")
+    monkeypatch.setenv("BQ_LOAD_MULTIPART_MAX_MB",multipart_mb)
+    amb.last_vencimento="2026-10-20"
+    inseridas,rejeitadas=V.persistir_vinculos(amb,_publico(),_resultados(),"2026-10-19")
+    assert (inseridas,rejeitadas)==(300,set())
+    assert bq.linhas_carregadas==300
+    (carga,)=bq.cargas.values()
+    assert carga["status"]["state"]=="DONE" and "errorResult" not in carga["status"]
+    assert len(temporarios)==1 and not temporarios[0].exists()
+    assert not list(amb.caminho_artefatos.rglob("*.parquet"))
+
+def test_load_job_rejeitado_nao_confirma_campanhas(V,amb,bq,monkeypatch):
+    monkeypatch.setenv("BQ_PERSIST_MODE","load")
+    bq.tabelas[V.BQ_TABELA_DESTINO]={"fields":V._schema_vinculos()["fields"]+[{"name":"LOTE","type":"STRING","mode":"REQUIRED"}]}
+    inseridas,rejeitadas=V.persistir_vinculos(amb,_publico(),_resultados(),"2026-10-19")
+    assert (inseridas,rejeitadas)==(0,None) and bq.linhas_carregadas==0
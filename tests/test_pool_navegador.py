@@ -0,0 +1,94 @@
+import asyncio, threading
+import pytest
+
+class NavegadorFalso:
+    def __init__(self,espera_sec:float=0.2):
+        self.espera_sec=espera_sec
+        self.eventos=[]; self.threads=set(); self.paginas=0; self.ativos=0; self.pico=0
+        self.execucoes=None
+    def _chk(self):
+        self.threads.add(threading.get_ident())
+
+def _playwright_falso(nav:NavegadorFalso):
+    class Objeto:
+        _impl_obj=True
+    class Locator(Objeto):
+        def __init__(self,page,sel): self.page=page; self.sel=sel
+        @property
+        def first(self): return self
+        async def wait_for(self,state=None,timeout=None):
+            nav._chk()
+            if "SUCCEEDED" in self.sel:
+                nav.ativos+=1; nav.pico=max(nav.pico,nav.ativos)
+                try: await asyncio.sleep(nav.espera_sec)
+                finally: nav.ativos-=1
+        async def click(self):
+            nav._chk()
+            if self.sel=="#execFormRunButton" and nav.execucoes: self.page.url=f"http://rundeck/execution/show/{nav.execucoes()}"
+        async def fill(self,v): nav._chk()
+        async def type(self,v): nav._chk()
+        async def press(self,k): nav._chk()
+        async def count(self): nav._chk(); return 0 if "error" in self.sel else 1
+        async def set_input_files(self,f): nav._chk()
+    class Pagina(Objeto):
+        def __init__(self,context): self.context=context; self.url="about:blank"; nav.paginas+=1
+        def set_default_timeout(self,t): nav._chk()
+        def is_closed(self): return False
+        def locator(self,sel): nav._chk(); return Locator(self,sel)
+        async def goto(self,url,wait_until=None): nav._chk(); self.url=url
+        async def wait_for_load_state(self,estado=None,timeout=None):
+            nav._chk()
+            if "/user/login" in self.url: self.url="http://rundeck/menu/home"
+    class Contexto(Objeto):
+        async def new_page(self): nav._chk(); return Pagina(self)
+        async def cookies(self): nav._chk(); return [{"name":"JSESSIONID","value":"bench","domain":"127.0.0.1","path":"/"}]
+    class Browser(Objeto):
+        async def new_context(self,**kw): nav._chk(); return Contexto()
+        async def close(self): nav._chk(); nav.eventos.append("close")
+    class Chromium:
+        async def launch(self,headless=False,args=()): nav._chk(); nav.eventos.append("launch"); return Browser()
+    class Playwright:
+        chromium=Chromium()
+    class Gerente:
+        async def __aenter__(self): nav._chk(); return Playwright()
+        async def __aexit__(self,*exc): nav.eventos.append("stop")
+    return Gerente()
+
+@pytest.fixture
+def navegador(monkeypatch):
+    api=pytest.importorskip("playwright.async_api")
+    nav=NavegadorFalso()
+    monkeypatch.setattr(api,"async_playwright",lambda:_playwright_falso(nav))
+    return nav
+
+def test_pool_usa_um_navegador_e_paginas_concorrentes(V,amb,navegador,tmp_path):
+    arquivo=tmp_path/"1.csv"; arquivo.write_text("1\n",encoding="utf-8")
+    with V.PoolNavegador(amb,3) as pool:
+        futuros=[pool.submit(lambda rd:rd.rodar_job([{"campo":"CAMPAIGN_ID","valor":"1"}],V.JOB_VINCULAR_URL,str(arquivo))) for _ in range(6)]
+        assert [f.result() for f in futuros]==[("SUCCEEDED",None)]*6
+    assert navegador.eventos==["launch","close","stop"]
+    assert navegador.paginas==3 and navegador.pico==3
+    assert len(navegador.threads)==1 and threading.get_ident() not in navegador.threads
+
+def test_pool_fecha_o_navegador_se_o_login_falhar(V,amb,navegador,monkeypatch):
+    monkeypatch.setattr(V.Rundeck,"_login",lambda self:(_ for _ in ()).throw(RuntimeError("login caiu")))
+    with pytest.raises(RuntimeError,match="login caiu"):
+        with V.PoolNavegador(amb,2):
+            pass
+    assert navegador.eventos==["launch","close","stop"]
+
+def test_log_da_execucao_fecha_a_sessao_http(V,amb,rd,navegador,tmp_path,monkeypatch):
+    fechadas=[]
+    class Sessao(V.requests.Session):
+        def close(self):
+            fechadas.append(self); super().close()
+    monkeypatch.setattr(V.requests,"Session",Sessao)
+    navegador.execucoes=lambda:rd._nova_execucao(1)
+    arquivo=tmp_path/"1.csv"; arquivo.write_text("1\n",encoding="utf-8")
+    with V.ColetorLogs(amb) as coletor, V.PoolNavegador(amb,2) as pool:
+        amb.logs_rundeck=coletor
+        futuros=[pool.submit(lambda rd_:rd_.rodar_job([],V.JOB_VINCULAR_URL,str(arquivo))) for _ in range(3)]
+        logs=[f.result()[1] for f in futuros]
+    amb.logs_rundeck=None
+    assert len(fechadas)==3
+    assert all(len(open(log,encoding="utf-8").read().splitlines())==rd.linhas_log for log in logs)
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+def _arquivo(tmp_path:Path,linhas:int=10)->Path:
+    p=tmp_path/"123.csv"
+    p.write_text("".join(f"{i:011d}\n" for i in range(linhas)),encoding="utf-8")
+    return p
+
+def test_rodar_job_sucesso(V,amb,rd,tmp_path):
+    status,log=V.RundeckApi(amb,base_url=rd.url,pool=2).rodar_job([{"campo":"CAMPAIGN_ID","valor":"123"}],V.JOB_VINCULAR_URL,str(_arquivo(tmp_path)))
+    assert (status,log)==("SUCCEEDED",None)
+    assert len(rd.execucoes)==1 and rd.execucoes[1]["estado"]=="SUCCEEDED"
+
+def test_login_por_sessao_sem_token(V,amb,rd,tmp_path):
+    api=V.RundeckApi(amb,base_url=rd.url,pool=1)
+    assert not api._logado
+    status,_=api.rodar_job([{"campo":"CAMPAIGN_ID","valor":"1"}],V.JOB_VINCULAR_URL,str(_arquivo(tmp_path)))
+    assert status=="SUCCEEDED" and api._logado
+    assert api.session.cookies.get("JSESSIONID")=="bench"
+
+def test_execucao_falha(V,amb,rd,tmp_path):
+    rd.taxa_falha=1.0
+    status,log=V.RundeckApi(amb,base_url=rd.url,pool=1).rodar_job([],V.JOB_VINCULAR_URL,str(_arquivo(tmp_path)))
+    assert (status,log)==("FALHA",None)
+
+def test_arquivo_inexistente_nao_dispara_job(V,amb,rd,tmp_path):
+    status,_=V.RundeckApi(amb,base_url=rd.url,pool=1).rodar_job([],V.JOB_VINCULAR_URL,str(tmp_path/"nao_existe.csv"))
+    assert status=="FALHA" and not rd.execucoes
+
+def test_rodar_campanha_retenta_ate_o_limite(V,amb,rd,tmp_path):
+    rd.taxa_falha=1.0
+    status,_,tentativas,_=V.rodar_campanha(amb,str(_arquivo(tmp_path)),"123",V.RundeckApi(amb,base_url=rd.url,pool=1))
+    assert status=="FALHA" and tentativas==amb.retry.max_tentativas==2
+    assert len(rd.execucoes)==2
+
+def test_rodar_job_grava_log_da_execucao(V,amb,rd,tmp_path):
+    api=V.RundeckApi(amb,base_url=rd.url,pool=2)
+    with V.ColetorLogs(amb) as coletor:
+        amb.logs_rundeck=coletor
+        status,log=api.rodar_job([{"campo":"CAMPAIGN_ID","valor":"123"}],V.JOB_VINCULAR_URL,str(_arquivo(tmp_path)))
+    amb.logs_rundeck=None
+    assert status=="SUCCEEDED" and Path(log).parent==amb.caminho_logs/"rundeck"
+    linhas=Path(log).read_text(encoding="utf-8").splitlines()
+    assert len(linhas)==rd.linhas_log and linhas[0]=="execucao 1 linha 0"